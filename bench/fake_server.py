@@ -0,0 +1,361 @@
+"""
+Local stand-in for the Easy /v2 API and the Keycloak token endpoint, for benchmarking the SDK without the network
+and the real servers. Responses have the shape the DTOs expect, their sizes and the response latency are configurable.
+Any bearer token is accepted, submissions are tracked per token subject and autograded after a configurable delay.
+
+    python -m bench.fake_server [--port 8080] [--latency-ms 0] [--participants 1000] ...
+
+Prints the server's URL, use it both as the API and the IdP URL.
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+import typing as T
+import urllib.parse
+from dataclasses import dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_PATH = '/auth/realms/master/protocol/openid-connect/token'
+CREATED_AT = '2024-09-01T12:00:00.000Z'
+
+
+@dataclass
+class FakeServerConfig:
+    # Added to every response
+    latency_sec: float = 0
+    courses: int = 10
+    exercises: int = 50
+    participants: int = 1000
+    # Per student and exercise
+    submissions: int = 100
+    solution_bytes: int = 500
+    access_token_valid_sec: int = 300
+    refresh_token_valid_sec: int = 3600
+    # Time from posting a submission until it has been autograded, plus a random share of the jitter
+    autograde_sec: float = 0
+    autograde_jitter_sec: float = 0
+    # Longest time that awaiting the latest submission waits for its autograding
+    long_poll_sec: float = 30
+
+
+@dataclass
+class FakeRequest:
+    method: str
+    path: str
+    query: T.Dict[str, str]
+    # Subject of the bearer token, '' if there is none
+    user: str
+    body: bytes
+    headers: T.Mapping[str, str]
+
+
+# Status and body, optionally followed by extra response headers
+FakeResponse = T.Union[T.Tuple[int, bytes], T.Tuple[int, bytes, T.Mapping[str, str]]]
+
+
+def make_token(subject: str, **claims) -> str:
+    """
+    Unsigned JWT-like token that util.decode_token can read.
+    """
+    def encode(obj: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip('=')
+
+    payload = {'sub': subject, 'given_name': 'Bench', 'family_name': 'Mark', 'exp': int(time.time()) + 3600,
+               **claims}
+    return f'{encode({"alg": "none"})}.{encode(payload)}.'
+
+
+def token_subject(token: str) -> str:
+    try:
+        payload = token.split('.')[1]
+        return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))['sub']
+    except (IndexError, KeyError, ValueError):
+        return ''
+
+
+class FakeEasyServer:
+    def __init__(self, config: T.Optional[FakeServerConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config if config is not None else FakeServerConfig()
+        self.httpd = FakeHTTPServer((host, port), FakeRequestHandler)
+        self.httpd.fake_server = self
+        self.url = f'http://{host}:{self.httpd.server_address[1]}'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fake-easy-server', daemon=True)
+
+        self._lock = threading.Lock()
+        self.request_count = 0
+        self.token_request_count = 0
+        # Encoded bodies by (route, page), so that the server's own JSON encoding doesn't limit throughput
+        self._bodies: T.Dict[T.Tuple[str, T.Any], bytes] = {}
+        # (user, course ID, course exercise ID) -> time.time() when the latest submission is autograded
+        self._graded_at: T.Dict[T.Tuple[str, str, str], float] = {}
+        self.submission_count = 0
+
+        self.routes: T.List[T.Tuple[str, T.Pattern, T.Callable[[FakeRequest], FakeResponse]]] = [
+            ('POST', re.compile(re.escape(TOKEN_PATH)), self.token),
+            ('POST', re.compile(r'/v2/account/checkin'), self.empty),
+            ('GET', re.compile(r'/v2/courses/[^/]+/basic'), self.course_basic_info),
+            ('GET', re.compile(r'/v2/courses/[^/]+/participants'), self.participants),
+            ('GET', re.compile(r'/v2/student/courses'), self.student_courses),
+            ('POST', re.compile(r'/v2/student/courses/[^/]+/access'), self.empty),
+            ('GET', re.compile(r'/v2/student/courses/[^/]+/exercises'), self.student_exercises),
+            ('GET', re.compile(r'/v2/student/courses/[^/]+/exercises/[^/]+'), self.exercise_details),
+            ('GET', re.compile(r'/v2/student/courses/[^/]+/exercises/[^/]+/activities'), self.activities),
+            ('POST', re.compile(r'/v2/student/courses/[^/]+/exercises/[^/]+/submissions'), self.post_submission),
+            ('GET', re.compile(r'/v2/student/courses/[^/]+/exercises/[^/]+/submissions/latest'),
+             self.latest_submission),
+            ('GET', re.compile(r'/v2/student/courses/[^/]+/exercises/[^/]+/submissions/latest/await'),
+             self.await_latest_submission),
+            ('GET', re.compile(r'/v2/student/courses/[^/]+/exercises/[^/]+/submissions/all'),
+             self.student_submissions),
+            ('GET', re.compile(r'/v2/teacher/courses'), self.teacher_courses),
+            ('GET', re.compile(r'/v2/teacher/courses/[^/]+/exercises'), self.teacher_exercises),
+            ('GET', re.compile(r'/v2/teacher/courses/[^/]+/exercises/[^/]+/submissions/all/students/[^/]+'),
+             self.teacher_submissions),
+        ]
+
+    def start(self) -> 'FakeEasyServer':
+        self.thread.start()
+        return self
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'FakeEasyServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def handle(self, method: str, path: str, headers: T.Optional[T.Mapping[str, str]] = None,
+               body: bytes = b'') -> FakeResponse:
+        with self._lock:
+            self.request_count += 1
+        if self.config.latency_sec:
+            time.sleep(self.config.latency_sec)
+
+        parsed = urllib.parse.urlsplit(path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        authorization = (headers or {}).get('Authorization', '')
+        user = token_subject(authorization[len('Bearer '):]) if authorization.startswith('Bearer ') else ''
+        request = FakeRequest(method, parsed.path, query, user, body, headers or {})
+        for route_method, pattern, handler in self.routes:
+            if route_method == method and pattern.fullmatch(parsed.path):
+                return handler(request)
+        return 404, b'{}'
+
+    def _cached(self, key: T.Tuple[str, T.Any], build: T.Callable[[], T.Any]) -> T.Tuple[int, bytes]:
+        body = self._bodies.get(key)
+        if body is None:
+            body = json.dumps(build()).encode()
+            self._bodies[key] = body
+        return 200, body
+
+    @staticmethod
+    def _page(query: T.Dict[str, str], total: int) -> T.Tuple[int, int]:
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', total))
+        return min(offset, total), min(offset + limit, total)
+
+    def token(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        with self._lock:
+            self.token_request_count += 1
+        # Tokens are issued to the subject of the refresh token, so that clients keep their identity
+        form = dict(urllib.parse.parse_qsl(request.body.decode()))
+        subject = token_subject(form.get('refresh_token', '')) or 'bench-user'
+        return 200, json.dumps({
+            'access_token': make_token(subject),
+            'expires_in': self.config.access_token_valid_sec,
+            'refresh_token': make_token(subject, typ='Refresh'),
+            'refresh_expires_in': self.config.refresh_token_valid_sec,
+        }).encode()
+
+    def empty(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        return 200, b''
+
+    def course_basic_info(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        return self._cached(('basic', None), lambda: {'title': 'Programming', 'alias': None, 'archived': False})
+
+    def student_courses(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        return self._cached(('student_courses', None), lambda: {'courses': [
+            {'id': str(i), 'title': f'Course {i}', 'alias': None, 'archived': False, 'last_accessed': CREATED_AT}
+            for i in range(self.config.courses)]})
+
+    def teacher_courses(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        return self._cached(('teacher_courses', None), lambda: {'courses': [
+            {'id': str(i), 'title': f'Course {i}', 'alias': None, 'archived': False,
+             'student_count': self.config.participants}
+            for i in range(self.config.courses)]})
+
+    def student_exercises(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        return self._cached(('student_exercises', None), lambda: {'exercises': [
+            {'id': str(i), 'effective_title': f'Exercise {i}', 'grader_type': 'AUTO', 'deadline': None,
+             'is_open': True, 'status': 'COMPLETED', 'ordering_idx': i,
+             'grade': {'grade': 100, 'is_autograde': True, 'is_graded_directly': True}}
+            for i in range(self.config.exercises)]})
+
+    def teacher_exercises(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        n = self.config.participants
+        return self._cached(('teacher_exercises', None), lambda: {'exercises': [
+            {'course_exercise_id': str(i), 'exercise_id': str(1000 + i), 'library_title': f'Exercise {i}',
+             'title_alias': None, 'effective_title': f'Exercise {i}', 'grade_threshold': 90, 'student_visible': True,
+             'student_visible_from': CREATED_AT, 'soft_deadline': None, 'hard_deadline': None, 'grader_type': 'AUTO',
+             'ordering_idx': i, 'unstarted_count': n // 4, 'ungraded_count': 0, 'started_count': n // 4,
+             'completed_count': n - 2 * (n // 4)}
+            for i in range(self.config.exercises)]})
+
+    def exercise_details(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        return self._cached(('exercise_details', None), lambda: {
+            'effective_title': 'Exercise', 'text_html': '<p>' + 'Lorem ipsum dolor sit amet. ' * 40 + '</p>',
+            'deadline': None, 'grader_type': 'AUTO', 'threshold': 90, 'instructions_html': None, 'is_open': True,
+            'solution_file_name': 'solution.py', 'solution_file_type': 'TEXT_EDITOR'})
+
+    def activities(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        return self._cached(('activities', None), lambda: {'teacher_activities': [
+            {'id': str(i), 'submission_id': str(i), 'submission_number': i + 1, 'created_at': CREATED_AT,
+             'grade': 80, 'edited_at': None,
+             'feedback': {'feedback_html': '<p>Good</p>', 'feedback_adoc': 'Good'},
+             'teacher': {'id': 't1', 'given_name': 'Tea', 'family_name': 'Cher'}}
+            for i in range(3)]})
+
+    def _solution(self) -> str:
+        line = 'print("hello, world")\n'
+        return (line * (self.config.solution_bytes // len(line) + 1))[:self.config.solution_bytes]
+
+    def _student_submission(self, i: int, graded: bool = True) -> dict:
+        if not graded:
+            return {'id': str(i), 'number': i + 1, 'solution': self._solution(), 'submission_time': CREATED_AT,
+                    'autograde_status': 'IN_PROGRESS', 'submission_status': 'UNGRADED', 'grade': None,
+                    'auto_assessment': None}
+        return {'id': str(i), 'number': i + 1, 'solution': self._solution(), 'submission_time': CREATED_AT,
+                'autograde_status': 'COMPLETED', 'submission_status': 'COMPLETED',
+                'grade': {'grade': 100, 'is_autograde': True, 'is_graded_directly': True},
+                'auto_assessment': {'grade': 100, 'feedback': 'All tests passed'}}
+
+    @staticmethod
+    def _exercise_key(request: FakeRequest) -> T.Tuple[str, str, str]:
+        # /v2/student/courses/{course_id}/exercises/{course_exercise_id}/...
+        parts = request.path.split('/')
+        return request.user, parts[4], parts[6]
+
+    def post_submission(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        grading_sec = self.config.autograde_sec + random.uniform(0, self.config.autograde_jitter_sec)
+        with self._lock:
+            self.submission_count += 1
+            self._graded_at[self._exercise_key(request)] = time.time() + grading_sec
+        return 200, b''
+
+    def latest_submission(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        # Exercises without a submission from this user have a graded one
+        graded = time.time() >= self._graded_at.get(self._exercise_key(request), 0)
+        return self._cached(('latest_submission', graded), lambda: self._student_submission(0, graded))
+
+    def await_latest_submission(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        remaining = self._graded_at.get(self._exercise_key(request), 0) - time.time()
+        if remaining > 0:
+            time.sleep(min(remaining, self.config.long_poll_sec))
+        return self.latest_submission(request)
+
+    def student_submissions(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        return self._cached(('student_submissions', None), lambda: {'submissions': [
+            self._student_submission(i) for i in range(self.config.submissions)]})
+
+    def participants(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        start, end = self._page(request.query, self.config.participants)
+        role = request.query.get('role', 'all')
+
+        def build():
+            return {
+                'students': [
+                    {'id': f'student{i}', 'email': f'student{i}@example.com', 'given_name': 'Student',
+                     'family_name': str(i), 'created_at': CREATED_AT, 'moodle_username': None,
+                     'groups': [{'id': str(i % 10), 'name': f'Group {i % 10}'}]}
+                    for i in range(start, end)] if role in ('student', 'all') else [],
+                'teachers': [
+                    {'id': 'teacher0', 'email': 'teacher@example.com', 'given_name': 'Tea', 'family_name': 'Cher',
+                     'created_at': CREATED_AT}] if role in ('teacher', 'all') else [],
+                'students_pending': [],
+                'students_moodle_pending': [],
+            }
+
+        return self._cached(('participants', (role, start, end)), build)
+
+    def teacher_submissions(self, request: FakeRequest) -> T.Tuple[int, bytes]:
+        start, end = self._page(request.query, self.config.submissions)
+
+        def build():
+            return {'count': self.config.submissions, 'submissions': [
+                {'id': str(i), 'solution': self._solution(), 'created_at': CREATED_AT, 'grade_auto': 100,
+                 'feedback_auto': 'All tests passed', 'grade_teacher': None, 'feedback_teacher': None}
+                for i in range(start, end)]}
+
+        return self._cached(('teacher_submissions', (start, end)), build)
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Hundreds of clients may connect at once, the default backlog of 5 would make them retry after a second
+    request_queue_size = 1024
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, don't let them wait for the delayed ACK
+    disable_nagle_algorithm = True
+    server: ThreadingHTTPServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self._respond('POST', self.rfile.read(length) if length else b'')
+
+    def _respond(self, method: str, request_body: bytes = b''):
+        status, body, *extra_headers = self.server.fake_server.handle(method, self.path, self.headers, request_body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (extra_headers[0] if extra_headers else {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    defaults = FakeServerConfig()
+    parser.add_argument('--latency-ms', type=float, default=defaults.latency_sec * 1000)
+    for field in fields(FakeServerConfig):
+        if field.name != 'latency_sec':
+            parser.add_argument('--' + field.name.replace('_', '-'), type=field.type, default=field.default)
+
+
+def config_from_arguments(args: argparse.Namespace) -> FakeServerConfig:
+    values = {field.name: getattr(args, field.name)
+              for field in fields(FakeServerConfig) if field.name != 'latency_sec'}
+    return FakeServerConfig(latency_sec=args.latency_ms / 1000, **values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=0)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeEasyServer(config_from_arguments(args), port=args.port)
+    print(server.url, flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Check that `import easy` stays lean. Both `import requests`, which the SDK can't do without, and `import easy` are
+timed in fresh interpreters, the difference is the SDK's own import time.
+
+    python -m bench.import_time [--budget-ms 100] [--runs 5]
+
+Exits with status 1 if the budget is exceeded or a module only needed for interactive or async use was imported.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Modules that must only be imported when browser auth or AsyncEz is actually used
+LAZY_MODULES = ['flask', 'werkzeug', 'jinja2', 'click', 'http.server', 'webbrowser', 'asyncio', 'aiohttp', 'numpy']
+
+MEASURE_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(",".join(sys.modules))
+'''
+
+
+def measure(module: str):
+    out = subprocess.run([sys.executable, '-c', MEASURE_SCRIPT.format(module=module)],
+                         check=True, capture_output=True, text=True).stdout.splitlines()
+    return float(out[0]), set(out[1].split(','))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=100, help='max import time of easy on top of requests')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    requests_times, easy_times = [], []
+    modules = set()
+    for _ in range(args.runs):
+        requests_times.append(measure('requests')[0])
+        easy_time, modules = measure('easy')
+        easy_times.append(easy_time)
+
+    own_ms = (statistics.median(easy_times) - statistics.median(requests_times)) * 1000
+    print(f'import requests: {statistics.median(requests_times) * 1000:.1f} ms')
+    print(f'import easy:     {statistics.median(easy_times) * 1000:.1f} ms ({own_ms:.1f} ms on top of requests, '
+          f'budget {args.budget_ms:.0f} ms)')
+
+    ok = True
+    eagerly_imported = [m for m in LAZY_MODULES if m in modules]
+    if eagerly_imported:
+        print(f'FAIL: import easy imported {", ".join(eagerly_imported)}')
+        ok = False
+    if own_ms > args.budget_ms:
+        print('FAIL: import time budget exceeded')
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
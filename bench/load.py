@@ -0,0 +1,374 @@
+"""
+Exam-day load test: virtual students that each open an exercise list, think, submit a solution and await its
+autograding, over and over with random think times, against the fake server in bench/fake_server.py. Every
+concurrency model the SDK offers runs in its own process, so that their threads, sockets and memory can be told apart:
+
+    threads  a thread and an Ez per student
+    pool     a thread per student, clients from one easy.pool.ClientPool sharing its connections
+    async    a task and an AsyncEz per student on one event loop (needs aiohttp)
+
+    python -m bench.load [--models threads,pool,async] [--students 200] [--duration-sec 30] [--think-sec 2]
+                         [--autograde-sec 2] [--autograde-jitter-sec 2] [--latency-ms 5] ... [--json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+import typing as T
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+
+import easy
+from bench.fake_server import add_config_arguments, make_token
+from bench.sdk import percentile, start_server_process
+
+MODELS = ('threads', 'pool', 'async')
+OPERATIONS = ('get_course_exercises', 'post_submission', 'await_submission')
+SOLUTION = 'print("hello, world")\n' * 20
+
+
+@dataclass
+class LoadConfig:
+    students: int
+    duration_sec: float
+    # Mean of the exponentially distributed pause between a student's actions
+    think_sec: float
+    # Students start at random times during this period
+    ramp_up_sec: float
+    courses: int
+    exercises: int
+    # http_pool_maxsize of the clients, the size of the shared pool in the pool model
+    pool_size: int
+    seed: int
+
+
+@dataclass
+class OperationResult:
+    calls: int
+    errors: int
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    # Exception class name -> count
+    error_types: T.Dict[str, int]
+
+
+@dataclass
+class Result:
+    model: str
+    students: int
+    elapsed_sec: float
+    calls_per_sec: float
+    operations: T.Dict[str, OperationResult]
+    peak_threads: int
+    peak_sockets: T.Optional[int]
+    peak_rss_mb: T.Optional[float]
+    rss_growth_mb: T.Optional[float]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: T.Dict[str, T.List[float]] = {op: [] for op in OPERATIONS}
+        self.errors: T.Dict[str, T.Dict[str, int]] = {op: {} for op in OPERATIONS}
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, latency_sec: float, error: T.Optional[BaseException]):
+        with self._lock:
+            self.latencies[operation].append(latency_sec)
+            if error is not None:
+                errors = self.errors[operation]
+                errors[type(error).__name__] = errors.get(type(error).__name__, 0) + 1
+
+    def operation_results(self) -> T.Dict[str, OperationResult]:
+        results = {}
+        for op in OPERATIONS:
+            latencies = sorted(self.latencies[op])
+            if not latencies:
+                results[op] = OperationResult(0, 0, 0, 0, 0, {})
+                continue
+            results[op] = OperationResult(len(latencies), sum(self.errors[op].values()),
+                                          percentile(latencies, 50) * 1000, percentile(latencies, 90) * 1000,
+                                          percentile(latencies, 99) * 1000, self.errors[op])
+        return results
+
+
+def count_sockets() -> T.Optional[int]:
+    """
+    Number of open sockets of this process, None where /proc is not available.
+    """
+    try:
+        fds = os.listdir('/proc/self/fd')
+    except OSError:
+        return None
+    count = 0
+    for fd in fds:
+        try:
+            if os.readlink(f'/proc/self/fd/{fd}').startswith('socket:'):
+                count += 1
+        except OSError:
+            pass
+    return count
+
+
+def current_rss_mb() -> T.Optional[float]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb() -> T.Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return max_rss / 1024 / 1024 if sys.platform == 'darwin' else max_rss / 1024
+
+
+class ResourceMonitor:
+    def __init__(self, interval_sec: float = 0.1):
+        """
+        Samples the threads, sockets and memory of this process in a thread of its own, which is not counted.
+        """
+        self.interval_sec = interval_sec
+        self.peak_threads = 0
+        self.base_sockets = count_sockets()
+        self.peak_sockets = self.base_sockets
+        self.base_rss_mb = current_rss_mb()
+        self.peak_rss_mb = self.base_rss_mb
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='load-resource-monitor', daemon=True)
+
+    def __enter__(self) -> 'ResourceMonitor':
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self.peak_threads = max(self.peak_threads, threading.active_count() - 1)
+            sockets = count_sockets()
+            if sockets is not None:
+                self.peak_sockets = max(self.peak_sockets, sockets)
+            rss = current_rss_mb()
+            if rss is not None:
+                self.peak_rss_mb = max(self.peak_rss_mb, rss)
+            if self._stopped.wait(self.interval_sec):
+                return
+
+
+def new_token_store(student: int) -> T.Dict[easy.TokenType, dict]:
+    # Only a refresh token, the access token is requested like after a login
+    return {easy.TokenType.REFRESH: {'token_type': easy.TokenType.REFRESH, 'token': make_token(f'student{student}'),
+                                     'expires_at': int(time.time()) + 24 * 3600}}
+
+
+def think_time(rng: random.Random, config: LoadConfig) -> float:
+    return rng.expovariate(1 / config.think_sec) if config.think_sec > 0 else 0
+
+
+def student_session(ez: easy.Ez, student: int, deadline: float, config: LoadConfig, recorder: Recorder):
+    rng = random.Random(config.seed + student)
+    course_id = str(student % config.courses)
+
+    def call(operation: str, fn: T.Callable[..., T.Any], *args: str) -> bool:
+        start = time.perf_counter()
+        try:
+            fn(*args)
+        except Exception as e:
+            recorder.record(operation, time.perf_counter() - start, e)
+            return False
+        recorder.record(operation, time.perf_counter() - start, None)
+        return True
+
+    time.sleep(rng.uniform(0, config.ramp_up_sec))
+    while time.monotonic() < deadline:
+        call('get_course_exercises', ez.student.get_course_exercises, course_id)
+        time.sleep(think_time(rng, config))
+        exercise_id = str(rng.randrange(config.exercises))
+        if call('post_submission', ez.student.post_submission, course_id, exercise_id, SOLUTION):
+            call('await_submission', ez.student.await_latest_exercise_submission_details, course_id, exercise_id)
+        time.sleep(think_time(rng, config))
+
+
+async def async_student_session(ez: T.Any, student: int, deadline: float, config: LoadConfig, recorder: Recorder):
+    rng = random.Random(config.seed + student)
+    course_id = str(student % config.courses)
+
+    async def call(operation: str, fn: T.Callable[..., T.Awaitable[T.Any]], *args: str) -> bool:
+        start = time.perf_counter()
+        try:
+            await fn(*args)
+        except Exception as e:
+            recorder.record(operation, time.perf_counter() - start, e)
+            return False
+        recorder.record(operation, time.perf_counter() - start, None)
+        return True
+
+    await asyncio.sleep(rng.uniform(0, config.ramp_up_sec))
+    while time.monotonic() < deadline:
+        await call('get_course_exercises', ez.student.get_course_exercises, course_id)
+        await asyncio.sleep(think_time(rng, config))
+        exercise_id = str(rng.randrange(config.exercises))
+        if await call('post_submission', ez.student.post_submission, course_id, exercise_id, SOLUTION):
+            await call('await_submission', ez.student.await_latest_exercise_submission_details, course_id,
+                       exercise_id)
+        await asyncio.sleep(think_time(rng, config))
+
+
+def run_threads(url: str, config: LoadConfig, recorder: Recorder, deadline: float):
+    clients = []
+    for student in range(config.students):
+        store = new_token_store(student)
+        clients.append(easy.Ez(url, url, 'bench', retrieve_token=store.get,
+                               persist_token=lambda token_type, token, store=store: store.__setitem__(token_type,
+                                                                                                      token),
+                               http_pool_maxsize=config.pool_size, logging_level=logging.WARNING))
+    try:
+        _run_student_threads(clients, config, recorder, deadline)
+    finally:
+        for ez in clients:
+            ez.shutdown()
+
+
+def run_pool(url: str, config: LoadConfig, recorder: Recorder, deadline: float):
+    from easy.pool import ClientPool
+
+    stores = {f'student{i}': new_token_store(i) for i in range(config.students)}
+
+    def token_storage(identity: str):
+        store = stores[identity]
+        return store.get, lambda token_type, token: store.__setitem__(token_type, token)
+
+    with ClientPool(url, url, 'bench', token_storage=token_storage, http_pool_maxsize=config.pool_size,
+                    max_idle_sec=config.duration_sec + config.ramp_up_sec + 60,
+                    logging_level=logging.WARNING) as pool:
+        clients = [pool.get(f'student{i}') for i in range(config.students)]
+        _run_student_threads(clients, config, recorder, deadline)
+
+
+def _run_student_threads(clients: T.List[easy.Ez], config: LoadConfig, recorder: Recorder, deadline: float):
+    threads = [threading.Thread(target=student_session, args=(ez, i, deadline, config, recorder),
+                                name=f'student{i}', daemon=True)
+               for i, ez in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_async(url: str, config: LoadConfig, recorder: Recorder, deadline: float):
+    async def main():
+        clients = []
+        for student in range(config.students):
+            store = new_token_store(student)
+            clients.append(easy.AsyncEz(url, url, 'bench', retrieve_token=store.get,
+                                        persist_token=lambda token_type, token, store=store: store.__setitem__(
+                                            token_type, token),
+                                        max_concurrent_requests=config.pool_size))
+        try:
+            await asyncio.gather(*(async_student_session(ez, i, deadline, config, recorder)
+                                   for i, ez in enumerate(clients)))
+        finally:
+            for ez in clients:
+                await ez.shutdown()
+
+    asyncio.run(main())
+
+
+RUNNERS: T.Dict[str, T.Callable[[str, LoadConfig, Recorder, float], None]] = {
+    'threads': run_threads,
+    'pool': run_pool,
+    'async': run_async,
+}
+
+
+def run_model(model: str, url: str, config: LoadConfig) -> Result:
+    """
+    Run the load test with one concurrency model, in a process of its own.
+    """
+    logging.basicConfig(level=logging.WARNING)
+    recorder = Recorder()
+    with ResourceMonitor() as monitor:
+        start = time.monotonic()
+        RUNNERS[model](url, config, recorder, start + config.ramp_up_sec + config.duration_sec)
+        elapsed = time.monotonic() - start
+
+    operations = recorder.operation_results()
+    calls = sum(op.calls for op in operations.values())
+    rss_growth = monitor.peak_rss_mb - monitor.base_rss_mb if monitor.base_rss_mb is not None else None
+    peak_sockets = monitor.peak_sockets - monitor.base_sockets if monitor.base_sockets is not None else None
+    return Result(model, config.students, elapsed, calls / elapsed, operations, monitor.peak_threads, peak_sockets,
+                  peak_rss_mb(), rss_growth)
+
+
+def print_results(results: T.List[Result]):
+    for r in results:
+        sockets = '-' if r.peak_sockets is None else r.peak_sockets
+        rss = '-' if r.peak_rss_mb is None else f'{r.peak_rss_mb:.1f}'
+        growth = '-' if r.rss_growth_mb is None else f'{r.rss_growth_mb:.1f}'
+        print(f'{r.model}: {r.students} students, {r.calls_per_sec:.1f} calls/s over {r.elapsed_sec:.1f} s, '
+              f'peak {r.peak_threads} threads, {sockets} sockets, {rss} MB RSS (+{growth} MB)')
+        print(f'  {"operation":<22}{"calls":>8}{"errors %":>10}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}')
+        for name, op in r.operations.items():
+            error_pct = 100 * op.errors / op.calls if op.calls else 0
+            print(f'  {name:<22}{op.calls:>8}{error_pct:>10.2f}{op.p50_ms:>10.1f}{op.p90_ms:>10.1f}{op.p99_ms:>10.1f}')
+            for error_type, count in op.error_types.items():
+                print(f'    {error_type}: {count}')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', default=','.join(MODELS), help='comma-separated, default: all')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--duration-sec', type=float, default=30, help='after the ramp-up')
+    parser.add_argument('--think-sec', type=float, default=2, help='mean pause between actions')
+    parser.add_argument('--ramp-up-sec', type=float, default=5)
+    parser.add_argument('--pool-size', type=int, default=100, help='max connections per client or pool')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    add_config_arguments(parser)
+    parser.set_defaults(latency_ms=5, autograde_sec=2, autograde_jitter_sec=2)
+    args = parser.parse_args()
+
+    models = args.models.split(',')
+    unknown = [m for m in models if m not in MODELS]
+    if unknown:
+        parser.error(f'unknown models: {", ".join(unknown)}')
+
+    config = LoadConfig(args.students, args.duration_sec, args.think_sec, args.ramp_up_sec, args.courses,
+                        args.exercises, args.pool_size, args.seed)
+    process, url = start_server_process(args)
+    results = []
+    try:
+        for model in models:
+            # A fresh interpreter per model, so that it starts with no threads, sockets or memory of the others
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                try:
+                    results.append(executor.submit(run_model, model, url, config).result())
+                except ImportError as e:
+                    print(f'Skipping {model}: {e}', file=sys.stderr)
+    finally:
+        process.terminate()
+
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2))
+    else:
+        print_results(results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+Benchmark the SDK's own overhead (connections, token lookup, JSON decoding and DTO construction) against the local
+fake server in bench/fake_server.py. The server runs in a subprocess so that it doesn't compete with the client for
+the GIL, peak memory is measured with tracemalloc in a separate pass.
+
+    python -m bench.sdk [--scenarios participants,teacher_submissions] [--iterations 200] [--concurrency 1]
+                        [--latency-ms 0] [--participants 1000] [--submissions 100] ... [--json]
+"""
+import argparse
+import json
+import logging
+import pathlib
+import subprocess
+import sys
+import time
+import tracemalloc
+import typing as T
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields
+
+import easy
+from bench.fake_server import (FakeEasyServer, FakeServerConfig, add_config_arguments, config_from_arguments,
+                               make_token)
+from easy.metrics import Metrics
+
+SCENARIOS: T.Dict[str, T.Callable[[easy.Ez], T.Any]] = {
+    'course_basic_info': lambda ez: ez.common.get_course_basic_info('1'),
+    'exercise_details': lambda ez: ez.student.get_exercise_details('1', '1'),
+    'student_exercises': lambda ez: ez.student.get_course_exercises('1'),
+    'teacher_exercises': lambda ez: ez.teacher.get_course_exercises('1'),
+    'participants': lambda ez: ez.teacher.get_course_participants('1'),
+    'teacher_submissions': lambda ez: ez.teacher.get_course_exercise_submissions_student('1', '1', 'student1'),
+    'student_submissions': lambda ez: ez.student.get_all_submissions('1', '1'),
+    'teacher_submissions_stream': lambda ez: consume(
+        ez.teacher.stream_course_exercise_submissions_student('1', '1', 'student1')),
+    'student_submissions_stream': lambda ez: consume(ez.student.stream_all_submissions('1', '1')),
+    'token_refresh': lambda ez: refresh_tokens(ez),
+}
+
+
+@dataclass
+class Result:
+    scenario: str
+    calls: int
+    calls_per_sec: float
+    p50_ms: float
+    p99_ms: float
+    peak_memory_mb: float
+    response_kb: float
+
+
+def refresh_tokens(ez: easy.Ez):
+    ez.util.set_stored_token(easy.TokenType.ACCESS, None)
+    ez.util.get_valid_access_token()
+
+
+def consume(items: T.Iterable[T.Any]) -> int:
+    count = 0
+    for _ in items:
+        count += 1
+    return count
+
+
+def percentile(sorted_values: T.List[float], p: float) -> float:
+    """
+    Nearest-rank percentile.
+    """
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def new_client(url: str, concurrency: int, keep_raw_response: bool) -> easy.Ez:
+    store = {}
+    ez = easy.Ez(url, url, 'bench', retrieve_token=store.get,
+                 persist_token=lambda token_type, token: store.__setitem__(token_type, token),
+                 http_pool_maxsize=max(10, concurrency), keep_raw_response=keep_raw_response,
+                 logging_level=logging.WARNING, metrics=Metrics())
+    store[easy.TokenType.REFRESH] = {'token_type': easy.TokenType.REFRESH, 'token': make_token('bench-user'),
+                                     'expires_at': int(time.time()) + 3600}
+    return ez
+
+
+def run_scenario(ez: easy.Ez, name: str, iterations: int, concurrency: int, memory_iterations: int) -> Result:
+    call = SCENARIOS[name]
+    # Warm up connections, tokens and decode plans
+    call(ez)
+
+    def timed_calls(n: int) -> T.List[float]:
+        latencies = []
+        for _ in range(n):
+            start = time.perf_counter()
+            call(ez)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    bytes_before = _response_bytes(ez)
+    start = time.perf_counter()
+    if concurrency == 1:
+        latencies = timed_calls(iterations)
+    else:
+        per_worker = [iterations // concurrency + (i < iterations % concurrency) for i in range(concurrency)]
+        with ThreadPoolExecutor(concurrency) as executor:
+            latencies = [lat for lats in executor.map(timed_calls, per_worker) for lat in lats]
+    elapsed = time.perf_counter() - start
+    bytes_per_call = (_response_bytes(ez) - bytes_before) / iterations
+
+    peak = 0
+    for _ in range(memory_iterations):
+        tracemalloc.start()
+        call(ez)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    latencies.sort()
+    return Result(name, iterations, iterations / elapsed, percentile(latencies, 50) * 1000,
+                  percentile(latencies, 99) * 1000, peak / 1024 / 1024, bytes_per_call / 1024)
+
+
+def _response_bytes(ez: easy.Ez) -> float:
+    return sum(e['response_bytes']['sum'] for e in ez.metrics.snapshot()['endpoints'].values())
+
+
+def start_server_process(args: argparse.Namespace) -> T.Tuple[subprocess.Popen, str]:
+    server_args = [f'--latency-ms={args.latency_ms}']
+    for name, value in vars(args).items():
+        if name in SERVER_CONFIG_ARGS:
+            server_args.append(f'--{name.replace("_", "-")}={value}')
+    process = subprocess.Popen([sys.executable, '-m', 'bench.fake_server', *server_args],
+                               cwd=pathlib.Path(__file__).parent.parent, stdout=subprocess.PIPE, text=True)
+    return process, process.stdout.readline().strip()
+
+
+SERVER_CONFIG_ARGS = {field.name for field in fields(FakeServerConfig) if field.name != 'latency_sec'}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated, default: all')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=1, help='number of threads making calls')
+    parser.add_argument('--memory-iterations', type=int, default=3, help='calls measured with tracemalloc')
+    parser.add_argument('--no-raw-response', action='store_true', help='create the client with keep_raw_response=False')
+    parser.add_argument('--in-process', action='store_true', help='run the fake server in a thread of this process')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(',')
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(unknown)}')
+
+    if args.in_process:
+        server = FakeEasyServer(config_from_arguments(args)).start()
+        url, stop = server.url, server.shutdown
+    else:
+        process, url = start_server_process(args)
+        stop = process.terminate
+
+    try:
+        results = []
+        for name in scenarios:
+            ez = new_client(url, args.concurrency, not args.no_raw_response)
+            try:
+                results.append(run_scenario(ez, name, args.iterations, args.concurrency, args.memory_iterations))
+            finally:
+                ez.shutdown()
+    finally:
+        stop()
+
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2))
+    else:
+        print(f'{"scenario":<22}{"calls/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"peak MB":>10}{"resp KB":>10}')
+        for r in results:
+            print(f'{r.scenario:<22}{r.calls_per_sec:>10.1f}{r.p50_ms:>10.2f}{r.p99_ms:>10.2f}'
+                  f'{r.peak_memory_mb:>10.2f}{r.response_kb:>10.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,3 +3,11 @@ from .defaults import gen_read_token_from_file, gen_write_token_to_file
 from .exceptions import *
 from .ez import Ez, TokenType
 from .util import decode_token
+
+
+def __getattr__(name):
+    # Imported on first use, so that asyncio is not imported by blocking clients
+    if name == 'AsyncEz':
+        from .aio import AsyncEz
+        return AsyncEz
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
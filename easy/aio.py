@@ -0,0 +1,388 @@
+import asyncio
+import contextlib
+import dataclasses
+import logging
+import time
+import typing as T
+from dataclasses import dataclass
+
+from . import data, util
+from .exceptions import AuthRequiredException
+from .metrics import Metrics, RequestEvent, ResponseEvent
+from .ez import API_VERSION_PREFIX, TIMEOUT, RequestUtil, StorableToken, TokenType
+from .util import decode_token
+
+
+def _import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError as e:
+        raise ImportError('AsyncEz requires aiohttp, install it with: pip install easy-py[async]') from e
+    return aiohttp
+
+
+class AsyncRequestUtil:
+    def __init__(self, request_util: RequestUtil, max_concurrent_requests: int):
+        # Token storage and parsing are shared with the blocking client, only network calls differ
+        self.request_util = request_util
+        self.max_concurrent_requests = max_concurrent_requests
+
+        # Created lazily so that they are bound to the running event loop
+        self._session = None
+        self._semaphore: T.Optional[asyncio.Semaphore] = None
+        self._refresh_lock: T.Optional[asyncio.Lock] = None
+
+    def _get_session(self):
+        if self._session is None:
+            aiohttp = _import_aiohttp()
+            connector = aiohttp.TCPConnector(limit=self.max_concurrent_requests)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=TIMEOUT))
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+            self._refresh_lock = asyncio.Lock()
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def simple_get_request(self, path: str, response_dto_class: T.Type[T.Any],
+                                 timeout: float = TIMEOUT) -> T.Any:
+        dto_class = {200: response_dto_class, 204: data.EmptyResp}
+        resp = await self._request('GET', path, timeout=_import_aiohttp().ClientTimeout(total=timeout))
+        return self.request_util.handle_dto_response('GET', path, resp, dto_class)
+
+    async def post_request(self, path: str, request_dto_dataclass: T.Any,
+                           resp_code_to_dto_class: T.Dict[int, T.Type[T.Any]]) -> T.Any:
+        req_body_dict = dataclasses.asdict(request_dto_dataclass)
+        resp = await self._request('POST', path, json=req_body_dict)
+        return self.request_util.handle_dto_response('POST', path, resp, resp_code_to_dto_class)
+
+    async def _request(self, method: str, path: str, **kwargs):
+        session = self._get_session()
+        headers = await self.get_token_header()
+        metrics = self.request_util.metrics
+        async with self._semaphore:
+            if metrics is not None:
+                event = RequestEvent(method, path, util.endpoint_template(path), 0)
+                metrics.before_request(event)
+                start = time.perf_counter()
+            try:
+                async with session.request(method, self.request_util.api_url + path, headers=headers,
+                                           **kwargs) as r:
+                    content = await r.read()
+                    resp = util.build_response(r.status, r.headers, content, str(r.url))
+            except Exception as e:
+                if metrics is not None:
+                    metrics.after_request(ResponseEvent(event, None, time.perf_counter() - start, 0, e))
+                raise
+        if metrics is not None:
+            metrics.after_request(ResponseEvent(event, resp.status_code, time.perf_counter() - start, len(content),
+                                                None))
+
+        if resp.status_code == 401:
+            self.request_util.clear_cached_access_token()
+            raise AuthRequiredException()
+        return resp
+
+    async def get_token_header(self) -> T.Dict[str, str]:
+        return self.request_util.token_header(await self.get_valid_access_token())
+
+    @staticmethod
+    async def _run_blocking(fn: T.Callable[..., T.Any], *args: T.Any) -> T.Any:
+        # Token storage may be files that are read, written and fsynced, keep that off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def get_valid_access_token(self) -> StorableToken:
+        access_token = self.request_util.get_memory_access_token()
+        if access_token is None:
+            access_token = await self._run_blocking(self.request_util.get_cached_access_token)
+        if access_token is not None:
+            return access_token
+
+        self._get_session()
+        async with self._refresh_lock:
+            # Another task might have refreshed the tokens while we were waiting for the lock
+            access_token = await self._run_blocking(self.request_util.get_cached_access_token)
+            if access_token is not None:
+                return access_token
+
+            if self.request_util.token_refresh_lock is None:
+                refreshed = await self._refresh_using_refresh_token()
+            else:
+                async with self._storage_refresh_lock():
+                    # Tokens refreshed by another process are picked up via token_version
+                    access_token = await self._run_blocking(self.request_util.get_cached_access_token)
+                    if access_token is not None:
+                        logging.debug("Tokens were refreshed by another process")
+                        return access_token
+                    refreshed = await self._refresh_using_refresh_token()
+
+            if refreshed:
+                access_token = await self._run_blocking(self.request_util.get_cached_access_token)
+                assert access_token is not None, 'Access token is not valid after refreshing'
+                return access_token
+            else:
+                raise AuthRequiredException()
+
+    @contextlib.asynccontextmanager
+    async def _storage_refresh_lock(self):
+        """
+        Hold the lock shared with other processes using the same token storage. It's acquired and released in worker
+        threads, as acquiring it blocks until the other processes have finished refreshing.
+        """
+        lock = self.request_util.token_refresh_lock()
+        acquire = asyncio.get_running_loop().run_in_executor(None, lock.__enter__)
+        try:
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # Release the lock once the worker thread has acquired it
+            acquire.add_done_callback(lambda f: f.cancelled() or f.exception() or lock.__exit__(None, None, None))
+            raise
+        try:
+            yield
+        finally:
+            await self._run_blocking(lock.__exit__, None, None, None)
+
+    async def _refresh_using_refresh_token(self) -> bool:
+        token_req_body = await self._run_blocking(self.request_util.get_refresh_request_body)
+        if token_req_body is None:
+            return False
+
+        session = self._get_session()
+        async with self._semaphore:
+            async with session.post(self.request_util.get_idp_token_url(), data=token_req_body) as r:
+                status = r.status
+                body = await r.json(content_type=None) if status == 200 else None
+
+        return await self._run_blocking(self.request_util.handle_refresh_response, status, body)
+
+
+class AsyncCommon:
+    def __init__(self, request_util: AsyncRequestUtil):
+        self.request_util = request_util
+
+    async def get_course_basic_info(self, course_id: str) -> data.BasicCourseInfoResp:
+        """
+        Get basic info about this course.
+        """
+        logging.debug("GET basic info about this course.")
+        path = f"/courses/{course_id}/basic"
+        return await self.request_util.simple_get_request(path, data.BasicCourseInfoResp)
+
+
+class AsyncStudent:
+    def __init__(self, request_util: AsyncRequestUtil):
+        self.request_util = request_util
+
+    async def get_courses(self) -> data.StudentCourseResp:
+        """
+        GET summaries of courses the authenticated student has access to.
+        """
+        logging.debug("GET summaries of courses the authenticated student has access to")
+        path = "/student/courses"
+        return await self.request_util.simple_get_request(path, data.StudentCourseResp)
+
+    async def get_course_exercises(self, course_id: str) -> data.StudentExerciseResp:
+        """
+        GET summaries of exercises on this course.
+        """
+        util.assert_not_none(course_id)
+        logging.debug("GET summaries of exercises on this course.")
+        path = f"/student/courses/{course_id}/exercises"
+        return await self.request_util.simple_get_request(path, data.StudentExerciseResp)
+
+    async def get_exercise_details(self, course_id: str, course_exercise_id: str) -> data.ExerciseDetailsResp:
+        """
+        GET the specified course exercise details.
+        """
+        logging.debug(f"GET exercise details for course '{course_id}' exercise '{course_exercise_id}'")
+        util.assert_not_none(course_id, course_exercise_id)
+        path = f"/student/courses/{course_id}/exercises/{course_exercise_id}"
+        return await self.request_util.simple_get_request(path, data.ExerciseDetailsResp)
+
+    async def get_latest_exercise_submission_details(self, course_id: str,
+                                                     course_exercise_id: str) -> data.SubmissionResp:
+        """
+        GET the latest submission's details to the specified course exercise without waiting for autograding.
+        """
+        logging.debug(f"GET latest submission's details to the '{course_id}' exercise '{course_exercise_id}'")
+        util.assert_not_none(course_id, course_exercise_id)
+        path = f"/student/courses/{course_id}/exercises/{course_exercise_id}/submissions/latest"
+        return await self.request_util.simple_get_request(path, data.SubmissionResp)
+
+    async def await_latest_exercise_submission_details(self, course_id: str, course_exercise_id: str,
+                                                       timeout_sec: float = TIMEOUT) -> data.SubmissionResp:
+        """
+        GET and wait for the latest submission's details to the specified course exercise.
+        Raises TimeoutError if the server doesn't respond in timeout_sec.
+        """
+        logging.debug(f"GET latest submission's details to the '{course_id}' exercise '{course_exercise_id}'")
+        util.assert_not_none(course_id, course_exercise_id)
+        path = f"/student/courses/{course_id}/exercises/{course_exercise_id}/submissions/latest/await"
+        try:
+            return await self.request_util.simple_get_request(path, data.SubmissionResp, timeout_sec)
+        except asyncio.TimeoutError as e:
+            raise TimeoutError(f"Submission to course '{course_id}' exercise '{course_exercise_id}' was not graded "
+                               f"in {timeout_sec} s") from e
+
+    async def get_all_exercise_teacher_activities(self, course_id: str,
+                                                  course_exercise_id: str) -> data.TeacherActivities:
+        """
+        GET all teacher activities for this exercise
+        """
+        logging.debug(f"GET teacher activities on course '{course_id}' exercise '{course_exercise_id}'")
+        util.assert_not_none(course_id, course_exercise_id)
+        path = f"/student/courses/{course_id}/exercises/{course_exercise_id}/activities"
+        return await self.request_util.simple_get_request(path, data.TeacherActivities)
+
+    async def get_all_submissions(self, course_id: str, course_exercise_id: str) -> data.StudentAllSubmissionsResp:
+        """
+        GET submissions to this course exercise.
+        """
+        logging.debug(f" GET submissions to course '{course_id}' course exercise '{course_exercise_id}'")
+        util.assert_not_none(course_id, course_exercise_id)
+        path = f"/student/courses/{course_id}/exercises/{course_exercise_id}/submissions/all"
+        return await self.request_util.simple_get_request(path, data.StudentAllSubmissionsResp)
+
+    async def set_student_last_access(self, course_id: str):
+        logging.debug(f"POST set student last access  to course '{course_id}'")
+        util.assert_not_none(course_id)
+
+        @dataclass
+        class EmptyReq:
+            pass
+
+        path = f"/student/courses/{course_id}/access"
+        return await self.request_util.post_request(path, EmptyReq(), {200: data.EmptyResp})
+
+    async def post_submission(self, course_id: str, course_exercise_id: str, solution: str) -> int:
+        """
+        POST submission to this course exercise.
+        """
+        logging.debug(f" POST submission '{solution}' to course '{course_id}' course exercise '{course_exercise_id}'")
+        util.assert_not_none(course_id, course_exercise_id, solution)
+
+        @dataclass
+        class Submission:
+            solution: str
+
+        path = f"/student/courses/{course_id}/exercises/{course_exercise_id}/submissions"
+        return await self.request_util.post_request(path, Submission(solution), {200: data.EmptyResp})
+
+
+class AsyncTeacher:
+    def __init__(self, request_util: AsyncRequestUtil):
+        self.request_util = request_util
+
+    async def get_courses(self) -> data.TeacherCourseResp:
+        """
+        GET summaries of courses the authenticated teacher has access to.
+        """
+        logging.debug("GET summaries of courses the authenticated teacher has access to")
+        path = "/teacher/courses"
+        return await self.request_util.simple_get_request(path, data.TeacherCourseResp)
+
+    async def get_course_participants(self, course_id: str, role: data.ParticipantRole = data.ParticipantRole.ALL,
+                                      limit: int = 1_000_000, offset: int = 0) -> data.TeacherCourseParticipantsResp:
+        """
+        GET participants on this course.
+        """
+        logging.debug(f"Get participants on course {course_id} with role {role} (offset: {offset}, limit: {limit})")
+        path = f"/courses/{course_id}/participants?role={role.value}&offset={offset}&limit={limit}"
+        return await self.request_util.simple_get_request(path, data.TeacherCourseParticipantsResp)
+
+    async def get_course_exercises(self, course_id: str) -> data.TeacherCourseExercisesResp:
+        """
+        GET exercises on this course.
+        """
+        logging.debug(f"Get teacher exercises on course {course_id}")
+        path = f"/teacher/courses/{course_id}/exercises"
+        return await self.request_util.simple_get_request(path, data.TeacherCourseExercisesResp)
+
+    async def get_course_exercise_submissions_student(
+            self, course_id: str, course_exercise_id: str, student_id: str, limit: int = 1_000_000,
+            offset: int = 0) -> data.TeacherCourseExerciseSubmissionsStudentResp:
+        """
+        GET submissions by this student to this course exercise.
+        """
+        logging.debug(f"Get submissions to course exercise {course_exercise_id} on course {course_id} by "
+                      f"student {student_id} (offset: {offset}, limit: {limit})")
+        path = f"/teacher/courses/{course_id}/exercises/{course_exercise_id}/submissions/all/students/{student_id}" \
+               f"?offset={offset}&limit={limit}"
+        return await self.request_util.simple_get_request(path, data.TeacherCourseExerciseSubmissionsStudentResp)
+
+
+class AsyncEz:
+    def __init__(self,
+                 api_base_url: str,
+                 idp_url: str,
+                 idp_client_name: str,
+                 retrieve_token: T.Optional[T.Callable[[TokenType], T.Optional[dict]]] = None,
+                 persist_token: T.Optional[T.Callable[[TokenType, dict], None]] = None,
+                 auth_token_min_valid_sec: int = 20,
+                 max_concurrent_requests: int = 100,
+                 keep_raw_response: bool = True,
+                 metrics: T.Optional[Metrics] = None):
+        """
+        asyncio client with the same services as Ez. All requests are made on the running event loop,
+        authentication has to be done beforehand, e.g. with Ez.start_auth_in_browser() using the same token storage.
+
+        Retrying failed requests, the circuit breaker, the response cache and request coalescing are only available
+        in Ez, requests of this client are sent once and not cached.
+
+        Requires aiohttp: pip install easy-py[async]
+
+        :param max_concurrent_requests: max number of requests in flight at the same time. Default: 100
+        :param keep_raw_response: see Ez. Default: True
+        :param metrics: see Ez. Default: None
+        """
+        # Both must be either None or defined
+        if (retrieve_token is None) != (persist_token is None):
+            raise ValueError('Both retrieve_token and persist_token must be either defined or None')
+        if retrieve_token is None:
+            retrieve_token, persist_token = util.memory_token_storage()
+
+        versioned_api_url = util.normalise_url(api_base_url) + API_VERSION_PREFIX
+        normalised_idp_url = util.normalise_url(idp_url)
+        self.metrics: T.Optional[Metrics] = metrics
+
+        token_util = RequestUtil(versioned_api_url, normalised_idp_url, idp_client_name,
+                                 auth_token_min_valid_sec, '', '',
+                                 retrieve_token, persist_token, None, keep_raw_response, metrics=self.metrics)
+        self.util = AsyncRequestUtil(token_util, max_concurrent_requests)
+        self.student: AsyncStudent = AsyncStudent(self.util)
+        self.teacher: AsyncTeacher = AsyncTeacher(self.util)
+        self.common: AsyncCommon = AsyncCommon(self.util)
+
+    async def __aenter__(self) -> 'AsyncEz':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.shutdown()
+
+    async def check_in(self) -> int:
+        """
+        POST check-in.
+        """
+        logging.debug("POST check-in")
+        d = decode_token((await self.util.get_valid_access_token()).token)
+
+        @dataclass
+        class Account:
+            first_name: str
+            last_name: str
+
+        path = "/account/checkin"
+        return await self.util.post_request(path, Account(d["given_name"], d["family_name"]), {200: data.EmptyResp})
+
+    async def is_auth_required(self) -> bool:
+        try:
+            await self.util.get_valid_access_token()
+            return False
+        except AuthRequiredException:
+            return True
+
+    async def shutdown(self):
+        await self.util.close()
@@ -0,0 +1,133 @@
+import html
+import json
+import logging
+import pathlib
+import threading
+import typing as T
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TEMPLATES_PATH = pathlib.Path(__file__).parent / 'auth-templates'
+# How quickly the server notices it has been shut down
+POLL_INTERVAL_SEC = 0.05
+
+
+def render_template(name: str, escape: bool, **context) -> bytes:
+    content = (TEMPLATES_PATH / name).read_text(encoding='utf-8')
+    for key, value in context.items():
+        value = str(value)
+        content = content.replace('{{ ' + key + ' }}', html.escape(value) if escape else value)
+    return content.encode('utf-8')
+
+
+class AuthCallbackServer:
+    def __init__(self,
+                 host: str,
+                 idp_url: str,
+                 idp_client_name: str,
+                 success_msg: str,
+                 fail_msg: str,
+                 deliver_tokens: T.Callable[[dict], None]):
+        """
+        Local HTTP server that serves the browser login page and receives the tokens from it.
+        The socket is bound right away, the server shuts itself down after the tokens have been delivered.
+
+        :param deliver_tokens: called with the JSON body posted by the login page
+        """
+        self.idp_url = idp_url
+        self.idp_client_name = idp_client_name
+        self.success_msg = success_msg
+        self.fail_msg = fail_msg
+        self.deliver_tokens = deliver_tokens
+
+        self.httpd = ThreadingHTTPServer((host, 0), AuthRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.auth_server = self
+        self.host = host
+        self.port: int = self.httpd.server_address[1]
+
+        self.ready = threading.Event()
+        self.closing = threading.Event()
+        self.thread = threading.Thread(target=self._serve, name='ez-auth-server')
+
+    @property
+    def login_url(self) -> str:
+        return f'http://{self.host}:{self.port}/login'
+
+    def start(self, timeout_sec: float):
+        self.thread.start()
+        if not self.ready.wait(timeout_sec):
+            logging.error('Waiting for the local auth server to start timed out')
+            raise RuntimeError('Waiting for the local auth server to start timed out')
+        logging.debug('Auth server is ready')
+
+    def is_active(self) -> bool:
+        return self.thread.is_alive() and not self.closing.is_set()
+
+    def shutdown(self):
+        self.closing.set()
+        if not self.thread.is_alive():
+            # Not started or failed to start, _serve won't close the socket
+            self.httpd.server_close()
+        elif self.thread is not threading.current_thread():
+            self.httpd.shutdown()
+
+    def _serve(self):
+        self.ready.set()
+        try:
+            self.httpd.serve_forever(poll_interval=POLL_INTERVAL_SEC)
+        finally:
+            self.httpd.server_close()
+            logging.debug('Auth server stopped')
+
+    def render_login(self) -> bytes:
+        return render_template('login.html', True, idp_url=self.idp_url, port=self.port,
+                               success_msg=self.success_msg, fail_msg=self.fail_msg)
+
+    def render_keycloak_conf(self) -> bytes:
+        return render_template('keycloak.json', False, idp_url=self.idp_url, client_name=self.idp_client_name)
+
+
+class AuthRequestHandler(BaseHTTPRequestHandler):
+    server: ThreadingHTTPServer
+
+    def log_message(self, format, *args):
+        logging.debug('Auth server: ' + format % args)
+
+    def do_GET(self):
+        auth_server: AuthCallbackServer = self.server.auth_server
+        path = self.path.split('?', 1)[0]
+        if path == '/login':
+            self._send(200, auth_server.render_login(), 'text/html; charset=utf-8')
+        elif path == '/keycloak.json':
+            self._send(200, auth_server.render_keycloak_conf(), 'application/json')
+        else:
+            self._send(404)
+
+    def do_POST(self):
+        auth_server: AuthCallbackServer = self.server.auth_server
+        if self.path.split('?', 1)[0] != '/deliver-tokens':
+            self._send(404)
+            return
+
+        # Stop accepting new logins first to decrease the race condition window
+        auth_server.closing.set()
+        status = 400
+        try:
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                auth_server.deliver_tokens(body)
+                status = 200
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning(f'Invalid tokens delivered to auth server: {repr(e)}')
+        finally:
+            self._send(status)
+            # Can't shut down from a request handler thread directly, it would wait for itself
+            threading.Thread(target=auth_server.shutdown).start()
+
+    def _send(self, status: int, body: bytes = b'', content_type: T.Optional[str] = None):
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
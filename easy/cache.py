@@ -0,0 +1,245 @@
+import abc
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import typing as T
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import requests
+
+from . import util
+
+# Endpoints whose responses rarely change, seconds to serve them from the cache without asking the server
+DEFAULT_TTL_SEC_BY_ENDPOINT = {
+    '/courses/{id}/basic': 300,
+    '/student/courses/{id}/exercises/{id}': 60,
+    '/teacher/courses/{id}/exercises': 30,
+}
+
+# Endpoints whose responses change while submissions are being graded, default_ttl_sec doesn't apply to them
+UNCACHED_BY_DEFAULT_ENDPOINTS = {
+    '/student/courses/{id}/exercises/{id}/submissions/latest',
+    '/student/courses/{id}/exercises/{id}/submissions/latest/await',
+    '/student/courses/{id}/exercises/{id}/submissions/all',
+    '/teacher/courses/{id}/exercises/{id}/submissions/all/students/{id}',
+}
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    headers: T.Dict[str, str]
+    content: bytes
+    url: str
+    stored_at: float
+    ttl_sec: float
+
+    def is_fresh(self) -> bool:
+        return time.time() < self.stored_at + self.ttl_sec
+
+    def validator_headers(self) -> T.Dict[str, str]:
+        headers = {}
+        if 'ETag' in self.headers:
+            headers['If-None-Match'] = self.headers['ETag']
+        if 'Last-Modified' in self.headers:
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+    def to_response(self) -> requests.Response:
+        return util.build_response(self.status_code, self.headers, self.content, self.url)
+
+    @staticmethod
+    def from_response(resp: requests.Response, ttl_sec: float) -> 'CachedResponse':
+        headers = {name: resp.headers[name] for name in ('Content-Type', 'ETag', 'Last-Modified')
+                   if name in resp.headers}
+        return CachedResponse(resp.status_code, headers, resp.content, resp.url, time.time(), ttl_sec)
+
+
+class CacheBackend(abc.ABC):
+    """
+    Storage for cached responses. Implementations must be safe to use from many threads.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str) -> T.Optional[CachedResponse]:
+        pass
+
+    @abc.abstractmethod
+    def set(self, key: str, value: CachedResponse):
+        pass
+
+    @abc.abstractmethod
+    def clear(self):
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: T.OrderedDict[str, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> T.Optional[CachedResponse]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: CachedResponse):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCacheBackend(CacheBackend):
+    """
+    Cache stored as one file per entry in a directory, readable only by the owner.
+    Least recently used entries are evicted by file modification time when there are more than max_entries, down to
+    evict_to_ratio * max_entries, so that the directory is scanned only once in a while.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 1000, evict_to_ratio: float = 0.9):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.evict_to_ratio = evict_to_ratio
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Approximate, other processes using the directory are only seen when it's scanned
+        self._entry_count = len(self._list_entries())
+
+    def _list_entries(self) -> T.List[str]:
+        return [name for name in os.listdir(self.directory) if name.endswith('.json')]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.json')
+
+    def get(self, key: str) -> T.Optional[CachedResponse]:
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                d = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        d['content'] = base64.b64decode(d['content'])
+        return CachedResponse(**d)
+
+    def set(self, key: str, value: CachedResponse):
+        d = {
+            'status_code': value.status_code,
+            'headers': value.headers,
+            'content': base64.b64encode(value.content).decode(),
+            'url': value.url,
+            'stored_at': value.stored_at,
+            'ttl_sec': value.ttl_sec,
+        }
+        path = self._path(key)
+        is_new = not os.path.exists(path)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(os.open(tmp_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+            json.dump(d, f)
+        os.replace(tmp_path, path)
+        if is_new:
+            with self._lock:
+                self._entry_count += 1
+                if self._entry_count > self.max_entries:
+                    self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in self._list_entries():
+            try:
+                entries.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+            except OSError:
+                pass
+        keep = int(self.max_entries * self.evict_to_ratio)
+        entries.sort()
+        removed = 0
+        for _, name in entries[:max(0, len(entries) - keep)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+            except OSError:
+                pass
+        self._entry_count = len(entries) - removed
+
+    def clear(self):
+        with self._lock:
+            for name in self._list_entries():
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    # Removed by another process sharing the directory
+                    pass
+            self._entry_count = 0
+
+
+class ResponseCache:
+    def __init__(self,
+                 backend: T.Optional[CacheBackend] = None,
+                 ttl_sec_by_endpoint: T.Optional[T.Dict[str, float]] = None,
+                 default_ttl_sec: T.Optional[float] = None):
+        """
+        Cache for GET responses. Only endpoints with a TTL are cached, after the TTL has passed the response is
+        revalidated with its ETag/Last-Modified if the server sent them, otherwise requested again.
+
+        :param backend: default: MemoryCacheBackend()
+        :param ttl_sec_by_endpoint: TTLs by endpoint template, e.g. '/courses/{id}/basic'.
+            Default: DEFAULT_TTL_SEC_BY_ENDPOINT
+        :param default_ttl_sec: TTL for endpoints not in ttl_sec_by_endpoint, except for the submission endpoints in
+            UNCACHED_BY_DEFAULT_ENDPOINTS, default: these are not cached
+        """
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttl_sec_by_endpoint = ttl_sec_by_endpoint if ttl_sec_by_endpoint is not None \
+            else DEFAULT_TTL_SEC_BY_ENDPOINT
+        self.default_ttl_sec = default_ttl_sec
+
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def get_ttl_sec(self, path: str) -> T.Optional[float]:
+        endpoint = util.endpoint_template(path)
+        if endpoint in self.ttl_sec_by_endpoint:
+            return self.ttl_sec_by_endpoint[endpoint]
+        return None if endpoint in UNCACHED_BY_DEFAULT_ENDPOINTS else self.default_ttl_sec
+
+    def get(self, user_key: str, path: str) -> T.Optional[CachedResponse]:
+        return self.backend.get(f'{user_key}:{path}')
+
+    def store(self, user_key: str, path: str, resp: requests.Response, ttl_sec: float):
+        self.backend.set(f'{user_key}:{path}', CachedResponse.from_response(resp, ttl_sec))
+
+    def refresh(self, user_key: str, path: str, cached: CachedResponse):
+        cached.stored_at = time.time()
+        self.backend.set(f'{user_key}:{path}', cached)
+
+    def count(self, hit: bool = False, miss: bool = False, revalidated: bool = False):
+        with self._stats_lock:
+            self.hits += hit
+            self.misses += miss
+            self.revalidated += revalidated
+
+    def stats(self) -> T.Dict[str, int]:
+        """
+        Hits include responses revalidated with the server.
+        """
+        with self._stats_lock:
+            return {'hits': self.hits, 'misses': self.misses, 'revalidated': self.revalidated}
+
+    def clear(self):
+        logging.debug('Clearing response cache')
+        self.backend.clear()
@@ -0,0 +1,71 @@
+"""
+JSON decoding of response bodies. orjson is used if it's installed (pip install easy-py[fast]), otherwise the
+standard library's json. Another decoder can be plugged in with set_codec().
+"""
+import abc
+import json
+import logging
+import typing as T
+
+# Encodings whose bytes can be given to the parser as they are
+NATIVE_ENCODINGS = {'utf-8', 'utf8'}
+
+
+class JsonCodec(abc.ABC):
+    name: str
+
+    @abc.abstractmethod
+    def loads(self, content: T.Union[bytes, str]) -> T.Any:
+        """
+        Parse a JSON document, raise ValueError if it's invalid.
+        """
+
+
+class StdlibJsonCodec(JsonCodec):
+    name = 'json'
+
+    def loads(self, content: T.Union[bytes, str]) -> T.Any:
+        return json.loads(content)
+
+
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._loads = orjson.loads
+
+    def loads(self, content: T.Union[bytes, str]) -> T.Any:
+        return self._loads(content)
+
+
+_codec: T.Optional[JsonCodec] = None
+
+
+def get_codec() -> JsonCodec:
+    global _codec
+    if _codec is None:
+        try:
+            _codec = OrjsonCodec()
+        except ImportError:
+            _codec = StdlibJsonCodec()
+        logging.debug(f'Using {_codec.name} for decoding JSON')
+    return _codec
+
+
+def set_codec(codec: T.Optional[JsonCodec]):
+    """
+    Use this codec for decoding all responses, None to pick the fastest available one again.
+    """
+    global _codec
+    _codec = codec
+
+
+def loads(content: bytes, encoding: T.Optional[str] = None) -> T.Any:
+    """
+    Parse a response body. The bytes are passed to the parser as they are unless the response declared a charset
+    other than UTF-8.
+    """
+    if encoding is not None and encoding.lower() not in NATIVE_ENCODINGS:
+        return get_codec().loads(content.decode(encoding))
+    return get_codec().loads(content)
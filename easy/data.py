@@ -1,8 +1,23 @@
 import typing as T
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from enum import Enum
 
 import requests
+from requests.structures import CaseInsensitiveDict
+
+
+def _slotted_dataclass(cls):
+    """
+    Dataclass with __slots__ instead of a per-instance __dict__, like dataclass(slots=True) on Python 3.10+.
+    Instances can't have attributes other than their fields and don't support weak references.
+    """
+    cls = dataclass(cls)
+    inherited_slots = {slot for base in cls.__mro__[1:] for slot in getattr(base, '__slots__', ())}
+    cls_dict = dict(cls.__dict__)
+    cls_dict['__slots__'] = tuple(f.name for f in fields(cls) if f.name not in inherited_slots)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
 
 
 class AutogradeStatus(Enum):
@@ -26,7 +41,7 @@ class ExerciseStatus(Enum):
 
 class SolutionFileType(Enum):
     TEXT_EDITOR = "TEXT_EDITOR"
-    TEXT_UPLOAD = "TEXT_UPLOAd"
+    TEXT_UPLOAD = "TEXT_UPLOAD"
 
 
 class ParticipantRole(Enum):
@@ -35,18 +50,32 @@ class ParticipantRole(Enum):
     ALL = "all"
 
 
-@dataclass
+@_slotted_dataclass
+class ResponseMeta:
+    """
+    What is kept of the raw response when the client is configured not to keep the whole requests.Response.
+    """
+    status_code: int
+    headers: CaseInsensitiveDict
+    url: str
+
+    @staticmethod
+    def from_response(resp: requests.Response) -> 'ResponseMeta':
+        return ResponseMeta(resp.status_code, resp.headers, resp.url)
+
+
+@_slotted_dataclass
 class Resp:
     resp_code: int
-    response: requests.Response
+    response: T.Union[requests.Response, ResponseMeta]
 
 
-@dataclass
+@_slotted_dataclass
 class EmptyResp(Resp):
     pass
 
 
-@dataclass
+@_slotted_dataclass
 class ExerciseDetailsResp(Resp):
     effective_title: str
     text_html: str
@@ -59,20 +88,20 @@ class ExerciseDetailsResp(Resp):
     solution_file_type: SolutionFileType
 
 
-@dataclass
+@_slotted_dataclass
 class GradeResp(Resp):
     grade: int
     is_autograde: bool
     is_graded_directly: bool
 
 
-@dataclass
+@_slotted_dataclass
 class AutomaticAssessmentResp(Resp):
     grade: int
     feedback: str
 
 
-@dataclass
+@_slotted_dataclass
 class StudentExercise(Resp):
     id: str
     effective_title: str
@@ -84,12 +113,12 @@ class StudentExercise(Resp):
     ordering_idx: int
 
 
-@dataclass
+@_slotted_dataclass
 class StudentExerciseResp(Resp):
     exercises: T.List[StudentExercise]
 
 
-@dataclass
+@_slotted_dataclass
 class StudentCourse(Resp):
     id: str
     title: str
@@ -98,12 +127,12 @@ class StudentCourse(Resp):
     last_accessed: str
 
 
-@dataclass
+@_slotted_dataclass
 class StudentCourseResp(Resp):
     courses: T.List[StudentCourse]
 
 
-@dataclass
+@_slotted_dataclass
 class SubmissionResp(Resp):
     id: str
     number: int
@@ -115,12 +144,12 @@ class SubmissionResp(Resp):
     auto_assessment: AutomaticAssessmentResp
 
 
-@dataclass
+@_slotted_dataclass
 class StudentAllSubmissionsResp(Resp):
     submissions: T.List[SubmissionResp]
 
 
-@dataclass
+@_slotted_dataclass
 class TeacherCourse(Resp):
     id: str
     title: str
@@ -129,25 +158,25 @@ class TeacherCourse(Resp):
     student_count: int
 
 
-@dataclass
+@_slotted_dataclass
 class TeacherCourseResp(Resp):
     courses: T.List[TeacherCourse]
 
 
-@dataclass
+@_slotted_dataclass
 class BasicCourseInfoResp(Resp):
     title: str
     alias: str
     archived: bool
 
 
-@dataclass
+@_slotted_dataclass
 class CourseGroup:
     id: str
     name: str
 
 
-@dataclass
+@_slotted_dataclass
 class CourseParticipantsStudent:
     id: str
     email: str
@@ -158,7 +187,7 @@ class CourseParticipantsStudent:
     moodle_username: str
 
 
-@dataclass
+@_slotted_dataclass
 class CourseParticipantsTeacher:
     id: str
     email: str
@@ -167,21 +196,21 @@ class CourseParticipantsTeacher:
     created_at: str
 
 
-@dataclass
+@_slotted_dataclass
 class CourseParticipantsStudentPending:
     email: str
     valid_from: str
     groups: T.List[CourseGroup]
 
 
-@dataclass
+@_slotted_dataclass
 class CourseParticipantsStudentPendingMoodle:
     moodle_username: str
     email: str
     groups: T.List[CourseGroup]
 
 
-@dataclass
+@_slotted_dataclass
 class TeacherCourseParticipantsResp(Resp):
     students: T.List[CourseParticipantsStudent]
     teachers: T.List[CourseParticipantsTeacher]
@@ -189,7 +218,7 @@ class TeacherCourseParticipantsResp(Resp):
     students_moodle_pending: T.List[CourseParticipantsStudentPendingMoodle]
 
 
-@dataclass
+@_slotted_dataclass
 class TeacherCourseExercises:
     course_exercise_id: str
     exercise_id: str
@@ -210,12 +239,12 @@ class TeacherCourseExercises:
     # latest_submissions: T.List[SubmissionRow] TODO:  #out of date as of 02.08.2024. Implement data class SubmissionRow.
 
 
-@dataclass
+@_slotted_dataclass
 class TeacherCourseExercisesResp(Resp):
     exercises: T.List[TeacherCourseExercises]
 
 
-@dataclass
+@_slotted_dataclass
 class TeacherCourseExerciseSubmissionsStudent:
     id: str
     solution: str
@@ -226,26 +255,26 @@ class TeacherCourseExerciseSubmissionsStudent:
     feedback_teacher: str
 
 
-@dataclass
+@_slotted_dataclass
 class TeacherCourseExerciseSubmissionsStudentResp(Resp):
     submissions: T.List[TeacherCourseExerciseSubmissionsStudent]
     count: int
 
 
-@dataclass
+@_slotted_dataclass
 class FeedbackResp(Resp):
     feedback_html: str
     feedback_adoc: str
 
 
-@dataclass
+@_slotted_dataclass
 class TeacherResp(Resp):
     id: str
     given_name: str
     family_name: str
 
 
-@dataclass
+@_slotted_dataclass
 class TeacherActivityResp(Resp):
     id: str
     submission_id: str
@@ -256,7 +285,56 @@ class TeacherActivityResp(Resp):
     feedback: FeedbackResp
     teacher: TeacherResp
 
-@dataclass
+@_slotted_dataclass
 class TeacherActivities(Resp):
     teacher_activities: T.List[TeacherActivityResp]
 
+
+@_slotted_dataclass
+class CourseSubmissionsBulkItem:
+    student_id: str
+    course_exercise_id: str
+    submissions: T.Optional[TeacherCourseExerciseSubmissionsStudentResp]
+    error: T.Optional[Exception]
+
+
+@_slotted_dataclass
+class AwaitedSubmission:
+    course_id: str
+    course_exercise_id: str
+    submission: T.Optional[SubmissionResp]
+    error: T.Optional[Exception]
+
+
+@_slotted_dataclass
+class SubmissionBatchResult:
+    course_id: str
+    course_exercise_id: str
+    submission: T.Optional[SubmissionResp]
+    error: T.Optional[Exception]
+    post_sec: T.Optional[float]
+    grading_sec: T.Optional[float]
+
+
+@_slotted_dataclass
+class ExerciseSnapshot:
+    exercise: StudentExercise
+    details: T.Optional[ExerciseDetailsResp]
+    details_error: T.Optional[Exception]
+    activities: T.Optional[TeacherActivities]
+    activities_error: T.Optional[Exception]
+
+
+@_slotted_dataclass
+class CourseSnapshot:
+    course: StudentCourse
+    # None if not requested or if getting them failed
+    exercises: T.Optional[T.List[ExerciseSnapshot]]
+    error: T.Optional[Exception]
+
+
+@_slotted_dataclass
+class StudentSnapshot:
+    courses: T.List[CourseSnapshot]
+    # Epoch seconds when the snapshot was started
+    created_at: float
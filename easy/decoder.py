@@ -0,0 +1,147 @@
+import dataclasses
+import logging
+import threading
+import typing as T
+from enum import Enum
+
+import requests
+
+from .data import Resp, ResponseMeta
+
+# Fields of Resp that are set from the response itself, not from the JSON body
+RESP_FIELDS = {"resp_code", "response"}
+
+RawResponse = T.Union[requests.Response, ResponseMeta]
+Converter = T.Callable[[T.Any, int, RawResponse], T.Any]
+
+
+class DecodePlan:
+    """
+    Precomputed instructions for building one DTO class from a JSON object.
+    """
+    __slots__ = ('dto_class', 'is_resp', 'fields', 'field_names')
+
+    def __init__(self, dto_class: T.Type[T.Any], is_resp: bool,
+                 fields: T.List[T.Tuple[str, T.Optional[Converter]]]):
+        self.dto_class = dto_class
+        self.is_resp = is_resp
+        self.fields = fields
+        self.field_names = frozenset(name for name, _ in fields)
+
+
+_plans: T.Dict[type, DecodePlan] = {}
+_plans_lock = threading.Lock()
+_schema_drift_counts: T.Dict[str, int] = {}
+
+
+def schema_drift_counts() -> T.Dict[str, int]:
+    """
+    Number of decoded objects per DTO class whose JSON differed from the class' fields or enum values.
+    """
+    return dict(_schema_drift_counts)
+
+
+def get_plan(dto_class: T.Type[T.Any]) -> DecodePlan:
+    plan = _plans.get(dto_class)
+    if plan is None:
+        with _plans_lock:
+            plan = _plans.get(dto_class)
+            if plan is None:
+                plan = _build_plan(dto_class)
+                _plans[dto_class] = plan
+    return plan
+
+
+def decode(dto_class: T.Type[T.Any], json_obj: dict, resp_code: int, response: RawResponse) -> T.Any:
+    """
+    Build dto_class and all nested dataclasses and enums from the decoded JSON object.
+
+    Due to the usage of data classes:
+    1. Extra fields are filtered: avoid X.__init__() got an unexpected keyword argument 'X'
+    2. Missing fields are set to None: avoid "X.__init__() missing x required positional arguments"
+    """
+    plan = get_plan(dto_class)
+
+    values = {}
+    for name, converter in plan.fields:
+        value = json_obj.get(name)
+        if value is not None and converter is not None:
+            value = converter(value, resp_code, response)
+        values[name] = value
+
+    if json_obj.keys() != plan.field_names:
+        _record_drift(dto_class, response, keys=json_obj.keys(), field_names=plan.field_names)
+
+    if plan.is_resp:
+        return dto_class(resp_code=resp_code, response=response, **values)
+    return dto_class(**values)
+
+
+def _record_drift(dto_class: type, response: T.Optional[RawResponse], keys: T.AbstractSet[str] = frozenset(),
+                  field_names: T.AbstractSet[str] = frozenset(), value: T.Any = None):
+    """
+    Count an object whose keys differ from the DTO's field_names, or an unknown enum value. Only the first one per
+    class is logged, so the difference is only described then.
+    """
+    name = dto_class.__name__
+    # Objects are decoded in executor threads too
+    with _plans_lock:
+        count = _schema_drift_counts.get(name, 0)
+        _schema_drift_counts[name] = count + 1
+    if count == 0:
+        url = response.url if response is not None else None
+        difference = f"Unknown value: {value}" if issubclass(dto_class, Enum) \
+            else f"Difference in attributes: {set(field_names ^ keys)}"
+        logging.warning(f"Response from {url} differs from expected {name}, further differences are only counted. "
+                        f"{difference}")
+
+
+def _build_plan(dto_class: T.Type[T.Any]) -> DecodePlan:
+    hints = T.get_type_hints(dto_class)
+    fields = [(f.name, _build_converter(hints.get(f.name))) for f in dataclasses.fields(dto_class)
+              if f.name not in RESP_FIELDS]
+    return DecodePlan(dto_class, issubclass(dto_class, Resp), fields)
+
+
+def _build_converter(type_hint: T.Any) -> T.Optional[Converter]:
+    """
+    Return a function that converts a JSON value to type_hint, or None if the value can be used as is.
+    """
+    if isinstance(type_hint, type) and dataclasses.is_dataclass(type_hint):
+        def convert_dataclass(value, resp_code, response):
+            return decode(type_hint, value, resp_code, response) if isinstance(value, dict) else value
+
+        return convert_dataclass
+
+    if isinstance(type_hint, type) and issubclass(type_hint, Enum):
+        members = {m.value: m for m in type_hint}
+
+        def convert_enum(value, resp_code, response):
+            member = members.get(value)
+            if member is None:
+                _record_drift(type_hint, response, value=value)
+                return value
+            return member
+
+        return convert_enum
+
+    origin = getattr(type_hint, '__origin__', None)
+    if origin is list:
+        item_converter = _build_converter(type_hint.__args__[0])
+        if item_converter is None:
+            return None
+
+        def convert_list(value, resp_code, response):
+            if not isinstance(value, list):
+                return value
+            return [item_converter(v, resp_code, response) if v is not None else None for v in value]
+
+        return convert_list
+
+    if origin is T.Union:
+        # Optional[X]
+        args = [a for a in type_hint.__args__ if a is not type(None)]
+        if len(args) == 1:
+            return _build_converter(args[0])
+
+    return None
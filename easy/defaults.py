@@ -1,9 +1,22 @@
+import contextlib
 import json
 import os
+import tempfile
+import time
 import typing as T
 
 from easy import ez
 
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+REPLACE_MAX_RETRIES = 10
+REPLACE_RETRY_DELAY_SEC = 0.05
+LOCK_TIMEOUT_SEC = 60
+LOCK_RETRY_DELAY_SEC = 0.05
+
 
 def gen_read_token_from_file(storage_path_provider: T.Callable[[ez.TokenType], str],
                              namer: T.Callable[[ez.TokenType], str]):
@@ -16,6 +29,22 @@ def gen_read_token_from_file(storage_path_provider: T.Callable[[ez.TokenType], s
                 pass
         return None
 
+    def token_version(token_type: ez.TokenType) -> T.Optional[T.Tuple[int, int, int]]:
+        try:
+            stat = os.stat(os.path.join(storage_path_provider(token_type), namer(token_type)))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def refresh_lock() -> T.ContextManager:
+        containing_dir = storage_path_provider(ez.TokenType.REFRESH)
+        os.makedirs(containing_dir, exist_ok=True)
+        return lock_file(os.path.join(containing_dir, f'.{namer(ez.TokenType.REFRESH)}.lock'))
+
+    # Lets the client keep the token in memory until the file changes
+    read_token_from_file.token_version = token_version
+    # Lets processes sharing the files take turns refreshing, others pick up the refreshed tokens
+    read_token_from_file.refresh_lock = refresh_lock
     return read_token_from_file
 
 
@@ -40,5 +69,64 @@ def get_file_content(file_name) -> str:
 
 
 def write_restricted_file(file_name, file_content):
-    with open(os.open(file_name, os.O_CREAT | os.O_WRONLY, 0o600), "w") as f:
-        f.write(file_content)
+    # Write to a temporary file and replace atomically, so that readers never see a partially written file.
+    # The temporary file is unique to this call, as threads and processes may write the same file concurrently,
+    # and mkstemp creates it readable only by the owner.
+    fd, tmp_file_name = tempfile.mkstemp(prefix=os.path.basename(file_name) + '.', suffix='.tmp',
+                                         dir=os.path.dirname(os.path.abspath(file_name)))
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            f.write(file_content)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp_file_name)
+        raise
+
+    for attempt in range(REPLACE_MAX_RETRIES):
+        try:
+            os.replace(tmp_file_name, file_name)
+            return
+        except PermissionError:
+            # On Windows, the file cannot be replaced while another process is reading it
+            if attempt == REPLACE_MAX_RETRIES - 1:
+                os.remove(tmp_file_name)
+                raise
+            time.sleep(REPLACE_RETRY_DELAY_SEC)
+
+
+@contextlib.contextmanager
+def lock_file(file_name, timeout_sec: float = LOCK_TIMEOUT_SEC):
+    """
+    Hold an exclusive advisory lock on the file, shared between processes.
+    Raise TimeoutError if it's not acquired in timeout_sec.
+    """
+    deadline = time.monotonic() + timeout_sec
+    with open(os.open(file_name, os.O_CREAT | os.O_RDWR, 0o600)) as f:
+        if os.name == 'nt':
+            while True:
+                try:
+                    # Retries for 10 seconds before failing
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f'Could not lock {file_name} in {timeout_sec} s')
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            while True:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f'Could not lock {file_name} in {timeout_sec} s')
+                    time.sleep(LOCK_RETRY_DELAY_SEC)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
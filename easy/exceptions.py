@@ -1,7 +1,7 @@
 import typing as T
 from dataclasses import dataclass
 
-from requests import Response
+from requests import RequestException, Response
 
 
 @dataclass
@@ -25,3 +25,19 @@ class AuthRequiredException(Exception):
     def __init__(self):
         self.msg = 'Authentication is required. Call Ez.auth_in_browser() to start authentication.'
         super().__init__(self.msg)
+
+
+class CircuitOpenException(RequestException):
+    def __init__(self, host: str, retry_in_sec: float):
+        self.host = host
+        self.retry_in_sec = retry_in_sec
+        self.msg = f'Requests to {host} are failing, not trying again for {retry_in_sec:.0f} seconds.'
+        super().__init__(self.msg)
+
+
+class NoSubmissionException(Exception):
+    def __init__(self, course_id: str, course_exercise_id: str):
+        self.course_id = course_id
+        self.course_exercise_id = course_exercise_id
+        self.msg = f"There is no submission to course '{course_id}' exercise '{course_exercise_id}'."
+        super().__init__(self.msg)
@@ -1,27 +1,33 @@
 import dataclasses
+import hashlib
 import logging
-import pathlib
-import sys
 import threading
 import time
 import typing as T
-import webbrowser
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from enum import Enum
 
 import requests
-from flask import Flask, request, Response, render_template
 from requests import RequestException
 
-from . import data, util
-from .exceptions import AuthRequiredException
+from . import cache, data, gradebook, retry, stream, util
+from .exceptions import AuthRequiredException, ErrorResponseException, NoSubmissionException
+from .metrics import Metrics, RequestEvent, ResponseEvent
 from .util import decode_token
 
+if T.TYPE_CHECKING:
+    from .auth_server import AuthCallbackServer
+
 API_VERSION_PREFIX = '/v2'
 AUTH_SERVER_HOST = '127.0.0.1'
-AUTH_SERVER_START_POLL_DELAY_SEC = 0.2
-AUTH_SERVER_START_POLL_MAX_RETRIES = 20
+AUTH_SERVER_START_TIMEOUT_SEC = 4
 TIMEOUT = 60
+STREAM_CHUNK_SIZE = 64 * 1024
+AUTOGRADE_FINISHED_STATUSES = {data.AutogradeStatus.COMPLETED, data.AutogradeStatus.FAILED, data.AutogradeStatus.NONE}
+TOKEN_REFRESHER_RETRY_DELAY_SEC = 30
+TOKEN_REFRESHER_MAX_SLEEP_SEC = 60
 
 
 class TokenType(str, Enum):
@@ -45,9 +51,17 @@ class RequestUtil:
                  auth_browser_success_msg: str,
                  auth_browser_fail_msg: str,
                  retrieve_token: T.Callable[[TokenType], T.Optional[dict]],
-                 persist_token: T.Callable[[TokenType, T.Optional[dict]], None]):
+                 persist_token: T.Callable[[TokenType, T.Optional[dict]], None],
+                 session: T.Optional[requests.Session],
+                 keep_raw_response: bool = True,
+                 response_cache: T.Optional[cache.ResponseCache] = None,
+                 retry_policy: T.Optional[retry.RetryPolicy] = None,
+                 circuit_breaker: T.Optional[retry.CircuitBreaker] = None,
+                 metrics: T.Optional[Metrics] = None,
+                 coalesce_requests: bool = False):
 
         self.api_url = api_url
+        self.api_host = urllib.parse.urlsplit(api_url).netloc
         self.idp_url = idp_url
         self.idp_client_name = idp_client_name
         self.auth_token_min_valid_sec = auth_token_min_valid_sec
@@ -55,69 +69,378 @@ class RequestUtil:
         self.auth_browser_fail_msg = auth_browser_fail_msg
         self.retrieve_token = retrieve_token
         self.persist_token = persist_token
+        self.session = session
+        self.keep_raw_response = keep_raw_response
+        self.response_cache = response_cache
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.metrics = metrics
+        self.coalesce_requests = coalesce_requests
+        # (user key, path, DTO class) -> result of the GET request currently in flight
+        self._in_flight: T.Dict[T.Tuple[str, str, type], Future] = {}
+        self._in_flight_lock = threading.Lock()
+        # Number of GET requests that were served by another identical request in flight
+        self.coalesced_count = 0
+        # Optional cheap check whether the stored tokens have changed, e.g. file modification time
+        self.token_version: T.Optional[T.Callable[[TokenType], T.Any]] = getattr(retrieve_token, 'token_version', None)
+        # (access token, storage version it was read at, authorization header)
+        self._access_token_cache: T.Optional[T.Tuple[StorableToken, T.Any, T.Dict[str, str]]] = None
+        # Only one thread refreshes the tokens at a time, others wait for its result
+        self._refresh_lock = threading.Lock()
+        # Whether the last refresh failed because the refresh token has expired or was rejected by the IdP, so that
+        # retrying is pointless until a new one is stored
+        self.refresh_rejected = False
+        # Optional lock shared with other processes using the same token storage
+        self.token_refresh_lock: T.Optional[T.Callable[[], T.ContextManager]] = getattr(retrieve_token, 'refresh_lock',
+                                                                                        None)
+        # (token, user key) of the last token the user key was computed for
+        self._user_key: T.Tuple[T.Optional[str], str] = (None, '')
+
+        self.auth_server: T.Optional['AuthCallbackServer'] = None
+
+    def simple_get_request(self, path: str, response_dto_class: T.Type[T.Any], timeout: float = TIMEOUT,
+                           long_poll: bool = False) -> T.Any:
+        headers = self.get_token_header()
+        if not self.coalesce_requests or long_poll:
+            return self._get(path, response_dto_class, headers, timeout, long_poll)
+
+        key = (self._get_user_key(headers["Authorization"]), path, response_dto_class)
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.coalesced_count += 1
+        if not is_owner:
+            logging.debug(f"Waiting for the identical GET {path} in flight")
+            if self.metrics is not None:
+                self.metrics.record_coalesced('GET', util.endpoint_template(path))
+            # Not future.result(), which would raise the owner's exception instance in every waiting thread
+            error = future.exception()
+            if error is not None:
+                raise util.copy_exception(error) from error
+            return future.result()
 
-        self.auth_server_port: T.Optional[int] = None
-        self.auth_server_thread: T.Optional[threading.Thread] = None
-
-    def simple_get_request(self, path: str, response_dto_class: T.Type[T.Any]) -> T.Any:
+        try:
+            result = self._get(path, response_dto_class, headers, timeout, long_poll)
+        except BaseException as e:
+            self._finish_in_flight(key)
+            future.set_exception(e)
+            raise
+        self._finish_in_flight(key)
+        future.set_result(result)
+        return result
+
+    def _finish_in_flight(self, key: T.Tuple[str, str, type]):
+        # Later requests are sent again instead of getting this result
+        with self._in_flight_lock:
+            del self._in_flight[key]
+
+    def _get(self, path: str, response_dto_class: T.Type[T.Any], headers: T.Dict[str, str], timeout: float,
+             long_poll: bool) -> T.Any:
         dto_class = {200: response_dto_class, 204: data.EmptyResp}
+        # Long-polls are never cached, their timeouts must reach the caller as they are
+        ttl_sec = self.response_cache.get_ttl_sec(path) if self.response_cache is not None and not long_poll \
+            else None
+        if ttl_sec is not None:
+            resp = self._cached_get(path, headers, ttl_sec, timeout)
+        else:
+            resp = self._send('GET', path, headers, timeout, long_poll)
+        return self.handle_dto_response('GET', path, resp, dto_class)
+
+    def handle_dto_response(self, method: str, path: str, resp: requests.Response,
+                            code_to_dto_class: T.Dict[int, T.Type[T.Any]]) -> T.Any:
+        """
+        Decode the response into a DTO, measuring the decoding. Also used by AsyncRequestUtil.
+        """
+        if self.metrics is None:
+            return util.handle_response(resp, code_to_dto_class, self.keep_raw_response)
+
+        start = time.perf_counter()
+        try:
+            return util.handle_response(resp, code_to_dto_class, self.keep_raw_response)
+        finally:
+            self.metrics.record_decode(method, util.endpoint_template(path), time.perf_counter() - start)
 
-        resp: requests.Response = requests.get(self.api_url + path, headers=self.get_token_header(), timeout=TIMEOUT)
+    def _send(self, method: str, path: str, headers: T.Dict[str, str], timeout: float = TIMEOUT,
+              long_poll: bool = False, **kwargs) -> requests.Response:
+        """
+        Send a request to the API, retrying it according to the retry policy and failing fast while the circuit
+        breaker is open.
 
-        if resp.status_code == 401:
-            raise AuthRequiredException()
+        :param long_poll: the request is expected to time out at times, so timeouts are not retried or counted as
+            failures
+        """
+        url = self.api_url + path
+        retry_enabled = self.retry_policy is not None and self.retry_policy.is_enabled_for(method)
+        endpoint = util.endpoint_template(path) if self.metrics is not None else None
+        attempt = 0
+        while True:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_request(self.api_host)
+
+            try:
+                if self.metrics is None:
+                    resp: requests.Response = self.session.request(method, url, headers=headers, timeout=timeout,
+                                                                   **kwargs)
+                else:
+                    resp = self._send_measured(RequestEvent(method, path, endpoint, attempt), url, headers,
+                                               timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if long_poll and isinstance(e, requests.ReadTimeout):
+                    # The host accepted the request, so a half-open circuit's trial request has succeeded
+                    if self.circuit_breaker is not None:
+                        self.circuit_breaker.record_success(self.api_host)
+                    raise
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure(self.api_host)
+                if not retry_enabled or attempt >= self.retry_policy.max_retries or \
+                        (isinstance(e, requests.ReadTimeout) and not self.retry_policy.retry_read_timeouts):
+                    raise
+                delay = self.retry_policy.get_delay_sec(attempt, None)
+                logging.info(f"{method} {path} failed with {repr(e)}, retrying in {delay:.1f} s")
+            else:
+                if self.circuit_breaker is not None:
+                    if resp.status_code >= 500:
+                        self.circuit_breaker.record_failure(self.api_host)
+                    else:
+                        self.circuit_breaker.record_success(self.api_host)
+
+                if not retry_enabled or attempt >= self.retry_policy.max_retries or \
+                        resp.status_code not in self.retry_policy.retry_status_codes:
+                    if resp.status_code == 401:
+                        self.clear_cached_access_token()
+                        raise AuthRequiredException()
+                    return resp
+
+                delay = self.retry_policy.get_delay_sec(attempt, resp)
+                logging.info(f"{method} {path} failed with status {resp.status_code}, retrying in {delay:.1f} s")
+                resp.close()
+
+            time.sleep(delay)
+            attempt += 1
+
+    def _send_measured(self, event: RequestEvent, url: str, headers: T.Dict[str, str], timeout: float,
+                       **kwargs) -> requests.Response:
+        self.metrics.before_request(event)
+        start = time.perf_counter()
+        try:
+            resp: requests.Response = self.session.request(event.method, url, headers=headers, timeout=timeout,
+                                                           **kwargs)
+        except Exception as e:
+            self.metrics.after_request(ResponseEvent(event, None, time.perf_counter() - start, 0, e))
+            raise
+        # The body has already been downloaded unless streaming, then only its declared size is known
+        size = int(resp.headers.get('Content-Length', 0)) if kwargs.get('stream') else len(resp.content)
+        self.metrics.after_request(ResponseEvent(event, resp.status_code, time.perf_counter() - start, size, None))
+        return resp
+
+    def stream_get_request(self, path: str, list_field: str, item_dto_class: T.Type[T.Any],
+                           chunk_size: int = STREAM_CHUNK_SIZE) -> T.Iterator[T.Any]:
+        """
+        GET a response whose JSON object contains a list under list_field and yield the list's items as item_dto_class
+        while the body is being read, so that only one item is held in memory at a time. Other fields are ignored.
+        Items get the response as data.ResponseMeta, as the body is not kept. Items are parsed with the standard
+        library's JSON decoder, so this uses more CPU than simple_get_request when orjson is installed.
+        """
+        resp = self._send('GET', path, self.get_token_header(), stream=True)
+        try:
+            if resp.status_code == 204:
+                return
+            if resp.status_code != 200:
+                # Error responses are small, read and raise them as usual
+                util.handle_response(resp, {}, self.keep_raw_response)
 
-        return util.handle_response(resp, dto_class)
+            meta = data.ResponseMeta.from_response(resp)
+            try:
+                # Decoded with the response's charset, like handle_response does
+                yield from stream.iter_list_items(resp.iter_content(chunk_size), list_field, item_dto_class,
+                                                  resp.status_code, meta, resp.encoding or 'utf-8')
+            except (ValueError, LookupError) as e:
+                # Not valid JSON or unknown charset
+                raise ErrorResponseException(resp, None, e)
+        finally:
+            resp.close()
+
+    def _cached_get(self, path: str, headers: T.Dict[str, str], ttl_sec: float, timeout: float) -> requests.Response:
+        user_key = self._get_user_key(headers["Authorization"])
+        cached = self.response_cache.get(user_key, path)
+        if cached is not None and cached.is_fresh():
+            self.response_cache.count(hit=True)
+            return cached.to_response()
+
+        request_headers = {**headers, **cached.validator_headers()} if cached is not None else headers
+        resp = self._send('GET', path, request_headers, timeout)
+
+        if resp.status_code == 304:
+            if cached is not None:
+                logging.debug(f"Cached response to {path} is still valid")
+                self.response_cache.count(hit=True, revalidated=True)
+                self.response_cache.refresh(user_key, path, cached)
+                return cached.to_response()
+            # No cached response to revalidate, e.g. a proxy answered for a response evicted from a shared cache,
+            # get the whole response instead of failing
+            logging.debug(f"Not modified response to {path} without a cached response, getting it again")
+            resp.close()
+            resp = self._send('GET', path, headers, timeout)
+
+        self.response_cache.count(miss=True)
+        if resp.status_code == 200:
+            self.response_cache.store(user_key, path, resp, ttl_sec)
+        return resp
+
+    def _get_user_key(self, auth_header: str) -> str:
+        """
+        Stable key for the authenticated user, so that cached responses are never shared between users.
+        """
+        token, user_key = self._user_key
+        current_token = auth_header[len("Bearer "):]
+        if token != current_token:
+            try:
+                subject = decode_token(current_token)["sub"]
+            except Exception:
+                subject = current_token
+            user_key = hashlib.sha256(subject.encode()).hexdigest()
+            self._user_key = (current_token, user_key)
+        return user_key
 
     def post_request(self, path: str, request_dto_dataclass: T.Any,
                      resp_code_to_dto_class: T.Dict[int, T.Type[T.Any]]) -> T.Any:
         req_body_dict = dataclasses.asdict(request_dto_dataclass)
-        resp: requests.Response = requests.post(self.api_url + path, json=req_body_dict,
-                                                headers=self.get_token_header(), timeout=TIMEOUT)
-        if resp.status_code == 401:
-            raise AuthRequiredException()
-        dto = util.handle_response(resp, resp_code_to_dto_class)
+        resp = self._send('POST', path, self.get_token_header(), json=req_body_dict)
+        dto = self.handle_dto_response('POST', path, resp, resp_code_to_dto_class)
         return dto
 
     def get_token_header(self) -> T.Dict[str, str]:
-        return {"Authorization": f"Bearer {self.get_valid_access_token().token}"}
+        return self.token_header(self.get_valid_access_token())
+
+    def token_header(self, access_token: StorableToken) -> T.Dict[str, str]:
+        cached = self._access_token_cache
+        if cached is not None and cached[0] is access_token:
+            return cached[2]
+        return {"Authorization": f"Bearer {access_token.token}"}
 
     def get_valid_access_token(self) -> StorableToken:
-        access_token = self.get_stored_token(TokenType.ACCESS)
-        if not self.access_token_is_valid(access_token):
-            if self._refresh_using_refresh_token():
-                access_token = self.get_stored_token(TokenType.ACCESS)
-                assert self.access_token_is_valid(access_token), 'Access token is not valid after refreshing'
+        access_token = self.get_cached_access_token()
+        if access_token is None:
+            if self._refresh_once(lambda: self.get_cached_access_token() is None):
+                access_token = self.get_cached_access_token()
+                assert access_token is not None, 'Access token is not valid after refreshing'
             else:
                 raise AuthRequiredException()
 
         return access_token
 
+    def _refresh_once(self, is_needed: T.Callable[[], bool]) -> bool:
+        """
+        Refresh the tokens unless another thread or process did it while we were waiting for the locks.
+        Return False if refreshing was needed and failed.
+        """
+        with self._refresh_lock:
+            if not is_needed():
+                return True
+            if self.token_refresh_lock is None:
+                return self._refresh_using_refresh_token()
+
+            with self.token_refresh_lock():
+                # Tokens refreshed by another process are picked up via token_version
+                if not is_needed():
+                    logging.debug("Tokens were refreshed by another process")
+                    return True
+                return self._refresh_using_refresh_token()
+
+    def get_refresh_due_at(self, lead_sec: float) -> T.Optional[float]:
+        """
+        Time when the access token should be refreshed to stay valid for lead_sec more than required,
+        or None if there is nothing to refresh.
+        """
+        access_token = self.get_cached_access_token()
+        if access_token is not None:
+            return access_token.expires_at - self.auth_token_min_valid_sec - lead_sec
+        return time.time() if self.get_stored_token(TokenType.REFRESH) is not None else None
+
+    def refresh_if_due(self, lead_sec: float) -> bool:
+        """
+        Refresh the tokens if the access token is due to be refreshed. Return False if refreshing failed.
+        """
+        def is_due() -> bool:
+            due_at = self.get_refresh_due_at(lead_sec)
+            return due_at is not None and due_at <= time.time()
+
+        return self._refresh_once(is_due)
+
+    def get_cached_access_token(self) -> T.Optional[StorableToken]:
+        """
+        Return the access token if it's valid, or None. The token is kept in memory and read from the token storage
+        only if it's about to expire or the storage's token_version has changed.
+        """
+        version = self.token_version(TokenType.ACCESS) if self.token_version is not None else None
+        cached = self._access_token_cache
+        if cached is not None and cached[1] == version and self.access_token_is_valid(cached[0]):
+            return cached[0]
+
+        access_token = self.get_stored_token(TokenType.ACCESS)
+        if not self.access_token_is_valid(access_token):
+            return None
+        self._access_token_cache = (access_token, version, {"Authorization": f"Bearer {access_token.token}"})
+        return access_token
+
+    def get_memory_access_token(self) -> T.Optional[StorableToken]:
+        """
+        Return the access token kept in memory if it's known to be valid without reading the token storage, or None.
+        """
+        cached = self._access_token_cache
+        if self.token_version is None and cached is not None and self.access_token_is_valid(cached[0]):
+            return cached[0]
+        return None
+
+    def clear_cached_access_token(self):
+        self._access_token_cache = None
+
     def access_token_is_valid(self, access_token: T.Optional[StorableToken]):
         return access_token is not None and time.time() <= access_token.expires_at - self.auth_token_min_valid_sec
 
     def _refresh_using_refresh_token(self) -> bool:
+        token_req_body = self.get_refresh_request_body()
+        if token_req_body is None:
+            return False
+
+        r = self.session.post(self.get_idp_token_url(), data=token_req_body, timeout=TIMEOUT)
+        return self.handle_refresh_response(r.status_code, r.json() if r.status_code == 200 else None)
+
+    def get_idp_token_url(self) -> str:
+        return f"{self.idp_url}/auth/realms/master/protocol/openid-connect/token"
+
+    def get_refresh_request_body(self) -> T.Optional[T.Dict[str, str]]:
+        """
+        Form to POST to the IdP token URL, None if there is no usable refresh token. Also used by AsyncRequestUtil.
+        """
         refresh_token = self.get_stored_token(TokenType.REFRESH)
 
         if refresh_token is None:
             logging.debug("No refresh token found")
-            return False
+            return None
 
         if time.time() > refresh_token.expires_at - self.auth_token_min_valid_sec:
             logging.debug("Refresh token expired")
-            return False
+            self.refresh_rejected = True
+            return None
 
-        token_req_body = {
+        return {
             'grant_type': "refresh_token",
             'refresh_token': refresh_token.token,
             'client_id': self.idp_client_name
         }
 
-        r = requests.post(f"{self.idp_url}/auth/realms/master/protocol/openid-connect/token", data=token_req_body,
-                          timeout=TIMEOUT)
-
-        if r.status_code == 200:
-            body = r.json()
+    def handle_refresh_response(self, status_code: int, body: T.Optional[dict]) -> bool:
+        """
+        Store the tokens the IdP returned, return whether the refresh succeeded. Also used by AsyncRequestUtil.
+        """
+        # 400 invalid_grant: the refresh token has expired, was revoked or belongs to a finished session
+        self.refresh_rejected = status_code in (400, 401)
+        if status_code == 200:
             access_token = StorableToken(TokenType.ACCESS, body["access_token"],
                                          round(time.time()) + int(body['expires_in']))
             refresh_token = StorableToken(TokenType.REFRESH, body["refresh_token"],
@@ -126,101 +449,42 @@ class RequestUtil:
             self.set_stored_token(TokenType.ACCESS, access_token)
             self.set_stored_token(TokenType.REFRESH, refresh_token)
             logging.info("Refreshed tokens using refresh token")
+            if self.metrics is not None:
+                self.metrics.record_token_refresh(True)
             return True
         else:
-            logging.info(f"Refreshing tokens failed with status {r.status_code}")
+            logging.info(f"Refreshing tokens failed with status {status_code}")
+            if self.metrics is not None:
+                self.metrics.record_token_refresh(False)
             return False
 
     def start_auth_in_browser(self):
-        templates_path = str((pathlib.Path(__file__).parent / 'auth-templates').resolve())
-        app = Flask(__name__, template_folder=templates_path)
-        # Disable Flask banner
-        cli = sys.modules['flask.cli']
-        cli.show_server_banner = lambda *x: None
-
-        def shutdown_server():
-            func = request.environ.get('werkzeug.server.shutdown')
-            if func is None:
-                raise RuntimeError('Not running with the Werkzeug Server')
-            func()
-
-        @app.route('/shutdown', methods=['POST'])
-        def controller_shutdown():
-            self.clear_server()
-            shutdown_server()
-            return Response(status=200)
-
-        @app.route('/keycloak.json')
-        def controller_keycloak_conf():
-            return render_template("keycloak.json", idp_url=self.idp_url, client_name=self.idp_client_name)
-
-        @app.route('/login')
-        def controller_login():
-            return render_template("login.html", idp_url=self.idp_url, port=self.auth_server_port,
-                                   success_msg=self.auth_browser_success_msg, fail_msg=self.auth_browser_fail_msg)
-
-        @app.route('/deliver-tokens', methods=['POST'])
-        def controller_deliver_tokens():
-            try:
-                # Clear server first to decrease the race condition window
-                self.clear_server()
-
-                if request.is_json:
-                    body = request.get_json()
-                    access_token = StorableToken(TokenType.ACCESS, body["access_token"],
-                                                 round(time.time()) + int(body['access_token_valid_sec']))
-                    refresh_token = StorableToken(TokenType.REFRESH, body["refresh_token"],
-                                                  round(time.time()) + int(body['refresh_token_valid_sec']))
-                    self.set_stored_token(TokenType.ACCESS, access_token)
-                    self.set_stored_token(TokenType.REFRESH, refresh_token)
-                    return Response(status=200)
-                else:
-                    return Response(status=400)
-            finally:
-                shutdown_server()
+        # Imported only here, as they are not needed for anything else
+        import webbrowser
+        from .auth_server import AuthCallbackServer
 
-        # Set and start server thread if it's not already running
         if not self.is_server_active():
             logging.debug('Auth server not active, starting it')
-            self.auth_server_port = util.get_free_port()
-            self.auth_server_thread = threading.Thread(target=app.run,
-                                                       args=(AUTH_SERVER_HOST, self.auth_server_port, False, False))
-            logging.debug('Starting server thread')
-            self.auth_server_thread.start()
-            logging.debug('Server thread started')
+            self.auth_server = AuthCallbackServer(AUTH_SERVER_HOST, self.idp_url, self.idp_client_name,
+                                                  self.auth_browser_success_msg, self.auth_browser_fail_msg,
+                                                  self._store_delivered_tokens)
+            self.auth_server.start(AUTH_SERVER_START_TIMEOUT_SEC)
         else:
             logging.debug('Auth server already active')
 
-        login_url = f'http://{AUTH_SERVER_HOST}:{self.auth_server_port}/login'
-
-        # Wait until server has started
-        for _ in range(AUTH_SERVER_START_POLL_MAX_RETRIES):
-            time.sleep(AUTH_SERVER_START_POLL_DELAY_SEC)
-            logging.debug('Checking if auth server is ready to serve...')
-            try:
-                status = requests.head(login_url).status_code
-                if status == 200:
-                    logging.debug('Auth server is ready')
-                    break
-                else:
-                    logging.debug(f'Got unexpected status code {status} from auth server')
-            except RequestException:
-                logging.debug('Auth server is not ready yet')
-
-        else:
-            logging.error('Waiting for the local auth server to start timed out')
-            raise RuntimeError('Waiting for the local auth server to start timed out')
-
-        # And then open browser
         logging.debug('Opening browser')
-        webbrowser.open(login_url)
+        webbrowser.open(self.auth_server.login_url)
 
-    def is_server_active(self) -> bool:
-        return self.auth_server_thread is not None
+    def _store_delivered_tokens(self, body: dict):
+        access_token = StorableToken(TokenType.ACCESS, body["access_token"],
+                                     round(time.time()) + int(body['access_token_valid_sec']))
+        refresh_token = StorableToken(TokenType.REFRESH, body["refresh_token"],
+                                      round(time.time()) + int(body['refresh_token_valid_sec']))
+        self.set_stored_token(TokenType.ACCESS, access_token)
+        self.set_stored_token(TokenType.REFRESH, refresh_token)
 
-    def clear_server(self):
-        self.auth_server_thread = None
-        self.auth_server_port = None
+    def is_server_active(self) -> bool:
+        return self.auth_server is not None and self.auth_server.is_active()
 
     def get_stored_token(self, token_type: TokenType) -> T.Optional[StorableToken]:
         token_dict = self.retrieve_token(token_type)
@@ -231,6 +495,118 @@ class RequestUtil:
 
     def set_stored_token(self, token_type: TokenType, token: T.Optional[StorableToken]):
         self.persist_token(token_type, None if token is None else dataclasses.asdict(token))
+        if token_type == TokenType.ACCESS:
+            self.clear_cached_access_token()
+
+
+class TokenRefresher:
+    def __init__(self, lead_sec: float = 30):
+        """
+        Background thread that refreshes the tokens of registered clients before they expire, so that no request
+        has to wait for the IdP. One refresher can be shared by many clients.
+
+        :param lead_sec: how long before reaching auth_token_min_valid_sec to refresh
+        """
+        self.lead_sec = lead_sec
+        self._clients: T.Dict[RequestUtil, float] = {}  # client -> don't try refreshing before this time
+        # client -> its refresh token that can't be used, the client is skipped until another one is stored
+        self._rejected: T.Dict[RequestUtil, str] = {}
+        self._condition = threading.Condition()
+        self._thread: T.Optional[threading.Thread] = None
+        self._stopped = False
+
+    def register(self, request_util: RequestUtil):
+        with self._condition:
+            self._clients[request_util] = 0
+            if self._thread is None:
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name='ez-token-refresher', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def unregister(self, request_util: RequestUtil):
+        with self._condition:
+            self._clients.pop(request_util, None)
+            self._rejected.pop(request_util, None)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                clients = list(self._clients.items())
+
+            now = time.time()
+            next_due_at = now + TOKEN_REFRESHER_MAX_SLEEP_SEC
+            for client, not_before in clients:
+                try:
+                    if self._is_rejected(client):
+                        continue
+                    due_at = client.get_refresh_due_at(self.lead_sec)
+                    if due_at is None:
+                        continue
+                    due_at = max(due_at, not_before)
+                    # Not now, which was taken before get_refresh_due_at() may have returned the current time
+                    if due_at <= time.time():
+                        logging.debug('Refreshing tokens in the background')
+                        if not client.refresh_if_due(self.lead_sec):
+                            if client.refresh_rejected:
+                                self._reject(client)
+                                continue
+                            raise RuntimeError('refreshing failed')
+                        due_at = client.get_refresh_due_at(self.lead_sec)
+                        if due_at is None:
+                            continue
+                        # Don't spin if tokens are issued for less time than the lead time
+                        due_at = max(due_at, now + 1)
+                except Exception as e:
+                    logging.info(f'Background token refresh failed: {repr(e)}')
+                    due_at = now + TOKEN_REFRESHER_RETRY_DELAY_SEC
+                    with self._condition:
+                        if client in self._clients:
+                            self._clients[client] = due_at
+                next_due_at = min(next_due_at, due_at)
+
+            with self._condition:
+                if not self._stopped:
+                    self._condition.wait(max(0.0, next_due_at - time.time()))
+
+    def _reject(self, client: RequestUtil):
+        refresh_token = client.get_stored_token(TokenType.REFRESH)
+        logging.warning('Refresh token has expired or was rejected, background refreshing is paused until the '
+                        'client is authenticated again')
+        with self._condition:
+            if client in self._clients:
+                self._rejected[client] = refresh_token.token if refresh_token is not None else ''
+
+    def _is_rejected(self, client: RequestUtil) -> bool:
+        with self._condition:
+            rejected_token = self._rejected.get(client)
+        if rejected_token is None:
+            return False
+        refresh_token = client.get_stored_token(TokenType.REFRESH)
+        if refresh_token is None or refresh_token.token == rejected_token:
+            return True
+        logging.debug('New refresh token stored, resuming background refreshing')
+        with self._condition:
+            self._rejected.pop(client, None)
+        return False
+
+
+def _is_graded(submission: T.Union[data.SubmissionResp, data.EmptyResp], course_id: str,
+               course_exercise_id: str) -> bool:
+    # 204 or an empty body: waiting would not make a submission appear
+    if isinstance(submission, data.EmptyResp) or submission.autograde_status is None:
+        raise NoSubmissionException(course_id, course_exercise_id)
+    return submission.autograde_status in AUTOGRADE_FINISHED_STATUSES
 
 
 class Common:
@@ -276,14 +652,190 @@ class Student:
         path = f"/student/courses/{course_id}/exercises/{course_exercise_id}"
         return self.request_util.simple_get_request(path, data.ExerciseDetailsResp)
 
-    def await_latest_exercise_submission_details(self, course_id: str, course_exercise_id: str) -> None:
+    def get_snapshot(self, depth: int = 3, activities: bool = True, course_ids: T.Optional[T.Iterable[str]] = None,
+                     max_concurrent: int = 8) -> data.StudentSnapshot:
+        """
+        GET the student's courses, their exercises, and the details and teacher activities of each exercise as one
+        tree. Each request is started as soon as its parent's response has arrived, at most max_concurrent at a time,
+        so the snapshot takes about as long as the slowest chain of requests rather than all of them together.
+
+        A failed request is recorded as the error of its node and does not stop the rest of the tree. Only getting the
+        courses raises. Note that requests beyond the Ez http_pool_maxsize wait for a free connection.
+
+        :param depth: 1: courses only, 2: with their exercises, 3: with the details of each exercise
+        :param activities: at depth 3, also GET the teacher activities of each exercise
+        :param course_ids: only these courses, default: all courses of the student
+        """
+        if depth not in (1, 2, 3):
+            raise ValueError(f"Snapshot depth must be 1, 2 or 3, not {depth}")
+        logging.debug(f"Get a snapshot of depth {depth} with {max_concurrent} concurrent requests")
+        created_at = time.time()
+        courses = self.get_courses().courses
+        if course_ids is not None:
+            course_ids = set(course_ids)
+            courses = [c for c in courses if c.id in course_ids]
+        snapshot = data.StudentSnapshot([data.CourseSnapshot(c, None, None) for c in courses], created_at)
+        if depth == 1:
+            return snapshot
+
+        def call(fn: T.Callable[..., T.Any], *args: str) -> T.Tuple[T.Any, T.Optional[Exception]]:
+            try:
+                return fn(*args), None
+            except (ErrorResponseException, RequestException) as e:
+                logging.warning(f"Snapshot request {fn.__name__}{args} failed: {repr(e)}")
+                return None, e
+
+        def store_exercises(node: data.CourseSnapshot, result: T.Tuple[T.Any, T.Optional[Exception]]):
+            resp, node.error = result
+            if resp is None:
+                return
+            node.exercises = [data.ExerciseSnapshot(e, None, None, None, None) for e in resp.exercises]
+            if depth < 3:
+                return
+            for exercise_node in node.exercises:
+                ids = (node.course.id, exercise_node.exercise.id)
+                submit(store_details, exercise_node, self.get_exercise_details, *ids)
+                if activities:
+                    submit(store_activities, exercise_node, self.get_all_exercise_teacher_activities, *ids)
+
+        def store_details(node: data.ExerciseSnapshot, result: T.Tuple[T.Any, T.Optional[Exception]]):
+            node.details, node.details_error = result
+
+        def store_activities(node: data.ExerciseSnapshot, result: T.Tuple[T.Any, T.Optional[Exception]]):
+            node.activities, node.activities_error = result
+
+        # Future -> (function that stores its result in the tree, node)
+        handlers: T.Dict[Future, T.Tuple[T.Callable[[T.Any, T.Any], None], T.Any]] = {}
+        with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+            def submit(store: T.Callable[[T.Any, T.Any], None], node: T.Any, fn: T.Callable[..., T.Any], *args: str):
+                handlers[executor.submit(call, fn, *args)] = (store, node)
+
+            for course_node in snapshot.courses:
+                submit(store_exercises, course_node, self.get_course_exercises, course_node.course.id)
+            # Children are submitted by the store functions of their parents, in this thread
+            while handlers:
+                done, _ = wait(handlers, return_when=FIRST_COMPLETED)
+                for future in done:
+                    store, node = handlers.pop(future)
+                    store(node, future.result())
+        return snapshot
+
+    def get_latest_exercise_submission_details(self, course_id: str, course_exercise_id: str) -> data.SubmissionResp:
+        """
+        GET the latest submission's details to the specified course exercise without waiting for autograding.
+        """
+        logging.debug(f"GET latest submission's details to the '{course_id}' exercise '{course_exercise_id}'")
+        util.assert_not_none(course_id, course_exercise_id)
+        path = f"/student/courses/{course_id}/exercises/{course_exercise_id}/submissions/latest"
+        return self.request_util.simple_get_request(path, data.SubmissionResp)
+
+    def await_latest_exercise_submission_details(self, course_id: str, course_exercise_id: str,
+                                                 timeout_sec: float = TIMEOUT) -> data.SubmissionResp:
         """
         GET and wait for the latest submission's details to the specified course exercise.
         """
         logging.debug(f"GET latest submission's details to the '{course_id}' exercise '{course_exercise_id}'")
         util.assert_not_none(course_id, course_exercise_id)
         path = f"/student/courses/{course_id}/exercises/{course_exercise_id}/submissions/latest/await"
-        self.request_util.simple_get_request(path, data.SubmissionResp)
+        return self.request_util.simple_get_request(path, data.SubmissionResp, timeout_sec, long_poll=True)
+
+    def await_submissions(self, exercises: T.Iterable[T.Tuple[str, str]], max_concurrent: int = 8,
+                          timeout_sec: float = 600, long_poll_timeout_sec: float = TIMEOUT,
+                          poll_interval_sec: float = 1, max_poll_interval_sec: float = 15
+                          ) -> T.Iterator[data.AwaitedSubmission]:
+        """
+        Wait for the autograding of the latest submissions to many course exercises, at most max_concurrent at a time.
+
+        Each submission is yielded as soon as its autograde status is COMPLETED or FAILED, or NONE if it's not
+        autograded. If the long-poll for a submission times out, its status is polled with exponential backoff.
+        Submissions that fail or are not graded within timeout_sec are yielded with the error set, exercises without
+        a submission with a NoSubmissionException.
+
+        :param exercises: (course_id, course_exercise_id) pairs
+        """
+        deadline = time.time() + timeout_sec
+        exercises = list(exercises)
+        for course_id, course_exercise_id in exercises:
+            util.assert_not_none(course_id, course_exercise_id)
+        logging.debug(f"Await autograding of {len(exercises)} submissions")
+
+        def await_one(course_id: str, course_exercise_id: str) -> data.AwaitedSubmission:
+            try:
+                submission = self._await_autograde(course_id, course_exercise_id, deadline, long_poll_timeout_sec,
+                                                   poll_interval_sec, max_poll_interval_sec)
+                return data.AwaitedSubmission(course_id, course_exercise_id, submission, None)
+            except (ErrorResponseException, RequestException, TimeoutError, NoSubmissionException) as e:
+                logging.warning(f"Awaiting submission to course '{course_id}' exercise '{course_exercise_id}' "
+                                f"failed: {repr(e)}")
+                return data.AwaitedSubmission(course_id, course_exercise_id, None, e)
+
+        # Stopping early doesn't wait for the remaining submissions
+        yield from util.map_unordered(await_one, exercises, max_concurrent)
+
+    def post_submissions(self, submissions: T.Iterable[T.Tuple[str, str, str]], max_concurrent: int = 8,
+                         await_grades: bool = True, timeout_sec: float = 600,
+                         long_poll_timeout_sec: float = TIMEOUT, poll_interval_sec: float = 1,
+                         max_poll_interval_sec: float = 15) -> T.List[data.SubmissionBatchResult]:
+        """
+        POST many submissions, at most max_concurrent at a time, and wait for each one's autograde result right after
+        posting it, like await_submissions. Only one submission per course exercise should be given, as the latest
+        submission to the exercise is awaited.
+
+        Failed posts, submissions not graded within timeout_sec and ones the server doesn't return after posting
+        (NoSubmissionException) are returned with the error set.
+
+        :param submissions: (course_id, course_exercise_id, solution) triples
+        :return: results in the same order as submissions
+        """
+        deadline = time.time() + timeout_sec
+        submissions = list(submissions)
+        for course_id, course_exercise_id, solution in submissions:
+            util.assert_not_none(course_id, course_exercise_id, solution)
+        logging.debug(f"POST {len(submissions)} submissions")
+
+        def post_one(course_id: str, course_exercise_id: str, solution: str) -> data.SubmissionBatchResult:
+            result = data.SubmissionBatchResult(course_id, course_exercise_id, None, None, None, None)
+            try:
+                start = time.perf_counter()
+                self.post_submission(course_id, course_exercise_id, solution)
+                result.post_sec = time.perf_counter() - start
+                if await_grades:
+                    start = time.perf_counter()
+                    result.submission = self._await_autograde(course_id, course_exercise_id, deadline,
+                                                              long_poll_timeout_sec, poll_interval_sec,
+                                                              max_poll_interval_sec)
+                    result.grading_sec = time.perf_counter() - start
+            except (ErrorResponseException, RequestException, TimeoutError, NoSubmissionException) as e:
+                logging.warning(f"Submitting to course '{course_id}' exercise '{course_exercise_id}' failed: "
+                                f"{repr(e)}")
+                result.error = e
+            return result
+
+        with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+            return list(executor.map(lambda s: post_one(*s), submissions))
+
+    def _await_autograde(self, course_id: str, course_exercise_id: str, deadline: float,
+                         long_poll_timeout_sec: float, poll_interval_sec: float,
+                         max_poll_interval_sec: float) -> data.SubmissionResp:
+        try:
+            submission = self.await_latest_exercise_submission_details(
+                course_id, course_exercise_id, max(0.1, min(long_poll_timeout_sec, deadline - time.time())))
+            if _is_graded(submission, course_id, course_exercise_id):
+                return submission
+        except requests.Timeout:
+            logging.debug(f"Long-poll for course '{course_id}' exercise '{course_exercise_id}' timed out, polling")
+
+        delay = poll_interval_sec
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"Submission to course '{course_id}' exercise '{course_exercise_id}' was not "
+                                   f"graded in time")
+            time.sleep(min(delay, remaining))
+            submission = self.get_latest_exercise_submission_details(course_id, course_exercise_id)
+            if _is_graded(submission, course_id, course_exercise_id):
+                return submission
+            delay = min(delay * 2, max_poll_interval_sec)
 
     def get_all_exercise_teacher_activities(self, course_id: str, course_exercise_id: str) -> data.TeacherActivities:
         """
@@ -303,6 +855,16 @@ class Student:
         path = f"/student/courses/{course_id}/exercises/{course_exercise_id}/submissions/all"
         return self.request_util.simple_get_request(path, data.StudentAllSubmissionsResp)
 
+    def stream_all_submissions(self, course_id: str, course_exercise_id: str) -> T.Iterator[data.SubmissionResp]:
+        """
+        GET submissions to this course exercise and yield them one by one while the response is being read.
+        Unlike get_all_submissions, memory use depends on the largest submission, not on all of them.
+        """
+        logging.debug(f"Stream submissions to course '{course_id}' course exercise '{course_exercise_id}'")
+        util.assert_not_none(course_id, course_exercise_id)
+        path = f"/student/courses/{course_id}/exercises/{course_exercise_id}/submissions/all"
+        return self.request_util.stream_get_request(path, 'submissions', data.SubmissionResp)
+
     def set_student_last_access(self, course_id: str):
         logging.debug(f"POST set student last access  to course '{course_id}'")
         util.assert_not_none(course_id)
@@ -371,6 +933,117 @@ class Teacher:
                f"?offset={offset}&limit={limit}"
         return self.request_util.simple_get_request(path, data.TeacherCourseExerciseSubmissionsStudentResp)
 
+    def stream_course_exercise_submissions_student(
+            self, course_id: str, course_exercise_id: str,
+            student_id: str) -> T.Iterator[data.TeacherCourseExerciseSubmissionsStudent]:
+        """
+        GET all submissions to course exercise by the student and yield them one by one while the response is being
+        read. Unlike get_course_exercise_submissions_student, memory use depends on the largest submission, not on all
+        of them.
+        """
+        logging.debug(f"Stream submissions to course exercise {course_exercise_id} on course {course_id} by "
+                      f"student {student_id}")
+        util.assert_not_none(course_id, course_exercise_id, student_id)
+        path = f"/teacher/courses/{course_id}/exercises/{course_exercise_id}/submissions/all/students/{student_id}"
+        return self.request_util.stream_get_request(path, 'submissions', data.TeacherCourseExerciseSubmissionsStudent)
+
+    def iter_course_students(self, course_id: str, page_size: int = 500,
+                             prefetch: bool = False) -> T.Iterator[data.CourseParticipantsStudent]:
+        """
+        GET students on this course page by page.
+
+        :param page_size: number of students requested at once
+        :param prefetch: request the next page while the current one is being processed
+        """
+        util.assert_not_none(course_id)
+
+        def fetch_page(offset: int) -> T.Tuple[T.List[data.CourseParticipantsStudent], bool]:
+            resp = self.get_course_participants(course_id, data.ParticipantRole.STUDENT, page_size, offset)
+            return resp.students, len(resp.students) == page_size
+
+        return util.iter_pages(fetch_page, page_size, prefetch)
+
+    def iter_course_exercise_submissions_student(
+            self, course_id: str, course_exercise_id: str, student_id: str, page_size: int = 100,
+            prefetch: bool = False) -> T.Iterator[data.TeacherCourseExerciseSubmissionsStudent]:
+        """
+        GET submissions by this student to this course exercise page by page.
+
+        :param page_size: number of submissions requested at once
+        :param prefetch: request the next page while the current one is being processed
+        """
+        util.assert_not_none(course_id, course_exercise_id, student_id)
+
+        def fetch_page(offset: int) -> T.Tuple[T.List[data.TeacherCourseExerciseSubmissionsStudent], bool]:
+            resp = self.get_course_exercise_submissions_student(course_id, course_exercise_id, student_id,
+                                                                page_size, offset)
+            return resp.submissions, len(resp.submissions) == page_size and offset + page_size < resp.count
+
+        return util.iter_pages(fetch_page, page_size, prefetch)
+
+    def get_course_submissions_bulk(self, course_id: str, max_workers: int = 8,
+                                    student_ids: T.Optional[T.Iterable[str]] = None,
+                                    course_exercise_ids: T.Optional[T.Iterable[str]] = None,
+                                    progress: T.Optional[T.Callable[[int, int], None]] = None
+                                    ) -> T.Iterator[data.CourseSubmissionsBulkItem]:
+        """
+        GET submissions of all students to all exercises on this course, using max_workers parallel requests.
+
+        Results are yielded in the order they arrive. A failed request for a (student, exercise) pair is yielded
+        as an item with the error set and does not stop the other requests. Only authentication errors are raised.
+        Note that requests beyond the Ez http_pool_maxsize wait for a free connection.
+
+        :param student_ids: only these students, default: all students on the course
+        :param course_exercise_ids: only these course exercises, default: all exercises on the course
+        :param progress: called with (done, total) after each completed pair
+        """
+        util.assert_not_none(course_id)
+        logging.debug(f"Get all submissions on course {course_id} with {max_workers} workers")
+        if student_ids is None:
+            participants = self.get_course_participants(course_id, data.ParticipantRole.STUDENT)
+            student_ids = [s.id for s in participants.students]
+        if course_exercise_ids is None:
+            exercises = self.get_course_exercises(course_id)
+            course_exercise_ids = [e.course_exercise_id for e in exercises.exercises]
+
+        course_exercise_ids = list(course_exercise_ids)
+        pairs = [(s, e) for s in student_ids for e in course_exercise_ids]
+        total = len(pairs)
+
+        def fetch(student_id: str, course_exercise_id: str) -> data.CourseSubmissionsBulkItem:
+            try:
+                resp = self.get_course_exercise_submissions_student(course_id, course_exercise_id, student_id)
+                return data.CourseSubmissionsBulkItem(student_id, course_exercise_id, resp, None)
+            except (ErrorResponseException, RequestException) as e:
+                logging.warning(f"Getting submissions of student {student_id} to course exercise "
+                                f"{course_exercise_id} failed: {repr(e)}")
+                return data.CourseSubmissionsBulkItem(student_id, course_exercise_id, None, e)
+
+        for done_count, item in enumerate(util.map_unordered(fetch, pairs, max_workers), 1):
+            if progress is not None:
+                progress(done_count, total)
+            yield item
+
+    def get_course_gradebook(self, course_id: str, pick: gradebook.SubmissionPick = gradebook.SubmissionPick.BEST,
+                             kind: gradebook.GradeKind = gradebook.GradeKind.EFFECTIVE, max_workers: int = 8,
+                             progress: T.Optional[T.Callable[[int, int], None]] = None) -> gradebook.Gradebook:
+        """
+        GET the grades of all students on all exercises on this course as a gradebook matrix.
+        Pairs whose submissions could not be fetched are left without a grade and listed in the gradebook's errors.
+
+        :param pick: grade of the best or the latest submission
+        :param kind: automatic, teacher's or effective grade
+        :param progress: see get_course_submissions_bulk
+        """
+        util.assert_not_none(course_id)
+        students = self.get_course_participants(course_id, data.ParticipantRole.STUDENT).students
+        exercises = self.get_course_exercises(course_id).exercises
+        book = gradebook.Gradebook(students, exercises)
+        book.add_submissions(self.get_course_submissions_bulk(course_id, max_workers, [s.id for s in students],
+                                                              [e.course_exercise_id for e in exercises], progress),
+                             pick, kind)
+        return book
+
 
 # TODO: hide private fields/methods
 # TODO: should use TokenStorer type/class instead of functions?
@@ -386,42 +1059,86 @@ class Ez:
                  auth_token_min_valid_sec: int = 20,
                  auth_browser_success_msg: str = "Authentication was successful! You can now close this page.",
                  auth_browser_fail_msg: str = "Something failed... did you try turning it off and on again?",
-                 logging_level: int = logging.INFO):
+                 logging_level: int = logging.INFO,
+                 http_pool_connections: int = 10,
+                 http_pool_maxsize: int = 10,
+                 http_keep_alive: bool = True,
+                 keep_raw_response: bool = True,
+                 response_cache: T.Optional[cache.ResponseCache] = None,
+                 background_token_refresh: bool = False,
+                 retry_policy: T.Optional[retry.RetryPolicy] = retry.RetryPolicy(),
+                 circuit_breaker: T.Optional[retry.CircuitBreaker] = None,
+                 metrics: T.Optional[Metrics] = None,
+                 coalesce_requests: bool = False,
+                 session: T.Optional[requests.Session] = None,
+                 token_refresher: T.Optional[TokenRefresher] = None):
         """
         TODO: doc
+        :param retrieve_token: function that returns the stored token of a type. It may have a token_version
+            attribute: a function returning a value that changes whenever the stored token of a type changes,
+            e.g. the file modification time. Otherwise the access token is read again only when it's about to expire.
+            It may also have a refresh_lock attribute: a function returning a context manager that is held while
+            refreshing, so that processes sharing the storage refresh one at a time.
         :param logging_level: default logging level, e.g. logging.DEBUG. Default: logging.INFO
+        :param http_pool_connections: number of hosts (API, IdP) to keep connection pools for. Default: 10
+        :param http_pool_maxsize: max number of concurrent connections per host, requests from more threads
+            than this wait for a free connection. Default: 10
+        :param http_keep_alive: reuse connections and their TLS sessions between requests. Default: True
+        :param keep_raw_response: keep the whole requests.Response in the response DTOs. If False, only its
+            status code, headers and URL are kept as data.ResponseMeta and the body is freed. Default: True
+        :param response_cache: cache for GET responses, e.g. cache.ResponseCache(cache.DiskCacheBackend('dir')).
+            Default: no caching
+        :param background_token_refresh: refresh tokens in a background thread before they expire. Default: False
+        :param retry_policy: how failed requests are retried, None to disable retrying.
+            Default: GET requests are retried up to 3 times
+        :param circuit_breaker: e.g. retry.CircuitBreaker() to fail fast with CircuitOpenException while the API
+            is failing. Default: None
+        :param metrics: where request metrics are collected, e.g. metrics.Metrics(), can be shared between clients.
+            Default: None, metrics are not collected
+        :param coalesce_requests: when a GET request for the same user and path is already in flight, wait for its
+            result instead of sending another one. All waiters get the same DTO instance, or a copy of the exception
+            with the original one as its __cause__.
+            Default: False
+        :param session: session to share with other clients, e.g. util.new_session(). It's not closed on shutdown and
+            the http_pool_* and http_keep_alive arguments are ignored. Warning: clients sharing a session share its
+            cookies too, so don't share one between clients of different accounts. Give each of them a session from
+            util.new_session_sharing_connections() instead, like ClientPool does. Default: a new session of this
+            client
+        :param token_refresher: refresher to share with other clients. The client is registered to it and
+            unregistered on shutdown, regardless of background_token_refresh. Default: a new TokenRefresher of this
+            client if background_token_refresh
         """
         # Both must be either None or defined
         if (retrieve_token is None) != (persist_token is None):
             raise ValueError('Both retrieve_token and persist_token must be either defined or None')
-
-        # ====== used only when token storage methods are undefined ======
-        local_token_store = {}
-
-        def in_memory_retrieve_token(token_type):
-            return local_token_store[token_type] if token_type in local_token_store else None
-
-        def in_memory_persist_token(token_type, token):
-            if token is None:
-                local_token_store.pop(token_type, None)
-            else:
-                local_token_store[token_type] = token
-
-        # ======
+        if retrieve_token is None:
+            retrieve_token, persist_token = util.memory_token_storage()
 
         versioned_api_url = util.normalise_url(api_base_url) + API_VERSION_PREFIX
         normalised_idp_url = util.normalise_url(idp_url)
+        self.metrics: T.Optional[Metrics] = metrics
+        # Shared resources are left for their owner to close
+        self._owns_session = session is None
+        if session is None:
+            session = util.new_session(http_pool_connections, http_pool_maxsize, http_keep_alive)
 
         self.util = RequestUtil(versioned_api_url, normalised_idp_url, idp_client_name,
                                 auth_token_min_valid_sec,
                                 auth_browser_success_msg.strip().replace('\n', ''),
                                 auth_browser_fail_msg.strip().replace('\n', ''),
-                                retrieve_token if retrieve_token is not None else in_memory_retrieve_token,
-                                persist_token if persist_token is not None else in_memory_persist_token)
+                                retrieve_token, persist_token, session, keep_raw_response, response_cache,
+                                retry_policy, circuit_breaker, self.metrics, coalesce_requests)
         self.student: Student = Student(self.util)
         self.teacher: Teacher = Teacher(self.util)
         self.common: Common = Common(self.util)
 
+        self._owns_token_refresher = token_refresher is None and background_token_refresh
+        self.token_refresher: T.Optional[TokenRefresher] = token_refresher
+        if self._owns_token_refresher:
+            self.token_refresher = TokenRefresher()
+        if self.token_refresher is not None:
+            self.token_refresher.register(self.util)
+
         logging.basicConfig(format='%(asctime)s %(name)s %(levelname)s : %(message)s', level=logging_level)
 
     def check_in(self) -> int:
@@ -446,12 +1163,12 @@ class Ez:
         self.util.start_auth_in_browser()
 
     def is_auth_in_progress(self, timeout_sec: T.Optional[int] = 0) -> bool:
-        thread = self.util.auth_server_thread
-        if thread is None:
+        server = self.util.auth_server
+        if server is None:
             return False
         else:
-            thread.join(timeout_sec)
-            return thread.is_alive()
+            server.thread.join(timeout_sec)
+            return server.thread.is_alive()
 
     def await_is_auth_completed(self, timeout_sec: T.Optional[int] = None) -> bool:
         self.is_auth_in_progress(timeout_sec)
@@ -465,21 +1182,20 @@ class Ez:
             return True
 
     def shutdown(self):
-        # Best effort stop server if running
-        host, port, thread = AUTH_SERVER_HOST, self.util.auth_server_port, self.util.auth_server_thread
-        if port is not None and thread is not None:
-            logging.debug('Auth server seems to be running, attempting to shut down')
-            shutdown_url = f'http://{host}:{port}/shutdown'
-            try:
-                status = requests.post(shutdown_url, timeout=2).status_code
-                if status == 200:
-                    logging.debug('Auth server shutdown seems to have worked')
-                else:
-                    logging.debug(f'Got unexpected status {status} when trying to shut down auth server')
-            except Exception as e:
-                logging.warning(f'Got exception {repr(e)}')
+        if self.util.auth_server is not None:
+            logging.debug('Shutting down auth server')
+            self.util.auth_server.shutdown()
+
+        if self._owns_token_refresher:
+            self.token_refresher.stop()
+        elif self.token_refresher is not None:
+            self.token_refresher.unregister(self.util)
+        if self._owns_session:
+            self.util.session.close()
 
     def logout_in_browser(self):
+        import webbrowser
+
         self.util.set_stored_token(TokenType.ACCESS, None)
         self.util.set_stored_token(TokenType.REFRESH, None)
         webbrowser.open(
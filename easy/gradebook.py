@@ -0,0 +1,251 @@
+"""
+Student x exercise grade matrix of a course with aggregate statistics. The matrix is a NumPy array if NumPy is
+installed (pip install easy-py[numpy]), otherwise a flat array.array of the standard library. Missing grades are NaN.
+"""
+import array
+import csv
+import math
+import typing as T
+from enum import Enum
+
+from . import data
+
+NAN = float('nan')
+
+
+class GradeKind(Enum):
+    AUTO = "AUTO"
+    TEACHER = "TEACHER"
+    # Teacher's grade if the submission has one, otherwise the automatic grade
+    EFFECTIVE = "EFFECTIVE"
+
+
+class SubmissionPick(Enum):
+    BEST = "BEST"
+    LATEST = "LATEST"
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def submission_grade(submission: data.TeacherCourseExerciseSubmissionsStudent,
+                     kind: GradeKind) -> T.Optional[float]:
+    if kind == GradeKind.AUTO:
+        return submission.grade_auto
+    if kind == GradeKind.TEACHER:
+        return submission.grade_teacher
+    return submission.grade_teacher if submission.grade_teacher is not None else submission.grade_auto
+
+
+def pick_grade(submissions: T.Iterable[data.TeacherCourseExerciseSubmissionsStudent], pick: SubmissionPick,
+               kind: GradeKind) -> T.Optional[float]:
+    """
+    Best grade of the submissions, or the grade of the latest one.
+    """
+    if pick == SubmissionPick.BEST:
+        grades = [g for g in (submission_grade(s, kind) for s in submissions) if g is not None]
+        return max(grades) if grades else None
+    latest = max(submissions, key=lambda s: s.created_at or '', default=None)
+    return submission_grade(latest, kind) if latest is not None else None
+
+
+class Gradebook:
+    def __init__(self,
+                 students: T.Sequence[data.CourseParticipantsStudent],
+                 exercises: T.Sequence[data.TeacherCourseExercises],
+                 use_numpy: T.Optional[bool] = None):
+        """
+        Empty gradebook, fill it with set_grade() or add_submissions(), or get one from
+        Teacher.get_course_gradebook().
+
+        :param use_numpy: default: if NumPy is installed
+        """
+        self.students = list(students)
+        self.exercises = list(exercises)
+        self.student_index: T.Dict[str, int] = {s.id: i for i, s in enumerate(self.students)}
+        self.exercise_index: T.Dict[str, int] = {e.course_exercise_id: i for i, e in enumerate(self.exercises)}
+        # (student_id, course_exercise_id, error) of submissions that could not be fetched
+        self.errors: T.List[T.Tuple[str, str, Exception]] = []
+
+        self.np = _import_numpy() if use_numpy is not False else None
+        if use_numpy and self.np is None:
+            raise ImportError('NumPy is not installed, install it with: pip install easy-py[numpy]')
+
+        shape = (len(self.students), len(self.exercises))
+        if self.np is not None:
+            self.grades = self.np.full(shape, NAN)
+        else:
+            # Row-major, student after student
+            self.grades = array.array('d', [NAN]) * (shape[0] * shape[1])
+
+    @property
+    def shape(self) -> T.Tuple[int, int]:
+        return len(self.students), len(self.exercises)
+
+    def set_grade(self, student_id: str, course_exercise_id: str, grade: T.Optional[float]):
+        i, j = self.student_index[student_id], self.exercise_index[course_exercise_id]
+        grade = NAN if grade is None else grade
+        if self.np is not None:
+            self.grades[i, j] = grade
+        else:
+            self.grades[i * len(self.exercises) + j] = grade
+
+    def get_grade(self, student_id: str, course_exercise_id: str) -> T.Optional[float]:
+        i, j = self.student_index[student_id], self.exercise_index[course_exercise_id]
+        grade = self.grades[i, j] if self.np is not None else self.grades[i * len(self.exercises) + j]
+        return None if math.isnan(grade) else float(grade)
+
+    def add_submissions(self, items: T.Iterable[data.CourseSubmissionsBulkItem],
+                        pick: SubmissionPick = SubmissionPick.BEST, kind: GradeKind = GradeKind.EFFECTIVE):
+        """
+        Set grades from Teacher.get_course_submissions_bulk() results, failed items are added to errors.
+        """
+        rows, columns, grades = [], [], []
+        for item in items:
+            if item.error is not None:
+                self.errors.append((item.student_id, item.course_exercise_id, item.error))
+            elif item.submissions is not None:
+                grade = pick_grade(item.submissions.submissions or [], pick, kind)
+                rows.append(self.student_index[item.student_id])
+                columns.append(self.exercise_index[item.course_exercise_id])
+                grades.append(NAN if grade is None else grade)
+
+        if self.np is not None:
+            # One vectorized assignment instead of an indexing operation per grade
+            self.grades[rows, columns] = grades
+        else:
+            n = len(self.exercises)
+            for i, j, grade in zip(rows, columns, grades):
+                self.grades[i * n + j] = grade
+
+    def rows(self) -> T.Iterator[T.List[float]]:
+        n = len(self.exercises)
+        if self.np is not None:
+            for row in self.grades:
+                yield row.tolist()
+        else:
+            for i in range(len(self.students)):
+                yield self.grades[i * n:(i + 1) * n].tolist()
+
+    def _thresholds(self) -> T.List[float]:
+        return [NAN if e.grade_threshold is None else float(e.grade_threshold) for e in self.exercises]
+
+    def exercise_completion_rates(self) -> T.Dict[str, T.Optional[float]]:
+        """
+        Share of students whose grade reaches the exercise's grade_threshold, None for exercises without a threshold.
+        """
+        thresholds = self._thresholds()
+        if self.np is not None:
+            np = self.np
+            completed = (self.grades >= np.array(thresholds)).sum(axis=0)
+            rates = (completed / len(self.students)).tolist() if self.students else [NAN] * len(thresholds)
+        else:
+            counts = [0] * len(thresholds)
+            for row in self.rows():
+                for j, (grade, threshold) in enumerate(zip(row, thresholds)):
+                    if grade >= threshold:
+                        counts[j] += 1
+            rates = [c / len(self.students) if self.students else NAN for c in counts]
+        return {e.course_exercise_id: None if math.isnan(t) or math.isnan(r) else r
+                for e, t, r in zip(self.exercises, thresholds, rates)}
+
+    def student_completion_rates(self) -> T.Dict[str, float]:
+        """
+        Share of exercises with a threshold that each student has completed.
+        """
+        thresholds = self._thresholds()
+        with_threshold = sum(1 for t in thresholds if not math.isnan(t))
+        if self.np is not None:
+            completed = (self.grades >= self.np.array(thresholds)).sum(axis=1).tolist()
+        else:
+            completed = [sum(1 for grade, threshold in zip(row, thresholds) if grade >= threshold)
+                         for row in self.rows()]
+        return {s.id: c / with_threshold if with_threshold else 0.0 for s, c in zip(self.students, completed)}
+
+    def group_averages(self) -> T.Dict[str, T.Dict[str, T.Optional[float]]]:
+        """
+        Average grade on each exercise by group ID, over the group's students that have a grade.
+        Students in many groups are counted in each of them.
+        """
+        groups: T.Dict[str, T.List[int]] = {}
+        for i, student in enumerate(self.students):
+            for group in student.groups or []:
+                groups.setdefault(group.id, []).append(i)
+        group_ids = list(groups)
+
+        if self.np is not None:
+            np = self.np
+            membership = np.zeros((len(group_ids), len(self.students)))
+            for g, members in enumerate(groups.values()):
+                membership[g, members] = 1
+            graded = ~np.isnan(self.grades)
+            sums = membership @ np.where(graded, self.grades, 0)
+            counts = membership @ graded
+            with np.errstate(invalid='ignore', divide='ignore'):
+                averages = (sums / counts).tolist()
+        else:
+            n = len(self.exercises)
+            averages = []
+            for members in groups.values():
+                sums, counts = [0.0] * n, [0] * n
+                for i in members:
+                    for j, grade in enumerate(self.grades[i * n:(i + 1) * n]):
+                        if not math.isnan(grade):
+                            sums[j] += grade
+                            counts[j] += 1
+                averages.append([s / c if c else NAN for s, c in zip(sums, counts)])
+
+        return {group_id: {e.course_exercise_id: None if math.isnan(avg) else avg
+                           for e, avg in zip(self.exercises, group_averages)}
+                for group_id, group_averages in zip(group_ids, averages)}
+
+    def histogram(self, course_exercise_id: T.Optional[str] = None, bins: int = 10,
+                  grade_range: T.Tuple[float, float] = (0, 100)) -> T.Tuple[T.List[int], T.List[float]]:
+        """
+        Distribution of the grades of one exercise or all of them, as (counts, bin edges). Like numpy.histogram,
+        the last bin includes its right edge.
+        """
+        low, high = grade_range
+        if self.np is not None:
+            np = self.np
+            values = self.grades
+            if course_exercise_id is not None:
+                values = values[:, self.exercise_index[course_exercise_id]]
+            values = values[~np.isnan(values)]
+            counts, edges = np.histogram(values, bins, grade_range)
+            return counts.tolist(), edges.tolist()
+
+        if course_exercise_id is None:
+            values = self.grades
+        else:
+            j, n = self.exercise_index[course_exercise_id], len(self.exercises)
+            values = (self.grades[i * n + j] for i in range(len(self.students)))
+        counts = [0] * bins
+        width = (high - low) / bins
+        for value in values:
+            if low <= value <= high:
+                counts[min(int((value - low) / width), bins - 1)] += 1
+        return counts, [low + width * i for i in range(bins + 1)]
+
+    def to_csv(self, file: T.TextIO, use_titles: bool = True):
+        """
+        Write one row per student: ID, email, name, group names and a grade per exercise, empty if missing.
+
+        :param use_titles: exercise titles as column names instead of course exercise IDs
+        """
+        writer = csv.writer(file)
+        writer.writerow(['student_id', 'email', 'given_name', 'family_name', 'groups'] +
+                        [e.effective_title if use_titles else e.course_exercise_id for e in self.exercises])
+        for student, row in zip(self.students, self.rows()):
+            writer.writerow([student.id, student.email, student.given_name, student.family_name,
+                             ';'.join(g.name for g in student.groups or [])] +
+                            ['' if math.isnan(g) else _format_grade(g) for g in row])
+
+
+def _format_grade(grade: float) -> T.Union[int, float]:
+    return int(grade) if grade.is_integer() else grade
@@ -0,0 +1,219 @@
+import bisect
+import logging
+import threading
+import typing as T
+from dataclasses import dataclass
+
+LATENCY_BUCKETS_SEC = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+@dataclass
+class RequestEvent:
+    method: str
+    path: str
+    # Path with IDs replaced, e.g. /teacher/courses/{id}/exercises
+    endpoint: str
+    # 0 for the first attempt, 1 for the first retry etc.
+    attempt: int
+
+
+@dataclass
+class ResponseEvent:
+    request: RequestEvent
+    status_code: T.Optional[int]
+    network_sec: float
+    size_bytes: int
+    error: T.Optional[Exception]
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: T.Sequence[float]):
+        self.buckets = buckets
+        # Last one is for values larger than all buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> T.List[T.Tuple[str, int]]:
+        result = []
+        total = 0
+        for le, count in zip([str(b) for b in self.buckets] + ['+Inf'], self.counts):
+            total += count
+            result.append((le, total))
+        return result
+
+    def snapshot(self) -> dict:
+        return {'buckets': dict(self.cumulative_counts()), 'sum': self.sum, 'count': self.count}
+
+
+class EndpointStats:
+    __slots__ = ('status_codes', 'errors', 'retries', 'coalesced', 'network_sec', 'decode_sec', 'response_bytes')
+
+    def __init__(self):
+        self.status_codes: T.Dict[int, int] = {}
+        self.errors = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.network_sec = Histogram(LATENCY_BUCKETS_SEC)
+        self.decode_sec = Histogram(LATENCY_BUCKETS_SEC)
+        self.response_bytes = Histogram(SIZE_BUCKETS_BYTES)
+
+    def snapshot(self) -> dict:
+        return {
+            'requests': self.network_sec.count,
+            'status_codes': dict(self.status_codes),
+            'errors': self.errors,
+            'retries': self.retries,
+            'coalesced': self.coalesced,
+            'network_sec': self.network_sec.snapshot(),
+            'decode_sec': self.decode_sec.snapshot(),
+            'response_bytes': self.response_bytes.snapshot(),
+        }
+
+
+class Metrics:
+    """
+    Request statistics per endpoint template and method, and hooks called before and after each request attempt.
+    Safe to share between clients and threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: T.Dict[T.Tuple[str, str], EndpointStats] = {}
+        self.token_refreshes = 0
+        self.token_refresh_failures = 0
+        self.before_request_hooks: T.List[T.Callable[[RequestEvent], None]] = []
+        self.after_request_hooks: T.List[T.Callable[[ResponseEvent], None]] = []
+
+    def add_before_request_hook(self, hook: T.Callable[[RequestEvent], None]):
+        self.before_request_hooks.append(hook)
+
+    def add_after_request_hook(self, hook: T.Callable[[ResponseEvent], None]):
+        self.after_request_hooks.append(hook)
+
+    def before_request(self, event: RequestEvent):
+        for hook in self.before_request_hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                logging.warning(f'Before request hook failed: {repr(e)}')
+
+    def after_request(self, event: ResponseEvent):
+        with self._lock:
+            stats = self._get_stats(event.request.method, event.request.endpoint)
+            if event.request.attempt > 0:
+                stats.retries += 1
+            if event.error is not None:
+                stats.errors += 1
+            else:
+                stats.status_codes[event.status_code] = stats.status_codes.get(event.status_code, 0) + 1
+                stats.response_bytes.observe(event.size_bytes)
+            stats.network_sec.observe(event.network_sec)
+
+        for hook in self.after_request_hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                logging.warning(f'After request hook failed: {repr(e)}')
+
+    def record_decode(self, method: str, endpoint: str, decode_sec: float):
+        with self._lock:
+            self._get_stats(method, endpoint).decode_sec.observe(decode_sec)
+
+    def record_coalesced(self, method: str, endpoint: str):
+        with self._lock:
+            self._get_stats(method, endpoint).coalesced += 1
+
+    def record_token_refresh(self, success: bool):
+        with self._lock:
+            if success:
+                self.token_refreshes += 1
+            else:
+                self.token_refresh_failures += 1
+
+    def _get_stats(self, method: str, endpoint: str) -> EndpointStats:
+        stats = self._endpoints.get((method, endpoint))
+        if stats is None:
+            stats = EndpointStats()
+            self._endpoints[(method, endpoint)] = stats
+        return stats
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'endpoints': {f'{method} {endpoint}': stats.snapshot()
+                              for (method, endpoint), stats in self._endpoints.items()},
+                'token_refreshes': self.token_refreshes,
+                'token_refresh_failures': self.token_refresh_failures,
+            }
+
+    def to_prometheus(self, prefix: str = 'easy') -> str:
+        """
+        Metrics in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def header(name: str, metric_type: str, help_text: str):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {metric_type}')
+
+        def histogram(name: str, help_text: str, get: T.Callable[[EndpointStats], Histogram]):
+            header(name, 'histogram', help_text)
+            for (method, endpoint), stats in endpoints:
+                h = get(stats)
+                labels = _labels(method=method, endpoint=endpoint)
+                for le, count in h.cumulative_counts():
+                    lines.append(f'{prefix}_{name}_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f'{prefix}_{name}_sum{{{labels}}} {h.sum}')
+                lines.append(f'{prefix}_{name}_count{{{labels}}} {h.count}')
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+
+            header('responses_total', 'counter', 'Responses by status code.')
+            for (method, endpoint), stats in endpoints:
+                for status, count in sorted(stats.status_codes.items()):
+                    labels = _labels(method=method, endpoint=endpoint, status=status)
+                    lines.append(f'{prefix}_responses_total{{{labels}}} {count}')
+
+            header('request_errors_total', 'counter', 'Requests that failed without a response.')
+            for (method, endpoint), stats in endpoints:
+                lines.append(f'{prefix}_request_errors_total{{{_labels(method=method, endpoint=endpoint)}}} '
+                             f'{stats.errors}')
+
+            header('request_retries_total', 'counter', 'Retried request attempts.')
+            for (method, endpoint), stats in endpoints:
+                lines.append(f'{prefix}_request_retries_total{{{_labels(method=method, endpoint=endpoint)}}} '
+                             f'{stats.retries}')
+
+            header('requests_coalesced_total', 'counter', 'Calls served by an identical request already in flight.')
+            for (method, endpoint), stats in endpoints:
+                lines.append(f'{prefix}_requests_coalesced_total{{{_labels(method=method, endpoint=endpoint)}}} '
+                             f'{stats.coalesced}')
+
+            histogram('request_network_seconds', 'Time from sending a request to receiving the whole response.',
+                      lambda s: s.network_sec)
+            histogram('response_decode_seconds', 'Time spent decoding responses into DTOs.',
+                      lambda s: s.decode_sec)
+            histogram('response_size_bytes', 'Response body sizes.', lambda s: s.response_bytes)
+
+            header('token_refreshes_total', 'counter', 'Token refreshes using the refresh token.')
+            lines.append(f'{prefix}_token_refreshes_total{{result="success"}} {self.token_refreshes}')
+            lines.append(f'{prefix}_token_refreshes_total{{result="failure"}} {self.token_refresh_failures}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels.items())
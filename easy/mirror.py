@@ -0,0 +1,382 @@
+"""
+Local SQLite copy of a course: participants, groups, exercises and submissions. Submissions don't change once they
+have been made, so after the first sync only new ones are downloaded.
+"""
+import logging
+import sqlite3
+import time
+import typing as T
+from dataclasses import dataclass, field
+
+from requests import RequestException
+
+from . import data, gradebook, util
+from .exceptions import ErrorResponseException
+
+if T.TYPE_CHECKING:
+    from .ez import Teacher
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    course_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    email TEXT,
+    given_name TEXT,
+    family_name TEXT,
+    created_at TEXT,
+    moodle_username TEXT,
+    PRIMARY KEY (course_id, id)
+);
+CREATE TABLE IF NOT EXISTS groups (
+    course_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT,
+    PRIMARY KEY (course_id, id)
+);
+CREATE TABLE IF NOT EXISTS student_groups (
+    course_id TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    group_id TEXT NOT NULL,
+    PRIMARY KEY (course_id, student_id, group_id)
+);
+CREATE TABLE IF NOT EXISTS exercises (
+    course_id TEXT NOT NULL,
+    course_exercise_id TEXT NOT NULL,
+    exercise_id TEXT,
+    library_title TEXT,
+    title_alias TEXT,
+    effective_title TEXT,
+    grade_threshold INTEGER,
+    student_visible INTEGER,
+    student_visible_from TEXT,
+    soft_deadline TEXT,
+    hard_deadline TEXT,
+    grader_type TEXT,
+    ordering_idx INTEGER,
+    unstarted_count INTEGER,
+    ungraded_count INTEGER,
+    started_count INTEGER,
+    completed_count INTEGER,
+    PRIMARY KEY (course_id, course_exercise_id)
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    course_id TEXT NOT NULL,
+    course_exercise_id TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    solution TEXT,
+    created_at TEXT,
+    grade_auto INTEGER,
+    feedback_auto TEXT,
+    grade_teacher INTEGER,
+    feedback_teacher TEXT
+);
+CREATE INDEX IF NOT EXISTS submissions_by_pair ON submissions (course_id, course_exercise_id, student_id, created_at);
+CREATE INDEX IF NOT EXISTS submissions_by_student ON submissions (course_id, student_id, created_at);
+-- What has been mirrored of each (student, exercise) pair
+CREATE TABLE IF NOT EXISTS watermarks (
+    course_id TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    course_exercise_id TEXT NOT NULL,
+    submission_count INTEGER NOT NULL,
+    latest_created_at TEXT,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (course_id, student_id, course_exercise_id)
+);
+"""
+
+EXERCISE_COLUMNS = ['course_exercise_id', 'exercise_id', 'library_title', 'title_alias', 'effective_title',
+                    'grade_threshold', 'student_visible', 'student_visible_from', 'soft_deadline', 'hard_deadline',
+                    'grader_type', 'ordering_idx', 'unstarted_count', 'ungraded_count', 'started_count',
+                    'completed_count']
+SUBMISSION_COLUMNS = ['id', 'solution', 'created_at', 'grade_auto', 'feedback_auto', 'grade_teacher',
+                      'feedback_teacher']
+# Pairs whose results are written to the database in one transaction
+COMMIT_EVERY_PAIRS = 500
+
+
+@dataclass
+class SyncResult:
+    course_id: str
+    pairs: int = 0
+    # Pairs whose submission count had not changed
+    unchanged_pairs: int = 0
+    new_submissions: int = 0
+    requests: int = 0
+    # (student_id, course_exercise_id, error) of pairs that failed, they are tried again on the next sync
+    errors: T.List[T.Tuple[str, str, Exception]] = field(default_factory=list)
+
+
+@dataclass
+class _PairFetch:
+    student_id: str
+    course_exercise_id: str
+    count: int
+    submissions: T.List[data.TeacherCourseExerciseSubmissionsStudent]
+    requests: int
+    error: T.Optional[Exception] = None
+    # The fetched submissions are all of the pair's and replace the mirrored ones
+    replace: bool = False
+
+
+class CourseMirror:
+    def __init__(self, teacher: 'Teacher', path: str):
+        """
+        :param teacher: used for syncing, e.g. Ez.teacher
+        :param path: SQLite database file, created if it doesn't exist
+        """
+        self.teacher = teacher
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self) -> 'CourseMirror':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def sync(self, course_id: str, max_workers: int = 8, full: bool = False,
+             progress: T.Optional[T.Callable[[int, int], None]] = None) -> SyncResult:
+        """
+        Bring the mirror of this course up to date. Participants and exercises are replaced, submissions are added.
+
+        For each (student, exercise) pair, its newest submission is requested to learn the pair's current submission
+        count. If the count and the newest submission's creation time match the mirrored ones, nothing else is
+        requested, if only new submissions have been added, only those are, otherwise all of the pair's submissions.
+
+        :param full: download all submissions again, e.g. to pick up grades teachers have changed since
+        :param progress: called with (done, total) after each pair
+        """
+        util.assert_not_none(course_id)
+        logging.debug(f"Sync course {course_id} mirror with {max_workers} workers")
+        result = SyncResult(course_id)
+
+        students = self.teacher.get_course_participants(course_id, data.ParticipantRole.STUDENT).students
+        exercises = self.teacher.get_course_exercises(course_id).exercises
+        result.requests += 2
+        with self.db:
+            self._replace_participants(course_id, students)
+            self._replace_exercises(course_id, exercises)
+
+        watermarks = {} if full else {
+            (row['student_id'], row['course_exercise_id']): (row['submission_count'], row['latest_created_at'])
+            for row in self.db.execute('SELECT student_id, course_exercise_id, submission_count, latest_created_at '
+                                       'FROM watermarks WHERE course_id = ?', (course_id,))}
+        pairs = [(s.id, e.course_exercise_id) for s in students for e in exercises]
+        result.pairs = len(pairs)
+
+        def fetch(student_id: str, course_exercise_id: str) -> _PairFetch:
+            try:
+                return self._fetch_pair(course_id, student_id, course_exercise_id,
+                                        *watermarks.get((student_id, course_exercise_id), (0, None)))
+            except (ErrorResponseException, RequestException) as e:
+                logging.warning(f"Syncing submissions of student {student_id} to course exercise "
+                                f"{course_exercise_id} failed: {repr(e)}")
+                return _PairFetch(student_id, course_exercise_id, 0, [], 0, e)
+
+        try:
+            for done_count, fetched in enumerate(util.map_unordered(fetch, pairs, max_workers), 1):
+                self._store_pair(course_id, fetched, result)
+                if done_count % COMMIT_EVERY_PAIRS == 0:
+                    self.db.commit()
+                if progress is not None:
+                    progress(done_count, len(pairs))
+        finally:
+            self.db.commit()
+
+        logging.info(f"Synced course {course_id}: {result.new_submissions} new submissions, "
+                     f"{result.unchanged_pairs}/{result.pairs} pairs unchanged, {result.requests} requests, "
+                     f"{len(result.errors)} errors")
+        return result
+
+    def _fetch_pair(self, course_id: str, student_id: str, course_exercise_id: str, known_count: int,
+                    known_latest_created_at: T.Optional[str]) -> _PairFetch:
+        get = self.teacher.get_course_exercise_submissions_student
+        if known_count == 0:
+            resp = get(course_id, course_exercise_id, student_id)
+            return _PairFetch(student_id, course_exercise_id, resp.count, resp.submissions or [], 1)
+
+        probe = get(course_id, course_exercise_id, student_id, limit=1)
+        latest_created_at = probe.submissions[0].created_at if probe.submissions else None
+        if probe.count == known_count and latest_created_at == known_latest_created_at:
+            return _PairFetch(student_id, course_exercise_id, probe.count, [], 1)
+        if probe.count <= known_count:
+            # Submissions have been removed or replaced, which shouldn't happen, start over with this pair
+            resp = get(course_id, course_exercise_id, student_id)
+            return _PairFetch(student_id, course_exercise_id, resp.count, resp.submissions or [], 2, replace=True)
+
+        # Submissions are listed newest first, so the new ones are at the start
+        new_count = probe.count - known_count
+        if new_count == 1:
+            return _PairFetch(student_id, course_exercise_id, probe.count, probe.submissions or [], 1)
+        resp = get(course_id, course_exercise_id, student_id, limit=new_count)
+        return _PairFetch(student_id, course_exercise_id, resp.count, resp.submissions or [], 2)
+
+    def _store_pair(self, course_id: str, fetched: _PairFetch, result: SyncResult):
+        result.requests += fetched.requests
+        if fetched.error is not None:
+            result.errors.append((fetched.student_id, fetched.course_exercise_id, fetched.error))
+            return
+
+        key = (course_id, fetched.student_id, fetched.course_exercise_id)
+        if fetched.replace:
+            known_ids = {row[0] for row in self.db.execute(
+                'SELECT id FROM submissions WHERE course_id = ? AND student_id = ? AND course_exercise_id = ?', key)}
+            self.db.execute('DELETE FROM submissions WHERE course_id = ? AND student_id = ? '
+                            'AND course_exercise_id = ?', key)
+            self._insert_submissions(key, fetched.submissions)
+            result.new_submissions += sum(s.id not in known_ids for s in fetched.submissions)
+            self._store_watermark(key, fetched.count)
+            return
+
+        count_before = self._stored_count(key)
+        server_count = fetched.count
+        self._insert_submissions(key, fetched.submissions)
+        stored_count = self._stored_count(key)
+        if stored_count < server_count:
+            # The new submissions were not the first ones listed, get all of them
+            logging.debug(f"Submissions of student {fetched.student_id} to course exercise "
+                          f"{fetched.course_exercise_id} not in the expected order, getting all of them")
+            result.requests += 1
+            try:
+                resp = self.teacher.get_course_exercise_submissions_student(course_id, fetched.course_exercise_id,
+                                                                            fetched.student_id)
+            except (ErrorResponseException, RequestException) as e:
+                result.errors.append((fetched.student_id, fetched.course_exercise_id, e))
+                return
+            self._insert_submissions(key, resp.submissions or [])
+            stored_count = self._stored_count(key)
+            server_count = resp.count
+
+        if stored_count == count_before:
+            result.unchanged_pairs += 1
+        result.new_submissions += stored_count - count_before
+        self._store_watermark(key, server_count)
+
+    def _store_watermark(self, key: T.Tuple[str, str, str], server_count: int):
+        # The server's count, so that the next probe matches it if nothing has changed
+        latest = self.db.execute('SELECT MAX(created_at) FROM submissions WHERE course_id = ? AND student_id = ? '
+                                 'AND course_exercise_id = ?', key).fetchone()[0]
+        self.db.execute('INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?, ?, ?)',
+                        (*key, server_count, latest, time.time()))
+
+    def _stored_count(self, key: T.Tuple[str, str, str]) -> int:
+        return self.db.execute('SELECT COUNT(*) FROM submissions WHERE course_id = ? AND student_id = ? '
+                               'AND course_exercise_id = ?', key).fetchone()[0]
+
+    def _insert_submissions(self, key: T.Tuple[str, str, str],
+                            submissions: T.Iterable[data.TeacherCourseExerciseSubmissionsStudent]):
+        course_id, student_id, course_exercise_id = key
+        # Replacing keeps the grades of resynced submissions up to date
+        self.db.executemany(
+            f'INSERT OR REPLACE INTO submissions (course_id, course_exercise_id, student_id, '
+            f'{", ".join(SUBMISSION_COLUMNS)}) VALUES (?, ?, ?, {", ".join("?" * len(SUBMISSION_COLUMNS))})',
+            [(course_id, course_exercise_id, student_id, *(getattr(s, c) for c in SUBMISSION_COLUMNS))
+             for s in submissions])
+
+    def _replace_participants(self, course_id: str, students: T.List[data.CourseParticipantsStudent]):
+        for table in ('students', 'groups', 'student_groups'):
+            self.db.execute(f'DELETE FROM {table} WHERE course_id = ?', (course_id,))
+        self.db.executemany('INSERT INTO students VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            [(course_id, s.id, s.email, s.given_name, s.family_name, s.created_at, s.moodle_username)
+                             for s in students])
+        groups = {g.id: g.name for s in students for g in s.groups or []}
+        self.db.executemany('INSERT INTO groups VALUES (?, ?, ?)',
+                            [(course_id, group_id, name) for group_id, name in groups.items()])
+        self.db.executemany('INSERT OR IGNORE INTO student_groups VALUES (?, ?, ?)',
+                            [(course_id, s.id, g.id) for s in students for g in s.groups or []])
+
+    def _replace_exercises(self, course_id: str, exercises: T.List[data.TeacherCourseExercises]):
+        self.db.execute('DELETE FROM exercises WHERE course_id = ?', (course_id,))
+        self.db.executemany(
+            f'INSERT INTO exercises (course_id, {", ".join(EXERCISE_COLUMNS)}) '
+            f'VALUES (?, {", ".join("?" * len(EXERCISE_COLUMNS))})',
+            [(course_id, *(_to_column(getattr(e, c)) for c in EXERCISE_COLUMNS)) for e in exercises])
+
+    def query(self, sql: str, params: T.Sequence[T.Any] = ()) -> T.List[sqlite3.Row]:
+        """
+        Run any query against the mirror, see SCHEMA for the tables.
+        """
+        return self.db.execute(sql, params).fetchall()
+
+    def students(self, course_id: str) -> T.List[data.CourseParticipantsStudent]:
+        groups: T.Dict[str, T.List[data.CourseGroup]] = {}
+        for row in self.db.execute('SELECT sg.student_id, g.id, g.name FROM student_groups sg '
+                                   'JOIN groups g ON g.course_id = sg.course_id AND g.id = sg.group_id '
+                                   'WHERE sg.course_id = ?', (course_id,)):
+            groups.setdefault(row['student_id'], []).append(data.CourseGroup(row['id'], row['name']))
+        return [data.CourseParticipantsStudent(row['id'], row['email'], row['given_name'], row['family_name'],
+                                               row['created_at'], groups.get(row['id'], []), row['moodle_username'])
+                for row in self.db.execute('SELECT * FROM students WHERE course_id = ? ORDER BY family_name, '
+                                           'given_name', (course_id,))]
+
+    def exercises(self, course_id: str) -> T.List[data.TeacherCourseExercises]:
+        exercises = []
+        for row in self.db.execute('SELECT * FROM exercises WHERE course_id = ? ORDER BY ordering_idx', (course_id,)):
+            values = {c: row[c] for c in EXERCISE_COLUMNS}
+            values['student_visible'] = None if values['student_visible'] is None else bool(values['student_visible'])
+            values['grader_type'] = data.GraderType(values['grader_type']) if values['grader_type'] else None
+            exercises.append(data.TeacherCourseExercises(**values))
+        return exercises
+
+    def submissions(self, course_id: str, student_id: T.Optional[str] = None,
+                    course_exercise_id: T.Optional[str] = None,
+                    since: T.Optional[str] = None) -> T.List[data.TeacherCourseExerciseSubmissionsStudent]:
+        """
+        Mirrored submissions, newest first.
+
+        :param since: only submissions created after this ISO timestamp
+        """
+        sql = f'SELECT {", ".join(SUBMISSION_COLUMNS)} FROM submissions WHERE course_id = ?'
+        params = [course_id]
+        if student_id is not None:
+            sql += ' AND student_id = ?'
+            params.append(student_id)
+        if course_exercise_id is not None:
+            sql += ' AND course_exercise_id = ?'
+            params.append(course_exercise_id)
+        if since is not None:
+            sql += ' AND created_at > ?'
+            params.append(since)
+        sql += ' ORDER BY created_at DESC'
+        return [data.TeacherCourseExerciseSubmissionsStudent(*row) for row in self.db.execute(sql, params)]
+
+    def submission_counts(self, course_id: str) -> T.Dict[T.Tuple[str, str], int]:
+        """
+        Number of submissions by (student_id, course_exercise_id), pairs without submissions are left out.
+        """
+        return {(row[0], row[1]): row[2] for row in self.db.execute(
+            'SELECT student_id, course_exercise_id, COUNT(*) FROM submissions WHERE course_id = ? '
+            'GROUP BY student_id, course_exercise_id', (course_id,))}
+
+    def gradebook(self, course_id: str, pick: gradebook.SubmissionPick = gradebook.SubmissionPick.BEST,
+                  kind: gradebook.GradeKind = gradebook.GradeKind.EFFECTIVE) -> gradebook.Gradebook:
+        """
+        Gradebook of this course from the mirror, without any requests.
+        """
+        book = gradebook.Gradebook(self.students(course_id), self.exercises(course_id))
+        by_pair: T.Dict[T.Tuple[str, str], T.List[data.TeacherCourseExerciseSubmissionsStudent]] = {}
+        for row in self.db.execute('SELECT student_id, course_exercise_id, id, created_at, grade_auto, '
+                                   'grade_teacher FROM submissions WHERE course_id = ?', (course_id,)):
+            by_pair.setdefault((row[0], row[1]), []).append(data.TeacherCourseExerciseSubmissionsStudent(
+                row['id'], None, row['created_at'], row['grade_auto'], None, row['grade_teacher'], None))
+        book.add_submissions(
+            data.CourseSubmissionsBulkItem(student_id, course_exercise_id,
+                                           data.TeacherCourseExerciseSubmissionsStudentResp(
+                                               200, None, submissions, len(submissions)), None)
+            for (student_id, course_exercise_id), submissions in by_pair.items()
+            if student_id in book.student_index and course_exercise_id in book.exercise_index)
+        return book
+
+
+def _to_column(value: T.Any) -> T.Any:
+    if isinstance(value, data.GraderType):
+        return value.value
+    if isinstance(value, bool):
+        return int(value)
+    return value
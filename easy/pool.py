@@ -0,0 +1,212 @@
+"""
+Clients for many accounts that share one connection pool and one background token refresher, e.g. for a service that
+acts on behalf of many teachers and students. Each account's client keeps its own tokens and refresh state.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+import typing as T
+import urllib.parse
+from collections import OrderedDict
+
+from . import util
+from .defaults import gen_read_token_from_file, gen_write_token_to_file
+from .ez import Ez, TokenRefresher, TokenType
+from .metrics import Metrics
+
+RetrieveToken = T.Callable[[TokenType], T.Optional[dict]]
+PersistToken = T.Callable[[TokenType, T.Optional[dict]], None]
+# Identity -> (retrieve_token, persist_token) of its client
+TokenStorage = T.Callable[[str], T.Tuple[RetrieveToken, PersistToken]]
+
+
+def file_token_storage(directory: str) -> TokenStorage:
+    """
+    Keep the tokens of each identity in files in a subdirectory of directory named after the identity. Characters
+    that could make the name point elsewhere, like path separators, are percent-encoded.
+    """
+    def storage(identity: str) -> T.Tuple[RetrieveToken, PersistToken]:
+        subdirectory = _identity_to_file_name(identity)
+
+        def path_provider(token_type: TokenType) -> str:
+            return os.path.join(directory, subdirectory)
+
+        def namer(token_type: TokenType) -> str:
+            return token_type.value + '.json'
+
+        return gen_read_token_from_file(path_provider, namer), gen_write_token_to_file(path_provider, namer)
+
+    return storage
+
+
+def _identity_to_file_name(identity: str) -> str:
+    """
+    File name for an identity that stays inside its directory, e.g. 'a/b' -> 'a%2Fb'. Raise ValueError for an
+    identity that can't be a file name, i.e. '', '.' or '..'.
+    """
+    # Keeps e-mail addresses readable
+    name = urllib.parse.quote(identity, safe='@+')
+    if name in ('', '.', '..'):
+        raise ValueError(f"Invalid identity '{identity}'")
+    return name
+
+
+class ClientPool:
+    def __init__(self,
+                 api_base_url: str,
+                 idp_url: str,
+                 idp_client_name: str,
+                 token_storage: T.Optional[TokenStorage] = None,
+                 max_idle_sec: float = 600,
+                 max_clients: T.Optional[int] = None,
+                 http_pool_connections: int = 10,
+                 http_pool_maxsize: int = 10,
+                 http_keep_alive: bool = True,
+                 background_token_refresh: bool = True,
+                 max_memory_token_identities: int = 10000,
+                 **ez_kwargs: T.Any):
+        """
+        Cheap per-account Ez clients. All of them share one connection pool, so at most http_pool_maxsize connections
+        are open per host however many accounts are active, and one TokenRefresher thread. Each client has its own
+        session though, so that cookies set for one account are never sent for another. Clients that haven't been
+        used for max_idle_sec, or the least recently used ones beyond max_clients, are shut down when get() is called
+        or with evict_idle(). A client still held by the caller after its eviction keeps working, but its tokens are
+        no longer refreshed in the background.
+
+        :param token_storage: function that returns the retrieve_token and persist_token functions of an identity,
+            e.g. file_token_storage('tokens'). Default: tokens are kept in memory, see max_memory_token_identities
+        :param max_memory_token_identities: if tokens are kept in memory, keep them for at most this many
+            identities. The tokens of the least recently used identities without a client are forgotten first.
+        :param ez_kwargs: other Ez arguments given to every client, e.g. retry_policy or response_cache. Clients share
+            one Metrics unless metrics is given.
+        """
+        self.api_base_url = api_base_url
+        self.idp_url = idp_url
+        self.idp_client_name = idp_client_name
+        self.token_storage = token_storage if token_storage is not None else self._memory_token_storage
+        self.max_idle_sec = max_idle_sec
+        self.max_clients = max_clients
+        # Only its connection pools are used, each client gets a session of its own sharing them
+        self.session = util.new_session(http_pool_connections, http_pool_maxsize, http_keep_alive)
+        self.token_refresher: T.Optional[TokenRefresher] = TokenRefresher() if background_token_refresh else None
+        ez_kwargs.setdefault('metrics', Metrics())
+        self.metrics: Metrics = ez_kwargs['metrics']
+        self.ez_kwargs = ez_kwargs
+
+        # Identity -> client, least recently used first
+        self._clients: T.OrderedDict[str, Ez] = OrderedDict()
+        self._last_used: T.Dict[str, float] = {}
+        self.max_memory_token_identities = max_memory_token_identities
+        # Identity -> its tokens, least recently used first
+        self._memory_tokens: T.OrderedDict[str, T.Dict[TokenType, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _memory_token_storage(self, identity: str) -> T.Tuple[RetrieveToken, PersistToken]:
+        # Called by get() with the lock held
+        tokens = self._memory_tokens.setdefault(identity, {})
+        self._memory_tokens.move_to_end(identity)
+        excess = len(self._memory_tokens) - self.max_memory_token_identities
+        if excess > 0:
+            # Tokens of the identities with a client are still in use
+            forgotten = list(itertools.islice(
+                (i for i in self._memory_tokens if i != identity and i not in self._clients), excess))
+            for i in forgotten:
+                del self._memory_tokens[i]
+            logging.debug(f'Forgot the tokens of {len(forgotten)} identities')
+        return util.memory_token_storage(tokens)
+
+    def get(self, identity: str) -> Ez:
+        """
+        Client of this identity, created if there is none.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Client pool is closed')
+            evicted = self._pop_idle(now)
+            client = self._clients.get(identity)
+            if client is None:
+                logging.debug(f"Creating a pooled client for '{identity}'")
+                retrieve_token, persist_token = self.token_storage(identity)
+                client = Ez(self.api_base_url, self.idp_url, self.idp_client_name, retrieve_token, persist_token,
+                            session=util.new_session_sharing_connections(self.session),
+                            token_refresher=self.token_refresher, **self.ez_kwargs)
+                self._clients[identity] = client
+                if self.max_clients is not None:
+                    while len(self._clients) > self.max_clients:
+                        evicted.append(self._pop_oldest())
+            else:
+                self._clients.move_to_end(identity)
+            self._last_used[identity] = now
+        self._shutdown(evicted)
+        return client
+
+    def evict_idle(self) -> int:
+        """
+        Shut down the clients that haven't been used for max_idle_sec.
+
+        :return: number of evicted clients
+        """
+        with self._lock:
+            evicted = self._pop_idle(time.monotonic())
+        self._shutdown(evicted)
+        return len(evicted)
+
+    def remove(self, identity: str) -> bool:
+        """
+        Shut down the client of this identity, e.g. when the account logs out. Its stored tokens are kept.
+        """
+        with self._lock:
+            client = self._clients.pop(identity, None)
+            self._last_used.pop(identity, None)
+        if client is None:
+            return False
+        self._shutdown([client])
+        return True
+
+    def _pop_idle(self, now: float) -> T.List[Ez]:
+        evicted = []
+        # Ordered by last use, so the idle ones are at the front
+        while self._clients and now - self._last_used[next(iter(self._clients))] > self.max_idle_sec:
+            evicted.append(self._pop_oldest())
+        return evicted
+
+    def _pop_oldest(self) -> Ez:
+        identity, client = self._clients.popitem(last=False)
+        del self._last_used[identity]
+        logging.debug(f"Evicting the pooled client of '{identity}'")
+        return client
+
+    @staticmethod
+    def _shutdown(clients: T.List[Ez]):
+        for client in clients:
+            client.shutdown()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def __contains__(self, identity: str) -> bool:
+        return identity in self._clients
+
+    def close(self):
+        """
+        Shut down all clients, the token refresher and the shared connection pool.
+        """
+        with self._lock:
+            self._closed = True
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._last_used.clear()
+        self._shutdown(clients)
+        if self.token_refresher is not None:
+            self.token_refresher.stop()
+        self.session.close()
+
+    def __enter__(self) -> 'ClientPool':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,103 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+import typing as T
+from dataclasses import dataclass
+
+import requests
+
+from .exceptions import CircuitOpenException
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Which failed requests are retried and how long to wait in between. Waits use full-jitter exponential backoff:
+    a random time between 0 and min(backoff_max_sec, backoff_base_sec * 2 ** attempt), or the server's Retry-After.
+
+    POST requests are not retried by default, as a request that timed out may still have been processed. Neither
+    are read timeouts, each attempt could take the whole timeout, so a slow server would make a call hang for
+    max_retries times longer. Connection errors and connect timeouts are retried.
+    """
+    max_retries: int = 3
+    backoff_base_sec: float = 0.5
+    backoff_max_sec: float = 30
+    retry_status_codes: T.FrozenSet[int] = frozenset({429, 502, 503, 504})
+    retry_get: bool = True
+    retry_post: bool = False
+    retry_read_timeouts: bool = False
+    respect_retry_after: bool = True
+    max_retry_after_sec: float = 120
+
+    def is_enabled_for(self, method: str) -> bool:
+        return self.retry_get if method == 'GET' else self.retry_post
+
+    def get_delay_sec(self, attempt: int, resp: T.Optional[requests.Response]) -> float:
+        if self.respect_retry_after and resp is not None:
+            retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after_sec)
+        return random.uniform(0, min(self.backoff_max_sec, self.backoff_base_sec * 2 ** attempt))
+
+
+def parse_retry_after(value: T.Optional[str]) -> T.Optional[float]:
+    """
+    Retry-After is either seconds or an HTTP date.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout_sec: float = 30):
+        """
+        Per-host circuit breaker: after failure_threshold consecutive failures (connection errors, timeouts and
+        5xx responses) to a host, requests to it fail immediately with CircuitOpenException for reset_timeout_sec.
+        After that, one trial request is let through, and its success closes the circuit again.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_sec = reset_timeout_sec
+        self._lock = threading.Lock()
+        self._failures: T.Dict[str, int] = {}
+        # host -> time when the next trial request is allowed
+        self._open_until: T.Dict[str, float] = {}
+
+    def before_request(self, host: str):
+        with self._lock:
+            open_until = self._open_until.get(host)
+            if open_until is None:
+                return
+            now = time.time()
+            if now < open_until:
+                raise CircuitOpenException(host, open_until - now)
+            # Half-open: let this request through, others fail until it completes or times out
+            self._open_until[host] = now + self.reset_timeout_sec
+
+    def record_success(self, host: str):
+        with self._lock:
+            self._failures.pop(host, None)
+            if self._open_until.pop(host, None) is not None:
+                logging.info(f'Circuit to {host} closed')
+
+    def record_failure(self, host: str):
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            if failures >= self.failure_threshold:
+                if host not in self._open_until:
+                    logging.warning(f'Circuit to {host} opened after {failures} consecutive failures')
+                self._open_until[host] = time.time() + self.reset_timeout_sec
+
+    def is_open(self, host: str) -> bool:
+        with self._lock:
+            return host in self._open_until
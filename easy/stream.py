@@ -0,0 +1,164 @@
+"""
+Incremental decoding of list responses. Objects in the list are parsed with the standard library's JSON decoder as
+soon as they have been received, as it's the one that can tell where an object ends. The pluggable codec is not used.
+"""
+import codecs
+import json
+import re
+import typing as T
+
+from . import decoder
+
+# Characters that change the scanner's state outside of strings
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+# Rest of a string up to its closing quote or the end of the buffer, escapes included
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_WHITESPACE = re.compile(r'[ \t\r\n]*')
+# Characters that can follow a complete number or literal in a list
+_SCALAR_END = frozenset(' \t\r\n,]')
+# Parse errors this close to the end of the buffer may be caused by the rest of the value not having arrived yet
+_INCOMPLETE_MARGIN = 8
+
+
+class ArrayItemDecoder:
+    def __init__(self, key: str, encoding: str = 'utf-8'):
+        """
+        Incremental decoder that finds the list under a key of the top-level JSON object and returns its items as
+        soon as each one is complete. Only the current item (or key) is buffered, everything else is dropped as soon
+        as it has been scanned.
+        """
+        self.key = '"' + key + '"'
+        self._text_decoder = codecs.getincrementaldecoder(encoding)()
+        self._json_decoder = json.JSONDecoder()
+        self.buf = ''
+        # Next character of buf to scan
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.string_start = 0
+        # Last string seen directly in the top-level object, the key of the value that follows it
+        self.last_top_level_string = ''
+        self.in_array = False
+        # Whether the last thing seen in the list was an item, then a comma or the end of the list must follow
+        self.after_item = False
+        # Whether the last thing seen in the list was a comma, then an item must follow
+        self.after_comma = False
+        # Don't try parsing an incomplete item again until the buffer has grown this long
+        self.retry_at = 0
+
+    def feed(self, chunk: bytes, final: bool = False) -> T.List[T.Any]:
+        buf = self.buf + self._text_decoder.decode(chunk, final)
+        if final:
+            self.retry_at = 0
+        pos = self.pos
+        items = []
+        while True:
+            if self.in_array:
+                pos = _WHITESPACE.match(buf, pos).end()
+                if pos >= len(buf) or len(buf) < self.retry_at:
+                    break
+                c = buf[pos]
+                if c == ']' and not self.after_comma:
+                    self.in_array = False
+                    self.depth -= 1
+                    pos += 1
+                    continue
+                if self.after_item:
+                    if c != ',':
+                        raise json.JSONDecodeError("Expecting ',' delimiter", buf, pos)
+                    self.after_item = False
+                    self.after_comma = True
+                    pos += 1
+                    continue
+                if c == ',' or c == ']':
+                    raise json.JSONDecodeError('Expecting value', buf, pos)
+                try:
+                    item, end = self._json_decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    if e.pos < len(buf) - _INCOMPLETE_MARGIN and not e.msg.startswith('Unterminated string'):
+                        raise
+                    # Wait until the buffer has doubled, so that a large item isn't parsed again for every chunk
+                    self.retry_at = pos + 2 * (len(buf) - pos)
+                    break
+                if not final and buf[pos] not in '{["' and (end >= len(buf) or buf[end] not in _SCALAR_END):
+                    # A number might continue in the next chunk, e.g. 4 followed by .5e3, so it's complete only once
+                    # the character after it has arrived
+                    if len(buf) - end > _INCOMPLETE_MARGIN:
+                        raise json.JSONDecodeError("Expecting ',' delimiter", buf, end)
+                    self.retry_at = len(buf) + 1
+                    break
+                items.append(item)
+                pos = end
+                self.after_item = True
+                self.after_comma = False
+                self.retry_at = 0
+                continue
+
+            if self.in_string:
+                pos = _STRING_BODY.match(buf, pos).end()
+                if pos >= len(buf) or buf[pos] != '"':
+                    # Stopped at the end of the buffer, or before a backslash whose escaped character is in the next
+                    # chunk
+                    break
+                pos += 1
+                self.in_string = False
+                if self.depth == 1:
+                    self.last_top_level_string = buf[self.string_start:pos]
+                continue
+
+            m = _STRUCTURAL.search(buf, pos)
+            if m is None:
+                pos = len(buf)
+                break
+            c = m.group()
+            pos = m.end()
+            if c == '"':
+                self.in_string = True
+                self.string_start = m.start()
+            elif c == '{' or c == '[':
+                self.depth += 1
+                if self.depth == 2 and c == '[' and self.last_top_level_string == self.key:
+                    self.in_array = True
+                    self.after_item = False
+                    self.after_comma = False
+            else:
+                self.depth -= 1
+
+        # Drop everything that has been scanned and isn't needed anymore
+        keep_from = pos
+        if self.in_string and self.depth == 1:
+            keep_from = min(keep_from, self.string_start)
+        if keep_from:
+            buf = buf[keep_from:]
+            self.string_start -= keep_from
+            if self.retry_at:
+                self.retry_at -= keep_from
+        self.buf = buf
+        self.pos = pos - keep_from
+        return items
+
+    def close(self) -> T.List[T.Any]:
+        """
+        Return the items still in the buffer at the end of the body.
+        """
+        items = self.feed(b'', True)
+        if self.depth != 0 or self.in_string or self.buf[self.pos:].strip():
+            raise ValueError('Response body ended before the JSON document was complete')
+        return items
+
+
+def iter_list_items(chunks: T.Iterable[bytes], key: str, item_dto_class: T.Type[T.Any], resp_code: int,
+                    response: decoder.RawResponse, encoding: str = 'utf-8') -> T.Iterator[T.Any]:
+    """
+    Decode the objects in the list under key of a JSON object into item_dto_class while the body is being read.
+    Raises ValueError if the body is not valid JSON.
+    """
+    def to_dto(item):
+        return decoder.decode(item_dto_class, item, resp_code, response) if isinstance(item, dict) else item
+
+    item_decoder = ArrayItemDecoder(key, encoding)
+    for chunk in chunks:
+        for item in item_decoder.feed(chunk):
+            yield to_dto(item)
+    for item in item_decoder.close():
+        yield to_dto(item)
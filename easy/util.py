@@ -3,13 +3,21 @@ import json
 import logging
 import socket
 import typing as T
-from dataclasses import fields
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
 
-from .data import Resp
+from . import codec, decoder
+from .data import Resp, ResponseMeta
 from .exceptions import ErrorResponseException, ErrorResp
 
+# Path segments that are followed by an ID in API paths
+ID_COLLECTIONS = {'courses', 'exercises', 'students'}
+
 
 def contains_none(args) -> bool:
     return None in args
@@ -21,38 +29,95 @@ def assert_not_none(*args):
 
 
 def get_free_port() -> int:
+    """
+    Deprecated: the auth callback server binds to port 0 itself, which avoids the race between finding a free port
+    and binding to it.
+    """
+    warnings.warn('get_free_port() is deprecated and will be removed', DeprecationWarning, stacklevel=2)
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
         sock.bind(('127.0.0.1', 0))
         return sock.getsockname()[1]
 
 
-def handle_response(resp: requests.Response, code_to_dto_class: T.Dict[int, T.Type[T.Any]]) -> Resp:
-    if resp.text.strip() == '':
+def new_session(pool_connections: int, pool_maxsize: int, keep_alive: bool = True) -> requests.Session:
+    """
+    Create a session with a connection pool that is safe to share between threads.
+
+    :param pool_connections: number of per-host connection pools to keep
+    :param pool_maxsize: max number of connections kept (and opened concurrently) per host
+    :param keep_alive: whether to keep connections (and their TLS sessions) open between requests
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def new_session_sharing_connections(session: requests.Session) -> requests.Session:
+    """
+    Create a session that uses the connection pools of session, but has its own cookies, e.g. for another account.
+    Closing either session closes the shared connection pools, so close only the original one once it's not used.
+    """
+    new = requests.Session()
+    for prefix, adapter in session.adapters.items():
+        new.mount(prefix, adapter)
+    new.headers = session.headers.copy()
+    return new
+
+
+def memory_token_storage(tokens: T.Optional[dict] = None) -> T.Tuple[T.Callable, T.Callable]:
+    """
+    retrieve_token and persist_token functions that keep the tokens in a dict by token type.
+    """
+    tokens = {} if tokens is None else tokens
+
+    def persist_token(token_type, token: T.Optional[dict]):
+        if token is None:
+            tokens.pop(token_type, None)
+        else:
+            tokens[token_type] = token
+
+    return tokens.get, persist_token
+
+
+def build_response(status_code: int, headers: T.Mapping[str, str], content: bytes, url: str) -> requests.Response:
+    """
+    Build a requests.Response from an already read response, e.g. one received by another HTTP client.
+    """
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp.headers = CaseInsensitiveDict(headers)
+    resp.encoding = get_encoding_from_headers(resp.headers)
+    resp.url = url
+    resp._content = content
+    return resp
+
+
+def handle_response(resp: requests.Response, code_to_dto_class: T.Dict[int, T.Type[T.Any]],
+                    keep_raw_response: bool = True) -> Resp:
+    content = resp.content
+    if not content or content.isspace():
         # Empty response is treated like an empty JSON object
         json_response = {}
     else:
         try:
-            json_response: dict = resp.json()
-        except json.decoder.JSONDecodeError as e:
-            # Not valid JSON
+            # The body is parsed straight from bytes, without decoding it to text first
+            json_response: dict = codec.loads(content, resp.encoding)
+        except (ValueError, LookupError) as e:
+            # Not valid JSON or unknown charset
             raise ErrorResponseException(resp, None, e)
 
-    logging.debug(f"JSON response: {json_response}")
+    # Formatting a large payload is expensive, only do it if it's going to be logged
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"JSON response: {json_response}")
 
     if resp.status_code in code_to_dto_class:
-        dto_class = code_to_dto_class[resp.status_code]
-
-        # Due to the usage of data classes:
-        # 1. Filter extra fields: avoid X.__init__() got an unexpected keyword argument 'X'
-        # 2. Set missing fields to None: avoid "X.__init__() missing x required positional arguments"
-        filtered_resp = {f.name: json_response.get(f.name, None) for f in fields(dto_class) if
-                         not (f.name in {"resp_code", "response"})}
-
-        if filtered_resp.keys() != json_response.keys():
-            logging.warning(
-                f"Response from {resp.url} differs from expected response. Difference in attributes: {filtered_resp.keys() ^ json_response.keys()}")
-
-        return dto_class(resp_code=resp.status_code, response=resp, **filtered_resp)
+        # Without the raw response, the body can be freed as soon as the DTO is built
+        response = resp if keep_raw_response else ResponseMeta.from_response(resp)
+        return decoder.decode(code_to_dto_class[resp.status_code], json_response, resp.status_code, response)
 
     else:
         try:
@@ -65,6 +130,99 @@ def handle_response(resp: requests.Response, code_to_dto_class: T.Dict[int, T.Ty
         raise ErrorResponseException(resp, error_rsp, nested_exception)
 
 
+def iter_pages(fetch_page: T.Callable[[int], T.Tuple[T.List[T.Any], bool]], page_size: int,
+               prefetch: bool = False) -> T.Iterator[T.Any]:
+    """
+    Iterate over the items of an offset/limit paginated resource, holding at most one page in memory
+    (two when prefetching).
+
+    :param fetch_page: returns the items on the page starting at the given offset and whether more pages follow
+    :param page_size: at least 1
+    :param prefetch: fetch the next page in the background while the current one is being consumed
+    """
+    # Checked here rather than in the generator, so that it fails on the call, not on the first next()
+    if page_size < 1:
+        raise ValueError(f'page_size must be at least 1, got {page_size}')
+    return _iter_pages(fetch_page, page_size, prefetch)
+
+
+def _iter_pages(fetch_page: T.Callable[[int], T.Tuple[T.List[T.Any], bool]], page_size: int,
+                prefetch: bool) -> T.Iterator[T.Any]:
+    offset = 0
+    if not prefetch:
+        while True:
+            items, has_more = fetch_page(offset)
+            yield from items
+            if not has_more:
+                return
+            offset += page_size
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_page = executor.submit(fetch_page, offset)
+        while True:
+            items, has_more = next_page.result()
+            if has_more:
+                offset += page_size
+                next_page = executor.submit(fetch_page, offset)
+            yield from items
+            if not has_more:
+                return
+
+
+def map_unordered(fn: T.Callable[..., T.Any], args: T.Iterable[T.Sequence[T.Any]],
+                  max_workers: int) -> T.Iterator[T.Any]:
+    """
+    Call fn(*a) for each a in args with max_workers threads and yield the results in the order they complete.
+    Unlike Executor.map, only max_workers * 2 calls are submitted at a time, so that results are not piling up in
+    memory while the caller is processing them. If the caller stops iterating or a call raises, the calls not started
+    yet are cancelled and the running ones are left to finish in the background instead of being waited for.
+    """
+    max_in_flight = max_workers * 2
+    pending = set()
+    finished = False
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        args_iter = iter(args)
+        while True:
+            for a in args_iter:
+                pending.add(executor.submit(fn, *a))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                finished = True
+                return
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=finished)
+
+
+def copy_exception(e: BaseException) -> BaseException:
+    """
+    Shallow copy of e without its traceback, so that it can be raised in another thread.
+    """
+    # Without calling __init__, whose parameters may differ from args
+    new = type(e).__new__(type(e), *e.args)
+    new.args = e.args
+    new.__dict__.update(e.__dict__)
+    return new
+
+
+def endpoint_template(path: str) -> str:
+    """
+    Path without the query and with IDs replaced, e.g. /courses/1/participants?role=all -> /courses/{id}/participants
+    """
+    segments = path.split('?', 1)[0].split('/')
+    for i in range(1, len(segments)):
+        if segments[i - 1] in ID_COLLECTIONS:
+            segments[i] = '{id}'
+    return '/'.join(segments)
+
+
 def normalise_url(url: str) -> str:
     norm_url = url
     if not norm_url.startswith('http'):
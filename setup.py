@@ -13,15 +13,18 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/kspar/easy-py",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=['bench', 'bench.*', 'tests', 'tests.*']),
     package_data={
         'easy': ['auth-templates/*']
     },
     install_requires=[
-        'flask~=2.0.3',
-        'requests>=2.28.2,<2.32.4',
-        'werkzeug~=2.0.0'
+        'requests>=2.28.2,<2.32.4'
     ],
+    extras_require={
+        'async': ['aiohttp>=3.8'],
+        'fast': ['orjson>=3.6'],
+        'numpy': ['numpy>=1.17']
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,24 @@
+import logging
+import time
+
+import pytest
+
+import easy
+from bench.fake_server import FakeEasyServer, FakeServerConfig, make_token
+
+
+@pytest.fixture
+def server():
+    with FakeEasyServer(FakeServerConfig(courses=2, exercises=3, participants=5, submissions=3)) as server:
+        yield server
+
+
+def new_client(server: FakeEasyServer, **kwargs) -> easy.Ez:
+    """
+    Client of the fake server with a valid refresh token and no access token.
+    """
+    retrieve_token, persist_token = easy.util.memory_token_storage()
+    persist_token(easy.TokenType.REFRESH, {'token_type': easy.TokenType.REFRESH, 'token': make_token('student1'),
+                                           'expires_at': int(time.time()) + 3600})
+    kwargs.setdefault('logging_level', logging.WARNING)
+    return easy.Ez(server.url, server.url, 'test', retrieve_token, persist_token, **kwargs)
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+import requests
+
+from easy.auth_server import AuthCallbackServer
+
+
+@pytest.fixture
+def delivered():
+    return []
+
+
+@pytest.fixture
+def auth_server(delivered):
+    server = AuthCallbackServer('127.0.0.1', 'https://idp.example.com', 'easy-cli', 'Logged in <b>', 'Failed',
+                                delivered.append)
+    yield server
+    server.shutdown()
+    if server.thread.ident is not None:
+        server.thread.join(5)
+
+
+def test_serves_login_page_and_keycloak_conf(auth_server):
+    # Bound to a free port right away
+    assert auth_server.port != 0
+    assert not auth_server.ready.is_set()
+    auth_server.start(5)
+    assert auth_server.ready.is_set()
+    assert auth_server.is_active()
+
+    resp = requests.get(auth_server.login_url, timeout=5)
+    assert resp.status_code == 200
+    assert resp.headers['Content-Type'] == 'text/html; charset=utf-8'
+    assert f'http://127.0.0.1:{auth_server.port}/deliver-tokens' in resp.text
+    assert 'https://idp.example.com/auth/js/keycloak.js' in resp.text
+    # Messages are escaped in the HTML page
+    assert 'Logged in &lt;b&gt;' in resp.text
+
+    conf = requests.get(f'http://127.0.0.1:{auth_server.port}/keycloak.json', timeout=5).json()
+    assert conf['auth-server-url'] == 'https://idp.example.com/auth'
+    assert conf['resource'] == 'easy-cli'
+
+    assert requests.get(f'http://127.0.0.1:{auth_server.port}/other', timeout=5).status_code == 404
+
+
+def test_shuts_down_after_tokens_are_delivered(auth_server, delivered):
+    auth_server.start(5)
+    tokens = {'access_token': 'a', 'refresh_token': 'r'}
+
+    resp = requests.post(f'http://127.0.0.1:{auth_server.port}/deliver-tokens', data=json.dumps(tokens),
+                         headers={'Content-Type': 'application/json'}, timeout=5)
+
+    assert resp.status_code == 200
+    assert delivered == [tokens]
+    assert not auth_server.is_active()
+    auth_server.thread.join(5)
+    assert not auth_server.thread.is_alive()
+    assert auth_server.httpd.socket.fileno() == -1
+
+
+def test_invalid_delivery_shuts_down_too(auth_server, delivered):
+    auth_server.start(5)
+
+    resp = requests.post(f'http://127.0.0.1:{auth_server.port}/deliver-tokens', data='not json',
+                         headers={'Content-Type': 'application/json'}, timeout=5)
+
+    assert resp.status_code == 400
+    assert delivered == []
+    auth_server.thread.join(5)
+    assert not auth_server.thread.is_alive()
+
+
+def test_shutdown_before_start_closes_the_socket(auth_server):
+    auth_server.shutdown()
+
+    assert auth_server.httpd.socket.fileno() == -1
+    assert not auth_server.is_active()
@@ -0,0 +1,89 @@
+import re
+import threading
+import time
+
+import pytest
+
+import easy
+from easy import util
+from tests.conftest import new_client
+
+TEACHER_SUBMISSIONS = re.compile(r'/v2/teacher/courses/[^/]+/exercises/([^/]+)/submissions/all/students/([^/]+)')
+
+
+@pytest.fixture
+def client(server):
+    client = new_client(server)
+    client.util.get_token_header()
+    yield client
+    client.shutdown()
+
+
+def test_map_unordered_bounds_calls_in_flight():
+    started = []
+    lock = threading.Lock()
+
+    def call(i):
+        with lock:
+            started.append(i)
+        time.sleep(0.01)
+        return i * 2
+
+    assert sorted(util.map_unordered(call, [(i,) for i in range(20)], 2)) == [i * 2 for i in range(20)]
+
+    started.clear()
+    results = util.map_unordered(call, [(i,) for i in range(100)], 2)
+    next(results)
+    results.close()
+    # Only the max_workers * 2 calls submitted before stopping have run, the rest were never started
+    assert len(started) <= 4
+
+
+def test_bulk_only_gets_the_given_pairs(server, client):
+    requests_before = server.request_count
+    items = list(client.teacher.get_course_submissions_bulk('1', student_ids=['student1', 'student3'],
+                                                             course_exercise_ids=['2']))
+
+    assert sorted((i.student_id, i.course_exercise_id) for i in items) == [('student1', '2'), ('student3', '2')]
+    assert all(i.error is None and i.submissions.count == 3 for i in items)
+    # Participants and exercises are not requested when given
+    assert server.request_count - requests_before == 2
+
+
+def test_bulk_records_failed_pairs(server, client):
+    def submissions(request):
+        course_exercise_id, student_id = TEACHER_SUBMISSIONS.fullmatch(request.path).groups()
+        if (student_id, course_exercise_id) == ('student2', '1'):
+            return 403, b'{"code": "FORBIDDEN"}'
+        return 200, b'{"count": 0, "submissions": []}'
+
+    server.routes.insert(0, ('GET', TEACHER_SUBMISSIONS, submissions))
+    progress = []
+    items = list(client.teacher.get_course_submissions_bulk('1', progress=lambda *p: progress.append(p)))
+
+    # 5 students and 3 exercises
+    assert len(items) == 15
+    assert [(i.student_id, i.course_exercise_id) for i in items if i.error is not None] == [('student2', '1')]
+    assert isinstance(next(i for i in items if i.error is not None).error, easy.ErrorResponseException)
+    assert progress == [(i, 15) for i in range(1, 16)]
+
+
+def test_bulk_error_while_iterating_cancels_pending_calls(server, client):
+    requested = []
+
+    def slow_submissions(request):
+        requested.append(request.path)
+        time.sleep(0.05)
+        return 200, b'{"count": 0, "submissions": []}'
+
+    server.routes.insert(0, ('GET', TEACHER_SUBMISSIONS, slow_submissions))
+
+    def failing_progress(done, total):
+        raise RuntimeError('stop')
+
+    with pytest.raises(RuntimeError):
+        list(client.teacher.get_course_submissions_bulk('1', max_workers=1, progress=failing_progress))
+    # Let the calls already running finish
+    time.sleep(0.3)
+    # Only the max_workers * 2 calls submitted before the error have been made, not all 15
+    assert len(requested) <= 2
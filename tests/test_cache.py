@@ -0,0 +1,104 @@
+import os
+import re
+import time
+
+import pytest
+import requests
+
+from easy import cache
+from tests.conftest import new_client
+
+
+def cached_response() -> cache.CachedResponse:
+    return cache.CachedResponse(200, {'ETag': '"1"'}, b'{}', 'http://localhost/v2/test', time.time(), 60)
+
+
+def test_disk_cache_round_trip(tmp_path):
+    backend = cache.DiskCacheBackend(str(tmp_path))
+    backend.set('key', cached_response())
+
+    value = backend.get('key')
+    assert value.content == b'{}'
+    assert value.headers == {'ETag': '"1"'}
+    assert backend.get('other') is None
+
+
+def test_disk_cache_evicts_in_batches(tmp_path, monkeypatch):
+    backend = cache.DiskCacheBackend(str(tmp_path), max_entries=100)
+    scans = []
+    evict = backend._evict
+    monkeypatch.setattr(backend, '_evict', lambda: scans.append(1) or evict())
+
+    for i in range(1000):
+        backend.set(str(i), cached_response())
+    # Overwriting an entry doesn't count as a new one
+    for _ in range(100):
+        backend.set('999', cached_response())
+
+    assert len(os.listdir(tmp_path)) <= 100
+    # The directory is scanned about once per 10 new entries, not on every write
+    assert len(scans) <= 100
+    assert backend.get('999') is not None
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        cache.CacheBackend()
+
+
+def test_long_polls_and_submission_status_are_not_cached(server):
+    def slow_await(request):
+        time.sleep(1)
+        return 204, b''
+
+    server.routes.insert(0, ('GET', re.compile(r'/v2/student/courses/[^/]+/exercises/slow/submissions/latest/await'),
+                             slow_await))
+    client = new_client(server, response_cache=cache.ResponseCache(default_ttl_sec=60))
+    client.common.get_course_basic_info('1')
+
+    requests_before = server.request_count
+    start = time.monotonic()
+    with pytest.raises(requests.ReadTimeout):
+        client.student.await_latest_exercise_submission_details('c1', 'slow', timeout_sec=0.2)
+    # The timeout is not retried
+    assert time.monotonic() - start < 1
+    assert server.request_count == requests_before + 1
+
+    client.student.get_latest_exercise_submission_details('c1', 'e1')
+    client.student.get_latest_exercise_submission_details('c1', 'e1')
+    assert server.request_count == requests_before + 3
+    client.common.get_course_basic_info('1')
+    assert server.request_count == requests_before + 3
+    time.sleep(1)
+    client.shutdown()
+
+
+def test_not_modified_without_cached_response_is_requested_again(server):
+    validators = []
+
+    def basic_info(request):
+        validators.append(request.headers.get('If-None-Match'))
+        # Not modified on the first request, as if the cache had validators the client no longer has
+        if len(validators) == 1:
+            return 304, b''
+        return 200, b'{"title": "Course"}', {'ETag': '"1"'}
+
+    server.routes.insert(0, ('GET', re.compile(r'/v2/courses/[^/]+/basic'), basic_info))
+    client = new_client(server, response_cache=cache.ResponseCache())
+
+    assert client.common.get_course_basic_info('1').title == 'Course'
+    assert validators == [None, None]
+    client.shutdown()
+
+
+def test_disk_cache_clear_tolerates_removed_entries(tmp_path, monkeypatch):
+    backend = cache.DiskCacheBackend(str(tmp_path))
+    backend.set('key', cached_response())
+    list_entries = backend._list_entries
+    # Another process removes an entry after it has been listed
+    monkeypatch.setattr(backend, '_list_entries', lambda: list_entries() + ['gone.json'])
+
+    backend.clear()
+
+    assert os.listdir(tmp_path) == []
+    assert backend.get('key') is None
@@ -0,0 +1,74 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import easy
+from tests.conftest import new_client
+
+BASIC_INFO = re.compile(r'/v2/courses/[^/]+/basic')
+THREADS = 5
+
+
+def get_concurrently(client, server, status, body):
+    requests_seen = []
+
+    def slow_basic_info(request):
+        requests_seen.append(request.path)
+        # Long enough for all threads to find this request in flight
+        time.sleep(0.3)
+        return status, body
+
+    server.routes.insert(0, ('GET', BASIC_INFO, slow_basic_info))
+    barrier = threading.Barrier(THREADS)
+    requests_before = server.request_count
+
+    def get():
+        barrier.wait()
+        try:
+            return client.common.get_course_basic_info('1')
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        results = list(executor.map(lambda _: get(), range(THREADS)))
+    assert server.request_count - requests_before == len(requests_seen)
+    return requests_seen, results
+
+
+@pytest.fixture
+def client(server):
+    client = new_client(server, coalesce_requests=True, retry_policy=None)
+    # Get the access token first, so that the threads only send the GET
+    client.util.get_token_header()
+    yield client
+    client.shutdown()
+
+
+def test_identical_gets_share_one_request(server, client):
+    requests_seen, results = get_concurrently(client, server, 200, b'{"title": "Course"}')
+
+    assert requests_seen == ['/v2/courses/1/basic']
+    assert all(r is results[0] for r in results)
+    assert results[0].title == 'Course'
+    assert client.util.coalesced_count == THREADS - 1
+
+    # Once it has completed, the request is sent again
+    client.common.get_course_basic_info('1')
+    assert len(requests_seen) == 2
+
+
+def test_error_reaches_every_waiter(server, client):
+    requests_seen, results = get_concurrently(client, server, 500, b'{"code": "ERROR"}')
+
+    assert len(requests_seen) == 1
+    assert all(isinstance(r, easy.ErrorResponseException) for r in results)
+    # The owner raises the original, each waiter its own copy of it, so that they don't share a traceback
+    originals = [r for r in results if r.__cause__ is None]
+    assert len(originals) == 1
+    waiters = [r for r in results if r.__cause__ is not None]
+    assert all(r.__cause__ is originals[0] for r in waiters)
+    assert len({id(r) for r in waiters}) == THREADS - 1
+    assert all(r.resp.status_code == 500 for r in results)
@@ -0,0 +1,34 @@
+import pytest
+
+from easy import codec
+
+
+def test_json_codec_is_abstract():
+    with pytest.raises(TypeError):
+        codec.JsonCodec()
+
+    class NoLoads(codec.JsonCodec):
+        name = 'none'
+
+    with pytest.raises(TypeError):
+        NoLoads()
+
+
+def test_set_codec():
+    class UpperCodec(codec.StdlibJsonCodec):
+        name = 'upper'
+
+        def loads(self, content):
+            return super().loads(content).upper()
+
+    try:
+        codec.set_codec(UpperCodec())
+        assert codec.loads(b'"a"') == 'A'
+    finally:
+        codec.set_codec(None)
+    assert codec.loads(b'"a"') == 'a'
+
+
+def test_declared_encoding_is_decoded():
+    assert codec.loads('"ä"'.encode('latin-1'), 'ISO-8859-1') == 'ä'
+    assert codec.loads('"ä"'.encode('utf-8'), 'UTF-8') == 'ä'
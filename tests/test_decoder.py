@@ -0,0 +1,101 @@
+import weakref
+
+import pytest
+from requests.structures import CaseInsensitiveDict
+
+from easy import data, decoder
+
+META = data.ResponseMeta(200, CaseInsensitiveDict(), 'http://localhost/v2/test')
+
+
+def submission_json(**overrides) -> dict:
+    obj = {'id': '1', 'number': 1, 'solution': 'print(1)', 'submission_time': '2024-09-01T12:00:00.000Z',
+           'autograde_status': 'COMPLETED', 'submission_status': 'COMPLETED',
+           'grade': {'grade': 90, 'is_autograde': True, 'is_graded_directly': True},
+           'auto_assessment': {'grade': 90, 'feedback': 'Good'}}
+    obj.update(overrides)
+    return obj
+
+
+def test_nested_dataclasses_and_enums():
+    submission = decoder.decode(data.SubmissionResp, submission_json(), 200, META)
+
+    assert submission.resp_code == 200
+    assert submission.response is META
+    assert submission.autograde_status is data.AutogradeStatus.COMPLETED
+    assert submission.submission_status is data.ExerciseStatus.COMPLETED
+    assert isinstance(submission.grade, data.GradeResp)
+    assert submission.grade.grade == 90
+    # Nested Resp DTOs get the response of the outer one
+    assert submission.grade.response is META
+    assert submission.auto_assessment.feedback == 'Good'
+
+
+def test_list_of_dataclasses():
+    resp = decoder.decode(data.StudentAllSubmissionsResp,
+                          {'submissions': [submission_json(id='1'), submission_json(id='2')]}, 200, META)
+
+    assert [s.id for s in resp.submissions] == ['1', '2']
+    assert all(isinstance(s, data.SubmissionResp) for s in resp.submissions)
+
+
+def test_optional_fields():
+    item = decoder.decode(data.CourseSubmissionsBulkItem, {'student_id': 's', 'course_exercise_id': 'e',
+                                                           'submissions': {'count': 0, 'submissions': []},
+                                                           'error': None}, 200, META)
+
+    assert isinstance(item.submissions, data.TeacherCourseExerciseSubmissionsStudentResp)
+    assert item.submissions.count == 0
+    assert item.error is None
+
+
+def test_null_and_missing_fields_are_none():
+    submission = decoder.decode(data.SubmissionResp, submission_json(grade=None), 200, META)
+    assert submission.grade is None
+
+    obj = submission_json()
+    del obj['auto_assessment']
+    assert decoder.decode(data.SubmissionResp, obj, 200, META).auto_assessment is None
+
+
+def test_unknown_fields_are_ignored_and_counted():
+    before = decoder.schema_drift_counts().get('GradeResp', 0)
+
+    grade = decoder.decode(data.GradeResp, {'grade': 1, 'is_autograde': False, 'is_graded_directly': True,
+                                            'new_field': 'x'}, 200, META)
+
+    assert grade.grade == 1
+    assert not hasattr(grade, 'new_field')
+    assert decoder.schema_drift_counts()['GradeResp'] == before + 1
+
+
+def test_unknown_enum_value_is_kept_and_counted():
+    before = decoder.schema_drift_counts().get('AutogradeStatus', 0)
+
+    submission = decoder.decode(data.SubmissionResp, submission_json(autograde_status='QUEUED'), 200, META)
+
+    assert submission.autograde_status == 'QUEUED'
+    assert decoder.schema_drift_counts()['AutogradeStatus'] == before + 1
+
+
+def test_solution_file_type_values():
+    details = decoder.decode(data.ExerciseDetailsResp, {'solution_file_type': 'TEXT_UPLOAD'}, 200, META)
+    assert details.solution_file_type is data.SolutionFileType.TEXT_UPLOAD
+
+    details = decoder.decode(data.ExerciseDetailsResp, {'solution_file_type': 'TEXT_EDITOR'}, 200, META)
+    assert details.solution_file_type is data.SolutionFileType.TEXT_EDITOR
+
+
+def test_plans_are_cached():
+    assert decoder.get_plan(data.SubmissionResp) is decoder.get_plan(data.SubmissionResp)
+
+
+def test_dtos_are_slotted():
+    grade = decoder.decode(data.GradeResp, {'grade': 1, 'is_autograde': False, 'is_graded_directly': True}, 200,
+                           META)
+
+    assert not hasattr(grade, '__dict__')
+    with pytest.raises(AttributeError):
+        grade.extra = 1
+    with pytest.raises(TypeError):
+        weakref.ref(grade)
@@ -0,0 +1,71 @@
+import io
+
+import pytest
+
+from easy import data, gradebook
+
+GROUPS = {'a': data.CourseGroup('a', 'Group A'), 'b': data.CourseGroup('b', 'Group B')}
+STUDENT_GROUPS = [['a'], ['a', 'b'], ['b'], []]
+# Best grades by student, None if there is no submission
+GRADES = [[100, 40, None], [70, 100, 0], [None, None, 55.5], [30, 90, 100]]
+THRESHOLDS = [50, 90, None]
+
+
+def submission(grade, created_at) -> data.TeacherCourseExerciseSubmissionsStudent:
+    return data.TeacherCourseExerciseSubmissionsStudent('1', '', created_at, grade, None, None, None)
+
+
+def build(use_numpy: bool) -> gradebook.Gradebook:
+    students = [data.CourseParticipantsStudent(f's{i}', f's{i}@example.com', 'Given', f'Family {i}', '',
+                                               [GROUPS[g] for g in groups], None)
+                for i, groups in enumerate(STUDENT_GROUPS)]
+    exercises = [data.TeacherCourseExercises(f'e{j}', str(j), f'Exercise {j}', None, f'Exercise {j}', threshold, True,
+                                             None, None, None, data.GraderType.AUTO, j, 0, 0, 0, 0)
+                 for j, threshold in enumerate(THRESHOLDS)]
+    book = gradebook.Gradebook(students, exercises, use_numpy)
+
+    items = []
+    for i, row in enumerate(GRADES):
+        for j, grade in enumerate(row):
+            if grade is not None:
+                # A worse later submission, so that BEST and LATEST differ
+                submissions = [submission(grade, '2024-09-01'), submission(grade / 2, '2024-09-02')]
+                resp = data.TeacherCourseExerciseSubmissionsStudentResp(200, None, submissions, len(submissions))
+                items.append(data.CourseSubmissionsBulkItem(f's{i}', f'e{j}', resp, None))
+    items.append(data.CourseSubmissionsBulkItem('s2', 'e0', None, RuntimeError('failed')))
+    book.add_submissions(items)
+    return book
+
+
+def statistics(book: gradebook.Gradebook) -> dict:
+    csv_file = io.StringIO()
+    book.to_csv(csv_file)
+    return {
+        'grades': [[book.get_grade(s.id, e.course_exercise_id) for e in book.exercises] for s in book.students],
+        'exercise_completion_rates': book.exercise_completion_rates(),
+        'student_completion_rates': book.student_completion_rates(),
+        'group_averages': book.group_averages(),
+        'histogram': book.histogram(),
+        'exercise_histogram': book.histogram('e1', bins=4),
+        'csv': csv_file.getvalue(),
+    }
+
+
+def test_array_gradebook_statistics():
+    book = build(use_numpy=False)
+
+    assert book.get_grade('s1', 'e2') == 0
+    assert book.get_grade('s2', 'e0') is None
+    assert [e[:2] for e in book.errors] == [('s2', 'e0')]
+    assert book.exercise_completion_rates() == {'e0': 0.5, 'e1': 0.5, 'e2': None}
+    assert book.student_completion_rates() == {'s0': 0.5, 's1': 1.0, 's2': 0.0, 's3': 0.5}
+    assert book.group_averages() == {'a': {'e0': 85.0, 'e1': 70.0, 'e2': 0.0},
+                                     'b': {'e0': 70.0, 'e1': 100.0, 'e2': 27.75}}
+    assert book.histogram('e1', bins=4) == ([0, 1, 0, 2], [0, 25, 50, 75, 100])
+    assert statistics(book)['csv'].splitlines()[1] == 's0,s0@example.com,Given,Family 0,Group A,100,40,'
+
+
+def test_numpy_and_array_gradebooks_are_equal():
+    pytest.importorskip('numpy')
+
+    assert statistics(build(use_numpy=True)) == statistics(build(use_numpy=False))
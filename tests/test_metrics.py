@@ -0,0 +1,77 @@
+import re
+
+from easy import metrics, retry
+from tests.conftest import new_client
+
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram((1, 10))
+    for value in [0.5, 1, 5, 10, 11]:
+        histogram.observe(value)
+
+    # Bucket bounds are inclusive, like Prometheus' le
+    assert histogram.counts == [2, 2, 1]
+    assert histogram.cumulative_counts() == [('1', 2), ('10', 4), ('+Inf', 5)]
+    assert (histogram.sum, histogram.count) == (27.5, 5)
+
+
+def test_requests_are_measured_per_endpoint(server):
+    responses = iter([(503, b'', {'Retry-After': '0'}), (200, b'{"title": "Course"}')])
+    server.routes.insert(0, ('GET', re.compile(r'/v2/courses/7/basic'), lambda request: next(responses)))
+    request_metrics = metrics.Metrics()
+    before, after = [], []
+    request_metrics.add_before_request_hook(before.append)
+    request_metrics.add_after_request_hook(after.append)
+    # A failing hook doesn't fail the request
+    request_metrics.add_after_request_hook(lambda event: 1 / 0)
+    client = new_client(server, metrics=request_metrics, retry_policy=retry.RetryPolicy())
+
+    client.common.get_course_basic_info('7')
+    client.common.get_course_basic_info('8')
+    client.shutdown()
+
+    assert [(e.method, e.path, e.endpoint, e.attempt) for e in before] == [
+        ('GET', '/courses/7/basic', '/courses/{id}/basic', 0),
+        ('GET', '/courses/7/basic', '/courses/{id}/basic', 1),
+        ('GET', '/courses/8/basic', '/courses/{id}/basic', 0),
+    ]
+    assert [e.request for e in after] == before
+    assert [(e.status_code, e.error) for e in after] == [(503, None), (200, None), (200, None)]
+    assert after[1].size_bytes == len(b'{"title": "Course"}')
+    assert all(e.network_sec > 0 for e in after)
+
+    stats = request_metrics.snapshot()['endpoints']['GET /courses/{id}/basic']
+    assert stats['requests'] == 3
+    assert stats['status_codes'] == {503: 1, 200: 2}
+    assert (stats['errors'], stats['retries']) == (0, 1)
+    # Only the successful responses are decoded
+    assert stats['decode_sec']['count'] == 2
+    assert request_metrics.snapshot()['token_refreshes'] == 1
+
+
+def test_prometheus_format():
+    request_metrics = metrics.Metrics()
+    event = metrics.RequestEvent('GET', '/courses/1/basic', '/courses/{id}/basic', 0)
+    request_metrics.after_request(metrics.ResponseEvent(event, 200, 0.02, 300, None))
+    request_metrics.after_request(metrics.ResponseEvent(metrics.RequestEvent('GET', '/a"b', '/a"b', 1), None, 2,
+                                                        0, OSError()))
+    request_metrics.record_token_refresh(False)
+
+    lines = request_metrics.to_prometheus().splitlines()
+
+    labels = 'method="GET",endpoint="/courses/{id}/basic"'
+    assert '# HELP easy_responses_total Responses by status code.' in lines
+    assert '# TYPE easy_responses_total counter' in lines
+    assert f'easy_responses_total{{{labels},status="200"}} 1' in lines
+    assert f'easy_request_errors_total{{{labels}}} 0' in lines
+    assert 'easy_request_errors_total{method="GET",endpoint="/a\\"b"} 1' in lines
+    assert 'easy_request_retries_total{method="GET",endpoint="/a\\"b"} 1' in lines
+    assert '# TYPE easy_request_network_seconds histogram' in lines
+    assert f'easy_request_network_seconds_bucket{{{labels},le="0.01"}} 0' in lines
+    assert f'easy_request_network_seconds_bucket{{{labels},le="0.025"}} 1' in lines
+    assert f'easy_request_network_seconds_bucket{{{labels},le="+Inf"}} 1' in lines
+    assert f'easy_request_network_seconds_sum{{{labels}}} 0.02' in lines
+    assert f'easy_request_network_seconds_count{{{labels}}} 1' in lines
+    assert f'easy_response_size_bytes_bucket{{{labels},le="1024"}} 1' in lines
+    assert 'easy_token_refreshes_total{result="failure"} 1' in lines
+    assert request_metrics.to_prometheus(prefix='app').startswith('# HELP app_responses_total ')
@@ -0,0 +1,68 @@
+import json
+import re
+
+import pytest
+
+from easy import mirror
+from tests.conftest import new_client
+
+TEACHER_SUBMISSIONS = re.compile(r'/v2/teacher/courses/[^/]+/exercises/([^/]+)/submissions/all/students/([^/]+)')
+
+
+class Submissions:
+    """
+    Submissions of each (student, exercise) pair with unique IDs, newest first like the server lists them.
+    """
+    def __init__(self):
+        self.by_pair = {}
+        self.next_id = 0
+
+    def add(self, student_id, course_exercise_id, created_at):
+        self.next_id += 1
+        self.by_pair.setdefault((student_id, course_exercise_id), []).insert(0, {
+            'id': str(self.next_id), 'solution': 'print(1)', 'created_at': created_at, 'grade_auto': 100,
+            'feedback_auto': None, 'grade_teacher': None, 'feedback_teacher': None})
+
+    def handle(self, request):
+        course_exercise_id, student_id = TEACHER_SUBMISSIONS.fullmatch(request.path).groups()
+        submissions = self.by_pair.get((student_id, course_exercise_id), [])
+        limit = int(request.query.get('limit', len(submissions)))
+        return 200, json.dumps({'count': len(submissions), 'submissions': submissions[:limit]}).encode()
+
+
+@pytest.fixture
+def submissions(server):
+    submissions = Submissions()
+    for student in range(5):
+        for exercise in range(3):
+            submissions.add(f'student{student}', str(exercise), '2024-09-01T12:00:00Z')
+    server.routes.insert(0, ('GET', TEACHER_SUBMISSIONS, submissions.handle))
+    return submissions
+
+
+def test_sync_downloads_only_changes(server, submissions, tmp_path):
+    client = new_client(server)
+    with mirror.CourseMirror(client.teacher, str(tmp_path / 'mirror.db')) as course_mirror:
+        result = course_mirror.sync('1')
+        assert (result.pairs, result.new_submissions, result.errors) == (15, 15, [])
+
+        result = course_mirror.sync('1')
+        assert (result.unchanged_pairs, result.new_submissions, result.requests) == (15, 0, 2 + 15)
+
+        submissions.add('student1', '2', '2024-09-02T12:00:00Z')
+        result = course_mirror.sync('1')
+        assert (result.unchanged_pairs, result.new_submissions) == (14, 1)
+        assert course_mirror.submission_counts('1')[('student1', '2')] == 2
+
+        # Same count, but the newest submission is a different one
+        submissions.by_pair[('student2', '0')].pop(0)
+        submissions.add('student2', '0', '2024-09-03T12:00:00Z')
+        result = course_mirror.sync('1')
+        assert (result.unchanged_pairs, result.new_submissions) == (14, 1)
+        assert course_mirror.submissions('1', 'student2', '0')[0].created_at == '2024-09-03T12:00:00Z'
+
+        # The replaced submission is gone and the pair is unchanged from now on
+        result = course_mirror.sync('1')
+        assert (result.unchanged_pairs, result.new_submissions, result.requests) == (15, 0, 2 + 15)
+        assert course_mirror.submission_counts('1') == {pair: len(s) for pair, s in submissions.by_pair.items()}
+    client.shutdown()
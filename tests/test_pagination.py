@@ -0,0 +1,67 @@
+import itertools
+
+import pytest
+
+from tests.conftest import new_client
+
+
+@pytest.fixture
+def client(server):
+    client = new_client(server)
+    # Get the access token first, so that only page requests are counted
+    client.util.get_token_header()
+    yield client
+    client.shutdown()
+
+
+def count_requests(server, iterate):
+    before = server.request_count
+    items = iterate()
+    return [item.id for item in items], server.request_count - before
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_students_across_page_boundaries(server, client, prefetch):
+    # 5 students on pages of 2, 2 and 1, the short page is the last one
+    ids, requests = count_requests(server, lambda: list(client.teacher.iter_course_students('1', 2, prefetch)))
+    assert ids == [f'student{i}' for i in range(5)]
+    assert requests == 3
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_students_exact_multiple_of_page_size(server, client, prefetch):
+    # A full last page can't be told from a middle one, so an empty page ends the iteration
+    ids, requests = count_requests(server, lambda: list(client.teacher.iter_course_students('1', 5, prefetch)))
+    assert ids == [f'student{i}' for i in range(5)]
+    assert requests == 2
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_submissions_stop_at_count(server, client, prefetch):
+    iterate = client.teacher.iter_course_exercise_submissions_student
+
+    ids, requests = count_requests(server, lambda: list(iterate('1', '1', 'student1', 2, prefetch)))
+    assert (ids, requests) == (['0', '1', '2'], 2)
+
+    # The count tells that the full page is the last one
+    ids, requests = count_requests(server, lambda: list(iterate('1', '1', 'student1', 3, prefetch)))
+    assert (ids, requests) == (['0', '1', '2'], 1)
+
+
+def test_stopping_early_requests_no_more_pages(server, client):
+    for prefetch, expected_requests in [(False, 2), (True, 3)]:
+        before = server.request_count
+        students = client.teacher.iter_course_students('1', 1, prefetch)
+        assert [s.id for s in itertools.islice(students, 2)] == ['student0', 'student1']
+        # Closing waits for a prefetch in flight
+        students.close()
+        # Only the page after the last consumed one has been prefetched
+        assert server.request_count - before == expected_requests
+
+
+@pytest.mark.parametrize('page_size', [0, -1])
+def test_page_size_must_be_positive(client, page_size):
+    with pytest.raises(ValueError):
+        client.teacher.iter_course_students('1', page_size)
+    with pytest.raises(ValueError):
+        client.teacher.iter_course_exercise_submissions_student('1', '1', 'student1', page_size)
@@ -0,0 +1,72 @@
+import os
+import re
+import time
+
+import pytest
+
+import easy
+from bench.fake_server import make_token
+from easy import pool
+
+
+@pytest.mark.parametrize('identity, name', [
+    ('student1', 'student1'), ('mari.maasikas@example.com', 'mari.maasikas@example.com'), ('a/b', 'a%2Fb'),
+    ('..\\..\\etc', '..%5C..%5Cetc'), ('/etc/passwd', '%2Fetc%2Fpasswd'), ('C:x', 'C%3Ax'), ('../x', '..%2Fx')])
+def test_identity_file_names_stay_in_directory(identity, name):
+    assert pool._identity_to_file_name(identity) == name
+
+
+@pytest.mark.parametrize('identity', ['', '.', '..'])
+def test_invalid_identities_are_rejected(identity, tmp_path):
+    with pytest.raises(ValueError):
+        pool.file_token_storage(str(tmp_path))(identity)
+
+
+def test_file_token_storage(tmp_path):
+    retrieve_token, persist_token = pool.file_token_storage(str(tmp_path / 'tokens'))('../outside')
+    persist_token(easy.TokenType.REFRESH, {'token': 'x'})
+
+    assert retrieve_token(easy.TokenType.REFRESH) == {'token': 'x'}
+    assert os.listdir(tmp_path) == ['tokens']
+    assert os.listdir(tmp_path / 'tokens') == ['..%2Foutside']
+
+
+def test_memory_tokens_are_bounded(server):
+    with pool.ClientPool(server.url, server.url, 'test', max_clients=2, max_memory_token_identities=3,
+                         background_token_refresh=False) as client_pool:
+        for i in range(10):
+            client_pool.get(f'student{i}').util.persist_token(easy.TokenType.REFRESH, {'token': str(i)})
+
+        # The newest identities are kept, those with a client among them
+        assert list(client_pool._memory_tokens) == ['student7', 'student8', 'student9']
+        assert client_pool.get('student9').util.retrieve_token(easy.TokenType.REFRESH) == {'token': '9'}
+        assert client_pool.get('student0').util.retrieve_token(easy.TokenType.REFRESH) is None
+
+
+def test_cookies_are_not_shared_between_identities(server):
+    cookies_by_user = []
+
+    def basic_info(request):
+        cookies_by_user.append((request.user, request.headers.get('Cookie')))
+        return 200, b'{"title": "Course"}', {'Set-Cookie': f'SESSION={request.user}-session; Path=/'}
+
+    server.routes.insert(0, ('GET', re.compile(r'/v2/courses/[^/]+/basic'), basic_info))
+    with pool.ClientPool(server.url, server.url, 'test', background_token_refresh=False) as client_pool:
+        clients = {}
+        for identity in ['alice', 'bob']:
+            clients[identity] = client_pool.get(identity)
+            clients[identity].util.persist_token(easy.TokenType.REFRESH, {
+                'token_type': easy.TokenType.REFRESH, 'token': make_token(identity),
+                'expires_at': int(time.time()) + 3600})
+
+        clients['alice'].common.get_course_basic_info('1')
+        clients['bob'].common.get_course_basic_info('1')
+        clients['alice'].common.get_course_basic_info('1')
+        clients['bob'].common.get_course_basic_info('1')
+
+        # Connections are still shared
+        assert clients['alice'].util.session.get_adapter(server.url) is \
+            clients['bob'].util.session.get_adapter(server.url)
+
+    assert cookies_by_user == [('alice', None), ('bob', None), ('alice', 'SESSION=alice-session'),
+                               ('bob', 'SESSION=bob-session')]
@@ -0,0 +1,131 @@
+import re
+import time
+
+import pytest
+import requests
+
+import easy
+from easy import retry
+from tests.conftest import new_client
+
+BASIC_INFO = re.compile(r'/v2/courses/[^/]+/basic')
+SUBMISSIONS = re.compile(r'/v2/student/courses/[^/]+/exercises/[^/]+/submissions')
+AWAIT = re.compile(r'/v2/student/courses/[^/]+/exercises/[^/]+/submissions/latest/await')
+
+
+class Responses:
+    """
+    Route handler returning the given responses in order and then the last one, recording the request times.
+    """
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.times = []
+
+    def __call__(self, request):
+        self.times.append(time.monotonic())
+        return self.responses[min(len(self.times), len(self.responses)) - 1]
+
+
+def test_retry_after_is_honoured(server):
+    responses = Responses((503, b'', {'Retry-After': '0.3'}), (200, b'{"title": "Course"}'))
+    server.routes.insert(0, ('GET', BASIC_INFO, responses))
+    # Without Retry-After, the backoff could be anything up to a minute
+    client = new_client(server, retry_policy=retry.RetryPolicy(backoff_base_sec=60, backoff_max_sec=60))
+
+    assert client.common.get_course_basic_info('1').title == 'Course'
+    assert len(responses.times) == 2
+    assert 0.3 <= responses.times[1] - responses.times[0] < 2
+    client.shutdown()
+
+
+def test_parse_retry_after():
+    assert retry.parse_retry_after('2') == 2
+    assert retry.parse_retry_after('-1') == 0
+    assert retry.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert retry.parse_retry_after('soon') is None
+    assert retry.parse_retry_after(None) is None
+
+
+def test_post_is_not_retried(server):
+    responses = Responses((503, b''))
+    server.routes.insert(0, ('POST', SUBMISSIONS, responses))
+    client = new_client(server, retry_policy=retry.RetryPolicy(backoff_base_sec=0.01))
+
+    with pytest.raises(easy.ErrorResponseException):
+        client.student.post_submission('1', '1', 'print(1)')
+    assert len(responses.times) == 1
+    client.shutdown()
+
+
+def test_circuit_opens_and_lets_one_probe_through(server):
+    responses = Responses((503, b''))
+    server.routes.insert(0, ('GET', BASIC_INFO, responses))
+    breaker = retry.CircuitBreaker(failure_threshold=2, reset_timeout_sec=0.3)
+    client = new_client(server, retry_policy=None, circuit_breaker=breaker)
+    host = client.util.api_host
+
+    for _ in range(2):
+        with pytest.raises(easy.ErrorResponseException):
+            client.common.get_course_basic_info('1')
+    assert breaker.is_open(host)
+    with pytest.raises(easy.CircuitOpenException):
+        client.common.get_course_basic_info('1')
+    assert len(responses.times) == 2
+
+    time.sleep(0.3)
+    # Half-open: one probe is let through and the others still fail fast
+    breaker.before_request(host)
+    with pytest.raises(easy.CircuitOpenException):
+        breaker.before_request(host)
+    # The probe fails, so the circuit stays open for another reset_timeout_sec
+    breaker.record_failure(host)
+    with pytest.raises(easy.CircuitOpenException):
+        client.common.get_course_basic_info('1')
+
+    time.sleep(0.3)
+    responses.responses = [(200, b'{"title": "Course"}')]
+    assert client.common.get_course_basic_info('1').title == 'Course'
+    assert not breaker.is_open(host)
+    assert len(responses.times) == 3
+    client.shutdown()
+
+
+def test_read_timeouts_are_not_retried(server):
+    def slow_basic_info(request):
+        time.sleep(0.5)
+        return 200, b'{"title": "Course"}'
+
+    server.routes.insert(0, ('GET', BASIC_INFO, slow_basic_info))
+    client = new_client(server, retry_policy=retry.RetryPolicy(backoff_base_sec=0.01))
+    client.util.get_token_header()
+    requests_before = server.request_count
+
+    with pytest.raises(requests.ReadTimeout):
+        client.util.simple_get_request('/courses/1/basic', easy.BasicCourseInfoResp, timeout=0.1)
+    assert server.request_count == requests_before + 1
+    time.sleep(0.5)
+    client.shutdown()
+
+
+def test_long_poll_timeout_closes_half_open_circuit(server):
+    server.routes.insert(0, ('GET', BASIC_INFO, Responses((503, b''))))
+
+    def slow_await(request):
+        time.sleep(0.5)
+        return 204, b''
+
+    server.routes.insert(0, ('GET', AWAIT, slow_await))
+    breaker = retry.CircuitBreaker(failure_threshold=1, reset_timeout_sec=0.2)
+    client = new_client(server, retry_policy=None, circuit_breaker=breaker)
+
+    with pytest.raises(easy.ErrorResponseException):
+        client.common.get_course_basic_info('1')
+    assert breaker.is_open(client.util.api_host)
+    time.sleep(0.2)
+
+    # The trial request times out as long-polls do, but the host has answered
+    with pytest.raises(requests.ReadTimeout):
+        client.student.await_latest_exercise_submission_details('1', '1', timeout_sec=0.1)
+    assert not breaker.is_open(client.util.api_host)
+    time.sleep(0.5)
+    client.shutdown()
@@ -0,0 +1,95 @@
+import re
+
+import pytest
+
+import easy
+from tests.conftest import new_client
+
+
+@pytest.fixture
+def client(server):
+    client = new_client(server)
+    client.util.get_token_header()
+    yield client
+    client.shutdown()
+
+
+@pytest.fixture
+def paths(server, monkeypatch):
+    """
+    Paths of the GET requests to the server.
+    """
+    paths = []
+    handle = server.handle
+
+    def recording_handle(method, path, headers=None, body=b''):
+        if method == 'GET':
+            paths.append(path)
+        return handle(method, path, headers, body)
+
+    monkeypatch.setattr(server, 'handle', recording_handle)
+    return paths
+
+
+def test_full_snapshot(client, paths):
+    snapshot = client.student.get_snapshot()
+
+    # 2 courses with 3 exercises each
+    assert [c.course.id for c in snapshot.courses] == ['0', '1']
+    for course in snapshot.courses:
+        assert course.error is None
+        assert [e.exercise.id for e in course.exercises] == ['0', '1', '2']
+        for exercise in course.exercises:
+            assert exercise.details.effective_title == 'Exercise'
+            assert len(exercise.activities.teacher_activities) == 3
+            assert (exercise.details_error, exercise.activities_error) == (None, None)
+    assert len(paths) == 1 + 2 + 2 * 3 * 2
+
+
+def test_depth_and_course_filter(client, paths):
+    snapshot = client.student.get_snapshot(depth=1)
+    assert [(c.course.id, c.exercises) for c in snapshot.courses] == [('0', None), ('1', None)]
+    assert paths == ['/v2/student/courses']
+
+    paths.clear()
+    snapshot = client.student.get_snapshot(depth=2, course_ids=['1'])
+    assert [c.course.id for c in snapshot.courses] == ['1']
+    assert all(e.details is None and e.activities is None for e in snapshot.courses[0].exercises)
+    assert paths == ['/v2/student/courses', '/v2/student/courses/1/exercises']
+
+    paths.clear()
+    snapshot = client.student.get_snapshot(activities=False, course_ids=['0'])
+    exercises = snapshot.courses[0].exercises
+    assert all(e.details is not None and e.activities is None for e in exercises)
+    assert not any(p.endswith('/activities') for p in paths)
+    assert len(paths) == 1 + 1 + 3
+
+    with pytest.raises(ValueError):
+        client.student.get_snapshot(depth=4)
+
+
+def test_errors_stay_in_their_branch(server, client):
+    server.routes.insert(0, ('GET', re.compile(r'/v2/student/courses/1/exercises'),
+                             lambda request: (500, b'{"code": "ERROR"}')))
+    server.routes.insert(0, ('GET', re.compile(r'/v2/student/courses/0/exercises/2'),
+                             lambda request: (403, b'{"code": "FORBIDDEN"}')))
+
+    snapshot = client.student.get_snapshot()
+
+    ok_course, failed_course = snapshot.courses
+    assert isinstance(failed_course.error, easy.ErrorResponseException)
+    assert failed_course.exercises is None
+    assert ok_course.error is None
+    by_id = {e.exercise.id: e for e in ok_course.exercises}
+    assert isinstance(by_id['2'].details_error, easy.ErrorResponseException)
+    assert by_id['2'].details is None
+    # Its activities are a separate branch
+    assert by_id['2'].activities is not None
+    assert all(by_id[i].details is not None for i in ['0', '1'])
+
+
+def test_failing_courses_request_raises(server, client):
+    server.routes.insert(0, ('GET', re.compile(r'/v2/student/courses'), lambda request: (403, b'{"code": "NO"}')))
+
+    with pytest.raises(easy.ErrorResponseException):
+        client.student.get_snapshot()
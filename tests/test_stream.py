@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from easy import stream
+
+ITEMS = [
+    4.5e3, 0, -12, 1.25, 3E-2, 10, True, False, None,
+    'plain', 'quote " backslash \\ slash / tab \t newline \n', 'ä € 😀', '\\"]}', '',
+    {'id': '1', 'grade': 90, 'feedback': 'Hea töö! 👍', 'nested': {'list': [1, [2, {}], '"]'], 'empty': []}},
+    [], [1.5, 'x'],
+]
+BODY = ('{"count": 16, "note": "submissions [{\\"", "submissions": '
+        + json.dumps(ITEMS[:4]).rstrip(']') + ', '
+        + json.dumps(ITEMS[4:], ensure_ascii=False).lstrip('[')
+        + ', "after": [1, 2], "submissions2": {"a": "b"}}').encode('utf-8')
+
+
+def decode(chunks, key='submissions', encoding='utf-8'):
+    item_decoder = stream.ArrayItemDecoder(key, encoding)
+    items = []
+    for chunk in chunks:
+        items.extend(item_decoder.feed(chunk))
+    items.extend(item_decoder.close())
+    return items
+
+
+def test_body_is_valid():
+    assert json.loads(BODY)['submissions'] == ITEMS
+    # Escaped characters as well as raw multibyte ones
+    assert b'\\u00e4' not in BODY and '😀'.encode() in BODY and b'\\\\' in BODY
+
+
+def test_every_split_point():
+    for i in range(len(BODY) + 1):
+        assert decode([BODY[:i], BODY[i:]]) == ITEMS, f'split at {i}: {BODY[:i][-10:]!r} | {BODY[i:][:10]!r}'
+
+
+def test_every_two_split_points_around_numbers():
+    # Numbers end at a chunk boundary in every possible way, e.g. 4 | .5e3 or 4.5 | e3
+    start = BODY.index(b'[4') + 1
+    end = BODY.index(b'10,') + 3
+    for i in range(start, end):
+        for j in range(i, end + 1):
+            assert decode([BODY[:i], BODY[i:j], BODY[j:]]) == ITEMS, f'split at {i} and {j}'
+
+
+def test_one_byte_chunks():
+    assert decode(BODY[i:i + 1] for i in range(len(BODY))) == ITEMS
+
+
+def test_escaped_characters():
+    body = json.dumps({'submissions': ['\\', '"', '\\"', 'ä', '😀', 'a\\\\"b']}).encode()
+    for i in range(len(body) + 1):
+        assert decode([body[:i], body[i:]]) == ['\\', '"', '\\"', 'ä', '😀', 'a\\\\"b']
+
+
+def test_declared_encoding():
+    body = json.dumps({'submissions': ['äö', {'a': 'õ'}]}, ensure_ascii=False).encode('latin-1')
+    for i in range(len(body) + 1):
+        assert decode([body[:i], body[i:]], encoding='ISO-8859-1') == ['äö', {'a': 'õ'}]
+
+
+def test_empty_and_missing_list():
+    assert decode([b'{"submissions": []}']) == []
+    assert decode([b'{"count": 0}']) == []
+
+
+def test_whitespace_around_separators():
+    body = b'{"submissions": [ 1 ,\n2\t,{"a": 1} ,[ ] ] }'
+    for i in range(len(body) + 1):
+        assert decode([body[:i], body[i:]]) == [1, 2, {'a': 1}, []]
+    assert decode([b'{"submissions": [ ]}']) == []
+
+
+@pytest.mark.parametrize('body', [b'{"submissions": [1, 2', b'{"submissions": [4.5x, 1]}', b'{"submissions": ["a',
+                                  b'{"submissions": [1.23456789xyz]}', b'{"submissions": [1 2]}',
+                                  b'{"submissions": [1,,2]}', b'{"submissions": [01]}', b'{"submissions": [,1]}',
+                                  b'{"submissions": [1,]}', b'{"submissions": [,]}', b'{"submissions": ["a" "b"]}',
+                                  b'{"submissions": [{} {}]}', b'{"submissions": [[1]2]}'])
+def test_invalid_body(body):
+    # Rejected like the non-streaming path does, however the body is split
+    with pytest.raises(ValueError):
+        json.loads(body)
+    for i in range(len(body) + 1):
+        with pytest.raises(ValueError):
+            decode([body[:i], body[i:]])
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import re
+import time
+
+import pytest
+
+import easy
+from bench.fake_server import make_token
+from tests.conftest import new_client
+
+NO_SUBMISSION = re.compile(r'/v2/student/courses/[^/]+/exercises/(none|empty)/submissions/latest(/await)?')
+
+
+def no_submission(request):
+    # The exercise 'none' has no submission, 'empty' returns one without an autograde status
+    return (204, b'') if '/exercises/none/' in request.path else (200, b'{}')
+
+
+@pytest.fixture
+def client(server):
+    server.routes.insert(0, ('GET', NO_SUBMISSION, no_submission))
+    client = new_client(server)
+    yield client
+    client.shutdown()
+
+
+def test_await_submissions_records_missing_submissions(client):
+    start = time.monotonic()
+    results = list(client.student.await_submissions([('c1', 'e1'), ('c1', 'none'), ('c1', 'empty')],
+                                                    timeout_sec=30, poll_interval_sec=0.01))
+
+    # Missing submissions fail right away instead of being polled until the deadline
+    assert time.monotonic() - start < 10
+    by_exercise = {r.course_exercise_id: r for r in results}
+    assert by_exercise['e1'].error is None
+    assert by_exercise['e1'].submission.autograde_status is easy.AutogradeStatus.COMPLETED
+    for exercise_id in ['none', 'empty']:
+        assert by_exercise[exercise_id].submission is None
+        assert isinstance(by_exercise[exercise_id].error, easy.NoSubmissionException)
+
+
+def test_async_await_latest_submission_times_out(server):
+    def slow_await(request):
+        time.sleep(1)
+        return 204, b''
+
+    server.routes.insert(0, ('GET', NO_SUBMISSION, slow_await))
+    retrieve_token, persist_token = easy.util.memory_token_storage()
+    persist_token(easy.TokenType.REFRESH, {'token_type': easy.TokenType.REFRESH, 'token': make_token('student1'),
+                                           'expires_at': int(time.time()) + 3600})
+
+    async def main():
+        async with easy.AsyncEz(server.url, server.url, 'test', retrieve_token, persist_token) as ez:
+            with pytest.raises(TimeoutError):
+                await ez.student.await_latest_exercise_submission_details('c1', 'none', timeout_sec=0.2)
+
+    asyncio.run(main())
+
+
+def test_post_submissions_records_missing_submissions(client):
+    start = time.monotonic()
+    results = client.student.post_submissions([('c1', 'e1', 'print(1)'), ('c1', 'none', 'print(2)'),
+                                               ('c1', 'empty', 'print(3)')], timeout_sec=30, poll_interval_sec=0.01)
+
+    assert time.monotonic() - start < 10
+    assert [r.course_exercise_id for r in results] == ['e1', 'none', 'empty']
+    assert results[0].error is None
+    assert results[0].submission.autograde_status is easy.AutogradeStatus.COMPLETED
+    for result in results[1:]:
+        assert result.submission is None
+        assert result.post_sec is not None
+        assert isinstance(result.error, easy.NoSubmissionException)
+
+
+def test_closing_await_submissions_returns_promptly(server, client):
+    def slow_await(request):
+        if '/exercises/fast/' not in request.path:
+            time.sleep(1)
+        return 200, json.dumps({'id': '1', 'number': 1, 'autograde_status': 'COMPLETED'}).encode()
+
+    server.routes.insert(0, ('GET', re.compile(r'/v2/student/courses/[^/]+/exercises/[^/]+/submissions/latest/await'),
+                             slow_await))
+    results = client.student.await_submissions([('c1', 'fast')] + [('c1', f'slow{i}') for i in range(20)],
+                                               max_concurrent=2, long_poll_timeout_sec=10)
+
+    assert next(results).course_exercise_id == 'fast'
+    start = time.monotonic()
+    results.close()
+    # Neither the queued long-polls nor the running ones are waited for
+    assert time.monotonic() - start < 0.5
+    # Let the running ones finish before the server stops
+    time.sleep(1.2)
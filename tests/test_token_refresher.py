@@ -0,0 +1,72 @@
+import logging
+import re
+import time
+
+from bench.fake_server import TOKEN_PATH, make_token
+from easy import ez
+from tests.conftest import new_client
+
+
+def wait_until(condition, timeout_sec: float = 5) -> bool:
+    deadline = time.time() + timeout_sec
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_rejected_refresh_token_is_not_retried(server, monkeypatch, caplog):
+    monkeypatch.setattr(ez, 'TOKEN_REFRESHER_MAX_SLEEP_SEC', 0.05)
+    monkeypatch.setattr(ez, 'TOKEN_REFRESHER_RETRY_DELAY_SEC', 0)
+    reject = [True]
+
+    def token(request):
+        if reject[0]:
+            server.token_request_count += 1
+            return 400, b'{"error": "invalid_grant"}'
+        return server.token(request)
+
+    server.routes.insert(0, ('POST', re.compile(re.escape(TOKEN_PATH)), token))
+    client = new_client(server)
+    refresher = ez.TokenRefresher()
+    try:
+        with caplog.at_level(logging.INFO):
+            refresher.register(client.util)
+            assert wait_until(lambda: server.token_request_count == 1)
+            time.sleep(0.3)
+        assert server.token_request_count == 1
+        assert len([r for r in caplog.records if r.levelno == logging.WARNING]) == 1
+
+        # Logging in again stores a new refresh token, which is used
+        reject[0] = False
+        client.util.set_stored_token(ez.TokenType.REFRESH,
+                                     ez.StorableToken(ez.TokenType.REFRESH, make_token('student1', n=2),
+                                                      int(time.time()) + 3600))
+        assert wait_until(lambda: client.util.get_cached_access_token() is not None)
+    finally:
+        refresher.stop()
+        client.shutdown()
+
+
+def test_transient_refresh_failure_is_retried(server, monkeypatch):
+    monkeypatch.setattr(ez, 'TOKEN_REFRESHER_MAX_SLEEP_SEC', 0.05)
+    monkeypatch.setattr(ez, 'TOKEN_REFRESHER_RETRY_DELAY_SEC', 0)
+    failures = [2]
+
+    def token(request):
+        if failures[0]:
+            failures[0] -= 1
+            return 503, b'{}'
+        return server.token(request)
+
+    server.routes.insert(0, ('POST', re.compile(re.escape(TOKEN_PATH)), token))
+    client = new_client(server)
+    refresher = ez.TokenRefresher()
+    try:
+        refresher.register(client.util)
+        assert wait_until(lambda: client.util.get_cached_access_token() is not None)
+        assert failures[0] == 0
+    finally:
+        refresher.stop()
+        client.shutdown()
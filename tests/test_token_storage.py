@@ -0,0 +1,61 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import easy
+from bench.fake_server import make_token
+from easy import defaults
+
+
+def file_storage(directory: str):
+    def path_provider(token_type):
+        return directory
+
+    def namer(token_type):
+        return token_type.value + '.json'
+
+    return (defaults.gen_read_token_from_file(path_provider, namer),
+            defaults.gen_write_token_to_file(path_provider, namer))
+
+
+def test_concurrent_writes_of_one_file(tmp_path):
+    path = str(tmp_path / 'token.json')
+    errors = []
+
+    def write(n: int):
+        try:
+            for i in range(200):
+                defaults.write_restricted_file(path, json.dumps({'writer': n, 'i': i}))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert json.loads(defaults.get_file_content(path))['i'] == 199
+    assert os.listdir(tmp_path) == ['token.json']
+    if os.name != 'nt':
+        assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_async_clients_sharing_storage_refresh_once(server, tmp_path):
+    retrieve_token, persist_token = file_storage(str(tmp_path))
+    persist_token(easy.TokenType.REFRESH, {'token_type': easy.TokenType.REFRESH, 'token': make_token('student1'),
+                                           'expires_at': int(time.time()) + 3600})
+
+    async def main():
+        clients = [easy.AsyncEz(server.url, server.url, 'test', retrieve_token, persist_token) for _ in range(5)]
+        try:
+            await asyncio.gather(*(ez.common.get_course_basic_info('1') for ez in clients))
+        finally:
+            for ez in clients:
+                await ez.shutdown()
+
+    asyncio.run(main())
+    assert server.token_request_count == 1